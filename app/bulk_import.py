@@ -0,0 +1,88 @@
+"""
+Imports a directory of PDF and TXT documents without going through the API.
+
+Each top-level folder becomes a subject with one document per file, and loose
+files become subjects named after themselves, unless --subject puts everything
+into one subject. Finished subjects are recorded in a checkpoint file, so
+running the same command again after an interruption skips them.
+
+    python -m app.bulk_import ./course-notes
+    python -m app.bulk_import ./lectures --subject "Physics 101" --report report.json
+"""
+import os
+import sys
+import json
+import asyncio
+import hashlib
+import argparse
+import logging
+from dotenv import load_dotenv
+
+# Settings are read when the app modules are imported, so load .env first
+load_dotenv()
+
+from app.services import bulk_service, executor
+from app.utils import helpers, tracing
+
+logger = logging.getLogger("app.bulk_import")
+
+def default_checkpoint_path(directory: str, subject: str | None) -> str:
+    key = hashlib.sha256(f"{os.path.abspath(directory)}\0{subject or ''}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(helpers.DB_DIR, "imports", f"{key}.jsonl")
+
+def _print_progress(stage: str, **counts):
+    print(
+        f"\r[{stage:<10}] files {counts['files_extracted']}/{counts['files_total']}  "
+        f"subjects done {counts['subjects_done'] + counts['subjects_skipped']}/{counts['subjects_total']}  "
+        f"failed {counts['subjects_failed']}  chunks {counts['chunks_written']}",
+        end="", file=sys.stderr, flush=True,
+    )
+
+async def run(args) -> dict:
+    items = bulk_service.collect_directory(args.directory, args.subject)
+    if not items:
+        sys.exit(f"No PDF or TXT documents found under {args.directory}.")
+
+    checkpoint_path = args.checkpoint or default_checkpoint_path(args.directory, args.subject)
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    os.makedirs(os.path.dirname(os.path.abspath(checkpoint_path)), exist_ok=True)
+    logger.info(f"Importing {len(items)} documents from {args.directory} (checkpoint: {checkpoint_path}).")
+
+    checkpoint = bulk_service.Checkpoint(checkpoint_path)
+    return await bulk_service.run_bulk_import(items, checkpoint, not args.no_cache, None if args.quiet else _print_progress)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import a directory of PDF and TXT documents into FlashLearn.")
+    parser.add_argument("directory", help="Directory to import; searched recursively.")
+    parser.add_argument("--subject", help="Put every document into this subject instead of one subject per folder.")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: a file under the database directory's imports/ folder).")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and import every subject again.")
+    parser.add_argument("--no-cache", action="store_true", help="Regenerate materials instead of using cached ones.")
+    parser.add_argument("--report", help="Also write the final report to this JSON file.")
+    parser.add_argument("--quiet", action="store_true", help="Do not print progress.")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"{args.directory} is not a directory.")
+
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format="%(levelname)s:%(name)s:[%(trace_id)s] %(message)s")
+    tracing.install_log_filter()
+    tracing.trace_id_var.set("bulk-import")
+
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        executor.shutdown_pools()
+        helpers.embedding_batcher.close()
+
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["subjects_failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Measures how much an embedding backend changes retrieval compared to the
+full-precision sentence-transformers model, before switching EMBEDDING_BACKEND
+or EMBEDDING_STORAGE_DTYPE in production.
+
+Both backends embed a sample of chunks and a query cut from each chunk. The
+report gives, for each backend, how often a query finds its own chunk (recall@1,
+recall@k, MRR), how far the two backends' top-k results agree, the mean cosine
+between their vectors for the same chunk, and encoding throughput. "mixed"
+scores queries embedded by the candidate against chunks embedded by the
+baseline, i.e. switching backends without re-indexing.
+
+The sample comes from the indexed documents unless --corpus points at a
+directory of PDF and TXT files.
+
+    python -m app.embedding_check --backend onnx
+    python -m app.embedding_check --backend onnx --corpus ./course-notes --sample 1000 --report check.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.services import file_service, ingest_service
+from app.utils import helpers
+from app.utils.embedding_backends import (
+    EMBEDDING_BACKEND, EMBEDDING_MODEL_BATCH_SIZE, EMBEDDING_THREADS, SentenceTransformerBackend, load_embedding_backend, storage_dtype,
+)
+
+logger = logging.getLogger("app.embedding_check")
+
+# Words per query cut out of a chunk
+QUERY_WORDS = 12
+
+def load_corpus(directory: str | None, sample: int, seed: int) -> list[str]:
+    """
+    Returns up to sample distinct chunks, from the files under directory or else from the indexed documents.
+    """
+    if directory:
+        chunks = []
+        for root, _, filenames in os.walk(directory):
+            for filename in sorted(filenames):
+                if filename.rsplit(".", 1)[-1].lower() not in ingest_service.ALLOWED_EXTENSIONS:
+                    continue
+                with open(os.path.join(root, filename), "rb") as f:
+                    chunks += helpers.split_text_into_chunks(file_service.get_text_from_file(filename, f.read()))
+    else:
+        chunks = helpers.get_document_collection().get(limit=sample * 4, include=["documents"])["documents"]
+    chunks = sorted(set(chunk for chunk in chunks if len(chunk.split()) > QUERY_WORDS))
+    random.Random(seed).shuffle(chunks)
+    return chunks[:sample]
+
+def make_queries(chunks: list[str], seed: int) -> list[str]:
+    rng = random.Random(seed)
+    queries = []
+    for chunk in chunks:
+        words = chunk.split()
+        start = rng.randrange(len(words) - QUERY_WORDS + 1)
+        queries.append(" ".join(words[start:start + QUERY_WORDS]))
+    return queries
+
+def _timed_encode(backend, texts: list[str], dtype: np.dtype) -> tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    vectors = np.asarray(backend.encode(texts), dtype=np.float32)
+    elapsed = time.perf_counter() - start
+    # Round-trip through the storage precision, so the scores reflect what is cached
+    return vectors.astype(dtype).astype(np.float32), elapsed
+
+def _top_k(query_vectors: np.ndarray, chunk_vectors: np.ndarray, k: int) -> np.ndarray:
+    scores = query_vectors @ chunk_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def retrieval_scores(top_k: np.ndarray) -> dict:
+    """
+    Scores rankings where query i was cut from chunk i.
+    """
+    hits = top_k == np.arange(len(top_k))[:, None]
+    ranks = np.where(hits.any(axis=1), hits.argmax(axis=1) + 1, 0)
+    return {
+        "recall_at_1": round(float(hits[:, 0].mean()), 4),
+        "recall_at_k": round(float(hits.any(axis=1).mean()), 4),
+        "mrr": round(float(np.where(ranks > 0, 1 / np.maximum(ranks, 1), 0).mean()), 4),
+    }
+
+def compare_backends(baseline, candidate, chunks: list[str], queries: list[str], k: int, candidate_dtype: np.dtype) -> dict:
+    """
+    Embeds chunks and queries with both backends and compares their retrieval.
+    """
+    baseline_chunks, baseline_chunk_seconds = _timed_encode(baseline, chunks, np.dtype(np.float32))
+    baseline_queries, baseline_query_seconds = _timed_encode(baseline, queries, np.dtype(np.float32))
+    candidate_chunks, candidate_chunk_seconds = _timed_encode(candidate, chunks, candidate_dtype)
+    candidate_queries, candidate_query_seconds = _timed_encode(candidate, queries, candidate_dtype)
+
+    baseline_top = _top_k(baseline_queries, baseline_chunks, k)
+    candidate_top = _top_k(candidate_queries, candidate_chunks, k)
+    agreement = np.mean([len(set(b) & set(c)) / k for b, c in zip(baseline_top, candidate_top)])
+    report = {
+        "chunks": len(chunks),
+        "k": k,
+        "baseline": {
+            "backend": baseline.name,
+            **retrieval_scores(baseline_top),
+            "chunks_per_second": round(len(chunks) / baseline_chunk_seconds, 1),
+            "queries_per_second": round(len(queries) / baseline_query_seconds, 1),
+        },
+        "candidate": {
+            "backend": candidate.name,
+            "storage_dtype": candidate_dtype.name,
+            **retrieval_scores(candidate_top),
+            "chunks_per_second": round(len(chunks) / candidate_chunk_seconds, 1),
+            "queries_per_second": round(len(queries) / candidate_query_seconds, 1),
+        },
+        "top_k_agreement": round(float(agreement), 4),
+    }
+    if baseline_chunks.shape[1] == candidate_chunks.shape[1]:
+        report["mean_cosine"] = round(float(np.sum(baseline_chunks * candidate_chunks, axis=1).mean()), 4)
+        report["mixed"] = retrieval_scores(_top_k(candidate_queries, baseline_chunks, k))
+    report["delta"] = {
+        metric: round(report["candidate"][metric] - report["baseline"][metric], 4)
+        for metric in ("recall_at_1", "recall_at_k", "mrr")
+    }
+    report["speedup"] = round(report["candidate"]["chunks_per_second"] / report["baseline"]["chunks_per_second"], 2)
+    return report
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare an embedding backend's retrieval quality to the full-precision model.")
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, help=f"Backend to check (default: EMBEDDING_BACKEND, {EMBEDDING_BACKEND}).")
+    parser.add_argument("--corpus", help="Directory of PDF and TXT files to sample chunks from (default: the indexed documents).")
+    parser.add_argument("--sample", type=int, default=500, help="Number of chunks to sample.")
+    parser.add_argument("--k", type=int, default=5, help="Results per query for recall@k and top-k agreement.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for sampling chunks and cutting queries.")
+    parser.add_argument("--report", help="Also write the report to this JSON file.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    chunks = load_corpus(args.corpus, args.sample, args.seed)
+    if len(chunks) < 2:
+        sys.exit("Not enough text to sample: index some documents or pass --corpus.")
+
+    baseline = SentenceTransformerBackend(helpers.EMBEDDING_MODEL_NAME, EMBEDDING_MODEL_BATCH_SIZE, EMBEDDING_THREADS)
+    candidate = load_embedding_backend(helpers.EMBEDDING_MODEL_NAME, args.backend)
+    report = compare_backends(baseline, candidate, chunks, make_queries(chunks, args.seed), args.k, storage_dtype())
+
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""
+Runs the index server: one process that owns the embedding model and the Chroma
+client and serves them to API workers started with INDEX_SERVER_MODE=remote.
+Use app.serve to start it together with the workers.
+
+    python -m app.index_server
+"""
+import os
+import sys
+import signal
+import threading
+import argparse
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+# This process owns the model and Chroma, whatever mode the API workers use
+os.environ["INDEX_SERVER_MODE"] = "local"
+
+from app.utils import helpers, components, tracing
+from app.utils.index_ipc import IndexServer, load_authkey
+
+logger = logging.getLogger("app.index_server")
+
+def _embedding_dimension() -> int:
+    model = helpers.get_embedding_model()
+    if model is None:
+        raise RuntimeError("Embedding model is not available.")
+    return model.get_sentence_embedding_dimension()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the embedding model and Chroma to FlashLearn API workers.")
+    parser.add_argument("--address", default=helpers.INDEX_SERVER_ADDRESS, help="Unix socket path or host:port to listen on.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:[%(trace_id)s] %(message)s")
+    tracing.install_log_filter()
+
+    # Load everything before listening, so workers never wait on a cold model
+    components.warm_up_all()
+    ready, status = components.readiness()
+    if not ready:
+        sys.exit(f"Index server could not load its components: {status}")
+
+    # Chunks embedded by another backend are brought up to date while serving
+    threading.Thread(target=helpers.reembed_outdated_chunks_safely, name="flashlearn-reembed", daemon=True).start()
+    server = IndexServer(
+        args.address,
+        load_authkey(helpers.INDEX_SERVER_KEY_PATH, create=True),
+        helpers.embedding_batcher,
+        helpers.get_chroma_client,
+        _embedding_dimension,
+    )
+    signal.signal(signal.SIGTERM, lambda *_: server.close())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        helpers.embedding_batcher.close()
+        logger.info("Index server stopped.")
+
+if __name__ == "__main__":
+    main()
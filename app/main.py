@@ -1,24 +1,60 @@
 import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import process, data
+from app.routers import process, data, jobs
+from app.services import executor
+from app.services.job_service import job_manager
+from app.utils import helpers, components, tracing
+from app.utils.metrics import render_prometheus
+from app.utils.static_assets import StaticAssets
 import logging
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging; each line carries the trace id of the request or job that logged it
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:[%(trace_id)s] %(message)s")
+tracing.install_log_filter()
 logger = logging.getLogger(__name__)
 
+# Load the embedding model, Chroma and the Gemini client in the background at
+# startup instead of on the first request. When disabled, each loads on first use.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+def _warm_up():
+    components.warm_up_all()
+    # The process that owns Chroma brings chunks from another embedding backend up to date
+    if helpers.index_client is None:
+        helpers.reembed_outdated_chunks_safely()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start = time.perf_counter()
+    await asyncio.to_thread(static_assets.load_all)
+    await job_manager.start()
+    warmup_task = asyncio.create_task(asyncio.to_thread(_warm_up)) if WARMUP_ON_STARTUP else None
+    logger.info(f"Application started in {time.perf_counter() - start:.2f}s (warmup {'running in background' if warmup_task else 'disabled'}).")
+    yield
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    await job_manager.stop()
+    # Stop the extraction, embedding and I/O worker pools
+    executor.shutdown_pools()
+    helpers.embedding_batcher.close()
+    if helpers.index_client:
+        helpers.index_client.close()
+
 # Create FastAPI app instance
 app = FastAPI(
     title="FlashLearn AI",
     description="An AI-powered learning assistant to generate educational materials from various sources.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -30,24 +66,46 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# Mount the static directory to serve frontend files
+# Trace ids and per-endpoint request metrics
+app.add_middleware(tracing.RequestMetricsMiddleware)
+
+# Serve the frontend files from memory, precompressed and with versioned URLs
 static_dir = os.path.join(os.path.dirname(__file__), "..", "static")
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
+static_assets = StaticAssets(static_dir)
+
+@app.api_route("/static/{name:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def read_static(request: Request, name: str):
+    return await static_assets.response(request, name)
 
 # Include the API routers
 app.include_router(process.router, prefix="/api")
 app.include_router(data.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
 
 # Define a root endpoint to serve the main page
-@app.get("/", include_in_schema=False)
-async def read_root():
-    return FileResponse(os.path.join(static_dir, 'index.html'))
+@app.api_route("/", methods=["GET", "HEAD"], include_in_schema=False)
+async def read_root(request: Request):
+    return await static_assets.response(request, "index.html")
 
 # Add a simple health check endpoint
 @app.get("/health", tags=["Health Check"])
 async def health_check():
     return JSONResponse(content={"status": "ok"})
 
+# Readiness: 503 until the required components have loaded (or, without warmup, while any has failed)
+@app.get("/ready", tags=["Health Check"])
+async def readiness_check():
+    ready, states = components.readiness(require_loaded=WARMUP_ON_STARTUP)
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "components": states}
+    )
+
+# Prometheus scrape endpoint
+@app.get("/metrics", tags=["Health Check"], include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # Generic exception handler
 @app.exception_handler(Exception)
 async def generic_exception_handler(request: Request, exc: Exception):
@@ -61,7 +119,8 @@ async def generic_exception_handler(request: Request, exc: Exception):
 async def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(
         status_code=exc.status_code,
-        content={"message": exc.detail}
+        content={"message": exc.detail},
+        headers=exc.headers
     )
 
 if __name__ == "__main__":
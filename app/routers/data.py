@@ -1,39 +1,130 @@
 
-from fastapi import APIRouter, HTTPException, Form
+from fastapi import APIRouter, HTTPException, Form, Query, Request
+from fastapi.responses import StreamingResponse
 from app.utils import helpers
+from app.services import executor
+from app.services.executor import run_in_pool
+from app.services.cache_service import materials_cache
+from app.utils.responses import encoded_response, json_bytes
+import json
+import base64
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+MAX_PAGE_SIZE = 200
+
+def _encode_cursor(cursor: str) -> str:
+    return base64.urlsafe_b64encode(cursor.encode("utf-8")).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
 @router.get("/subjects", tags=["Data"])
-async def get_all_subjects_endpoint():
+async def get_all_subjects_endpoint(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    fields: str = ",".join(helpers.DEFAULT_SUBJECT_FIELDS),
+):
     """
-    Retrieves a list of all subjects that have been processed.
+    Retrieves a page of the subjects that have been processed.
+
+    Only names and summaries are returned by default; pass fields=name,summary,quiz,flashcards
+    for the full materials. Follow next_cursor for the next page. Responses carry a strong
+    ETag, and unchanged pages return 304 when the client sends If-None-Match.
     """
+    requested_fields = tuple(field.strip() for field in fields.split(",") if field.strip())
+    unknown_fields = [field for field in requested_fields if field not in helpers.SUBJECT_FIELDS]
+    if unknown_fields or not requested_fields:
+        raise HTTPException(status_code=400, detail=f"Invalid fields: {', '.join(unknown_fields) or fields}.")
+    store_cursor = _decode_cursor(cursor) if cursor else None
+
     try:
-        subjects = helpers.get_all_subjects()
-        return {"subjects": subjects}
+        subjects_json, next_cursor = await run_in_pool(executor.IO, helpers.get_subjects_page, store_cursor, limit, requested_fields)
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logger.error(f"Error retrieving all subjects: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to retrieve subjects.")
 
+    encoded_cursor = _encode_cursor(next_cursor) if next_cursor is not None else None
+    body = b'{"subjects":' + subjects_json + b',"next_cursor":' + json_bytes(encoded_cursor) + b"}"
+    return await encoded_response(request, body)
+
 @router.get("/subjects/{subject}", tags=["Data"])
-async def get_subject_materials_endpoint(subject: str):
+async def get_subject_materials_endpoint(request: Request, subject: str):
     """
     Retrieves all learning materials for a specific subject.
+
+    The stored JSON body is sent as-is, gzip or brotli compressed when the client
+    accepts it, with a strong ETag for conditional requests.
     """
     try:
-        materials = helpers.get_subject_materials(subject)
-        if not materials:
+        materials = await run_in_pool(executor.IO, helpers.get_subject_materials_json, subject)
+        if materials is None:
             raise HTTPException(status_code=404, detail="Subject not found.")
-        return materials
+        return await encoded_response(request, materials)
     except HTTPException as e:
         raise e
     except Exception as e:
         logger.error(f"Error retrieving materials for subject {subject}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to retrieve materials for subject.")
 
+@router.get("/subjects/{subject}/documents", tags=["Data"])
+async def list_subject_documents_endpoint(subject: str):
+    """
+    Lists the documents of a subject in the order they were added, with their ids and summaries.
+    """
+    try:
+        documents = await run_in_pool(executor.IO, helpers.list_documents, subject)
+        if not documents:
+            raise HTTPException(status_code=404, detail="Subject not found.")
+        return {"subject": subject, "documents": documents}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error listing documents for subject {subject}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to list documents for subject.")
+
+@router.get("/subjects/{subject}/documents/{document_id}", tags=["Data"])
+async def get_document_materials_endpoint(request: Request, subject: str, document_id: str):
+    """
+    Retrieves the learning materials generated for one document of a subject.
+    """
+    try:
+        materials = await run_in_pool(executor.IO, helpers.get_document_materials_json, subject, document_id)
+        if materials is None:
+            raise HTTPException(status_code=404, detail="Document not found.")
+        return await encoded_response(request, materials)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error retrieving document {document_id} of subject {subject}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to retrieve materials for document.")
+
+@router.delete("/subjects/{subject}/documents/{document_id}", tags=["Data"])
+async def delete_document_endpoint(subject: str, document_id: str):
+    """
+    Removes one document from a subject: its chunks, its materials and its part of
+    the subject's materials. The subject's other documents are not re-processed.
+    Deleting the last document removes the subject.
+    """
+    try:
+        if not await run_in_pool(executor.IO, helpers.delete_document, subject, document_id):
+            raise HTTPException(status_code=404, detail="Document not found.")
+        documents = await run_in_pool(executor.IO, helpers.list_documents, subject)
+        return {"subject": subject, "deleted": document_id, "remaining_documents": len(documents)}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error deleting document {document_id} of subject {subject}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to delete document.")
+
 @router.post("/ask", tags=["RAG"])
 async def ask_question_endpoint(subject: str = Form(...), question: str = Form(...)):
     """
@@ -48,6 +139,56 @@ async def ask_question_endpoint(subject: str = Form(...), question: str = Form(.
     try:
         answer = await helpers.query_rag_for_answer(subject, question)
         return {"answer": answer}
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logger.error(f"Error answering question for subject {subject}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to get an answer: {str(e)}")
+
+@router.post("/ask/stream", tags=["RAG"])
+async def ask_question_stream_endpoint(subject: str = Form(...), question: str = Form(...)):
+    """
+    Same as /ask, but streams the answer as Server-Sent Events while it is generated.
+    Sends "token" events with {"text": ...}, then a final "done" or "error" event.
+    """
+    if not subject or subject.isspace():
+        raise HTTPException(status_code=400, detail="Subject cannot be empty.")
+    if not question or question.isspace():
+        raise HTTPException(status_code=400, detail="Question cannot be empty.")
+
+    async def event_stream():
+        try:
+            async for text in helpers.stream_rag_answer(subject, question):
+                yield f"event: token\ndata: {json.dumps({'text': text})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming answer for subject {subject}: {e}", exc_info=True)
+            message = e.detail if isinstance(e, HTTPException) else f"Failed to get an answer: {str(e)}"
+            yield f"event: error\ndata: {json.dumps({'message': message})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/cache/materials", tags=["Cache"])
+async def get_materials_cache_stats_endpoint():
+    """
+    Returns size, hit/miss counters and eviction stats for the learning materials cache.
+    """
+    return await run_in_pool(executor.IO, materials_cache.stats)
+
+@router.get("/cache/answers", tags=["Cache"])
+async def get_answer_cache_stats_endpoint():
+    """
+    Returns size and hit-rate stats for the semantic answer cache.
+    """
+    return helpers.answer_cache.stats()
+
+@router.get("/cache/subject-index", tags=["Cache"])
+async def get_subject_index_stats_endpoint():
+    """
+    Returns size and hit/load/fallback counters for the in-memory index of hot subjects.
+    """
+    return helpers.subject_index.stats()
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.responses import StreamingResponse
+from app.services import ingest_service, bulk_service
+from app.services.job_service import job_manager
+import json
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.post("/jobs/file", status_code=202, tags=["Jobs"])
+async def submit_file_job_endpoint(subject: str = Form(...), file: UploadFile = File(...), use_cache: bool = Form(True)):
+    """
+    Queues an uploaded file for processing and returns the job immediately.
+    """
+    ingest_service.validate_file_request(subject, file.filename)
+    return await job_manager.submit_file(subject, file, use_cache)
+
+@router.post("/jobs/bulk", status_code=202, tags=["Jobs"])
+async def submit_bulk_job_endpoint(files: list[UploadFile] = File(...), subject: str | None = Form(None), use_cache: bool = Form(True)):
+    """
+    Queues many documents for import as one job. Accepts PDF and TXT files and
+    zip archives of them. Without a subject, each document goes to the subject
+    named after its top-level folder in the archive, or after the file itself.
+    The finished job's "result" holds the import report.
+    """
+    bulk_service.validate_bulk_request([file.filename for file in files])
+    return await job_manager.submit_bulk(subject.strip() if subject and not subject.isspace() else None, files, use_cache)
+
+@router.post("/jobs/youtube", status_code=202, tags=["Jobs"])
+async def submit_youtube_job_endpoint(subject: str = Form(...), url: str = Form(...), use_cache: bool = Form(True)):
+    """
+    Queues a YouTube URL for processing and returns the job immediately.
+    """
+    ingest_service.validate_youtube_request(subject, url)
+    return await job_manager.submit_youtube(subject, url, use_cache)
+
+@router.get("/jobs/{job_id}", tags=["Jobs"])
+async def get_job_endpoint(job_id: str):
+    """
+    Returns the current status and per-stage progress of a job.
+    """
+    job = await job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@router.get("/jobs/{job_id}/events", tags=["Jobs"])
+async def stream_job_events_endpoint(job_id: str):
+    """
+    Streams job progress as Server-Sent Events until the job finishes.
+    Sends "progress" events with the job state, "summary" events with pieces of
+    the summary as it is generated, and a final "done" or "failed" event.
+    """
+    if not await job_manager.get(job_id):
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def event_stream():
+        async for event, data in job_manager.subscribe(job_id):
+            if event == "job":
+                event = data["status"] if data["status"] in ("done", "failed") else "progress"
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
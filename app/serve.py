@@ -0,0 +1,53 @@
+"""
+Runs the API with several worker processes that share one index server, so the
+embedding model and Chroma are loaded once instead of once per worker and all
+Chroma writes go through a single process.
+
+    python -m app.serve --workers 4 --port 8000
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.utils import helpers
+from app.utils.index_ipc import wait_for_server
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("app.serve")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run FlashLearn with several API workers and a shared index server.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")), help="Number of API worker processes.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--startup-timeout", type=float, default=600, help="Seconds to wait for the index server to load its model.")
+    args = parser.parse_args(argv)
+
+    index_server = subprocess.Popen([sys.executable, "-m", "app.index_server", "--address", helpers.INDEX_SERVER_ADDRESS])
+    try:
+        deadline = time.monotonic() + args.startup_timeout
+        while not wait_for_server(helpers.INDEX_SERVER_ADDRESS, helpers.INDEX_SERVER_KEY_PATH, timeout=1):
+            if index_server.poll() is not None or time.monotonic() > deadline:
+                sys.exit("The index server did not start; see its log above.")
+        logger.info(f"Index server is up; starting {args.workers} API workers.")
+
+        # Workers are spawned with this environment and connect to the index server
+        os.environ["INDEX_SERVER_MODE"] = "remote"
+        os.environ["INDEX_SERVER_ADDRESS"] = helpers.INDEX_SERVER_ADDRESS
+        import uvicorn
+        uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        index_server.terminate()
+        try:
+            index_server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            index_server.kill()
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,19 @@
 import os
-import google.generativeai as genai
 import logging
+import re
 import json
+import time
+import asyncio
 from fastapi import HTTPException
 from dotenv import load_dotenv, find_dotenv
 import os
+from app.services import executor
+from app.services.cache_service import materials_cache, content_key
+from app.services.llm_client import LLMClient
+from app.utils.components import component
+from app.utils.helpers import split_text_into_chunks
+from app.utils.metrics import LLM_TIME_TO_FIRST_TOKEN
+from app.utils.tracing import stage
 
 # auto-detect .env anywhere in parent folders
 load_dotenv(find_dotenv())
@@ -12,17 +21,61 @@ logger = logging.getLogger(__name__)
 
 # --- AI Service Configuration ---
 
-try:
+MODEL_NAME = 'gemini-pro-latest'
+# Bump this whenever get_generation_prompt changes so cached materials are regenerated
+PROMPT_VERSION = "1"
+
+# Texts estimated above this many tokens are generated with map-reduce instead of one prompt
+MAX_SINGLE_SHOT_TOKENS = int(os.getenv("MAX_SINGLE_SHOT_TOKENS", "24000"))
+# Approximate size of each section in the map phase
+MAP_SECTION_TOKENS = int(os.getenv("MAP_SECTION_TOKENS", "6000"))
+# Maximum number of map-phase requests in flight at once
+MAP_CONCURRENCY = int(os.getenv("MAP_CONCURRENCY", "4"))
+
+# "gemini" (default) calls the Gemini API; "fake" uses a local deterministic
+# stand-in with simulated latency, for benchmarks and development without a key
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+
+def _load_model():
+    if LLM_BACKEND == "fake":
+        from app.services.fake_llm import FakeGenerativeModel
+        logger.info("Using the fake LLM backend.")
+        return FakeGenerativeModel()
+    if LLM_BACKEND != "gemini":
+        logger.warning(f"Unknown LLM_BACKEND '{LLM_BACKEND}', using gemini.")
+
+    # Imported here because the SDK is slow to import
+    import google.generativeai as genai
+
     # Configure the Gemini API client
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         raise ValueError("GOOGLE_API_KEY environment variable not set.")
     genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-pro-latest')
-    logger.info("Gemini API client configured successfully.")
-except Exception as e:
-    logger.error(f"Error configuring Gemini API: {e}", exc_info=True)
-    model = None
+    return genai.GenerativeModel(MODEL_NAME)
+
+# Not required for readiness: without an API key the app still serves stored materials
+_llm = component("llm", "AI model", _load_model, required=False)
+
+# Set to replace the configured model (any object with generate_content_async),
+# e.g. with fake_llm.FakeGenerativeModel in tests
+model = None
+
+def get_model():
+    """
+    Returns the generative model, creating the LLM_BACKEND client on first use,
+    or None if it is not configured.
+    """
+    return model if model is not None else _llm.get()
+
+async def get_model_async():
+    """
+    Like get_model(), but configures the client without blocking the event loop.
+    """
+    return model if model is not None else await _llm.get_async()
+
+# Every LLM call goes through this client for shared concurrency, rate limits and retries
+llm_client = LLMClient(get_model_async)
 
 # --- Prompt Engineering ---
 
@@ -75,46 +128,256 @@ def get_generation_prompt(text_content: str) -> str:
     ---
     """
 
+def get_map_prompt(section_text: str, section_number: int, section_count: int) -> str:
+    """
+    Creates the prompt for one section of a large document in the map phase.
+
+    Args:
+        section_text (str): The text of the section.
+        section_number (int): The 1-based position of the section.
+        section_count (int): The total number of sections.
+
+    Returns:
+        str: The full prompt string.
+    """
+    return f"""
+    The following text is section {section_number} of {section_count} of a larger document.
+    Analyze only this section and perform three tasks:
+    1.  Write a concise summary of the section.
+    2.  Propose up to 3 multiple-choice quiz questions about its key information.
+    3.  Propose up to 5 flashcards with key terms and their definitions.
+
+    The output MUST be a single, valid JSON object. Do not include any text or formatting outside of this JSON object.
+
+    The JSON object should have the following structure:
+    {{
+        "summary": "<Section summary>",
+        "quiz": [
+            {{
+                "question": "<Question>",
+                "options": ["<Option A>", "<Option B>", "<Option C>", "<Option D>"],
+                "answer": "<The correct option>"
+            }}
+        ],
+        "flashcards": [
+            {{
+                "term": "<Key Term>",
+                "definition": "<Definition>"
+            }}
+        ]
+    }}
+
+    Here is the section to analyze:
+    ---
+    {section_text}
+    ---
+    """
+
+def get_reduce_prompt(section_results: list[dict]) -> str:
+    """
+    Creates the prompt that merges per-section results into the final materials.
+
+    Args:
+        section_results (list[dict]): The parsed map-phase outputs, in document order.
+
+    Returns:
+        str: The full prompt string.
+    """
+    sections = json.dumps(section_results, ensure_ascii=False)
+    return f"""
+    Below are summaries, candidate quiz questions and candidate flashcards extracted from
+    consecutive sections of one document, in order. Combine them and perform three tasks:
+    1.  Write a concise, easy-to-understand summary of the whole document.
+    2.  Select or rewrite the 5 best multiple-choice quiz questions covering the whole document.
+    3.  Select the 5-10 most important flashcards, merging duplicates.
+
+    The output MUST be a single, valid JSON object with exactly the keys "summary", "quiz" and
+    "flashcards", using the same structure as the section results. Do not include any text or
+    formatting outside of this JSON object.
+
+    Here are the section results:
+    ---
+    {sections}
+    ---
+    """
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimates the number of model tokens in a text (about 4 characters per token).
+    """
+    return (len(text) + 3) // 4
+
+def choose_generation_mode(text_content: str) -> str:
+    """
+    Returns "single" if the text fits in one prompt, otherwise "map_reduce".
+    """
+    return "single" if estimate_tokens(text_content) <= MAX_SINGLE_SHOT_TOKENS else "map_reduce"
+
 # --- AI Content Generation ---
 
-async def generate_learning_materials(text_content: str) -> dict:
+def parse_json_response(response_text: str) -> dict:
+    """
+    Extracts and parses the JSON object from a model response.
+
+    Raises:
+        ValueError: If the response does not contain a JSON object.
+        json.JSONDecodeError: If the JSON is invalid.
+    """
+    # Clean up the response and parse the JSON
+    # The model might sometimes wrap the JSON in ```json ... ```
+    cleaned_text = response_text.strip().replace("```json", "").replace("```", "").strip()
+
+    # Find the start of the JSON object
+    json_start = cleaned_text.find('{')
+    if json_start == -1:
+        raise ValueError("No JSON object found in the AI response.")
+
+    # Extract the JSON part of the string
+    try:
+        return json.loads(cleaned_text[json_start:])
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON Decode Error: {e}\nRaw AI Response:\n{response_text}")
+        raise
+
+class SummaryStreamExtractor:
+    """
+    Incrementally decodes the value of the "summary" key while a JSON response
+    is still being streamed, so the summary can be shown before the quiz and
+    flashcards are complete.
+    """
+    _START_RE = re.compile(r'"summary"\s*:\s*"')
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos: int | None = None
+        self.done = False
+
+    def feed(self, text: str) -> str:
+        """
+        Adds streamed text and returns the newly decoded part of the summary.
+        """
+        if self.done:
+            return ""
+        self._buffer += text
+        if self._pos is None:
+            match = self._START_RE.search(self._buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        buffer, i = self._buffer, self._pos
+        end = i
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self.done = True
+                break
+            if char == '\\':
+                # Only consume complete escapes, including both halves of a surrogate pair
+                if i + 1 >= len(buffer):
+                    break
+                length = 2
+                if buffer[i + 1] == 'u':
+                    length = 6
+                    if buffer[i + 2:i + 4].lower() in ("d8", "d9", "da", "db"):
+                        length = 12
+                if i + length > len(buffer):
+                    break
+                i += length
+            else:
+                i += 1
+            end = i
+
+        raw = buffer[self._pos:end]
+        self._pos = end
+        return json.loads(f'"{raw}"') if raw else ""
+
+async def _generate_json(prompt: str, on_summary=None) -> dict:
+    with stage("llm_generate", input_chars=len(prompt)) as timer:
+        if not on_summary:
+            response_text = await llm_client.generate(prompt, route="generate")
+        else:
+            # Stream the response and forward the summary as it is produced
+            extractor = SummaryStreamExtractor()
+            parts = []
+            start = time.perf_counter()
+            async for text in llm_client.stream(prompt, route="generate"):
+                if not parts:
+                    LLM_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start, route="generate")
+                parts.append(text)
+                delta = extractor.feed(text)
+                if delta:
+                    on_summary(delta)
+            response_text = "".join(parts)
+        timer.output_chars = len(response_text)
+    return parse_json_response(response_text)
+
+async def _generate_map_reduce(text_content: str, on_summary=None) -> dict:
+    sections = split_text_into_chunks(text_content, chunk_tokens=MAP_SECTION_TOKENS, overlap_tokens=0)
+    semaphore = asyncio.Semaphore(MAP_CONCURRENCY)
+
+    async def map_section(index: int, section_text: str) -> dict:
+        async with semaphore:
+            return await _generate_json(get_map_prompt(section_text, index + 1, len(sections)))
+
+    map_start = time.perf_counter()
+    section_results = await asyncio.gather(*(map_section(i, section) for i, section in enumerate(sections)))
+    map_seconds = time.perf_counter() - map_start
+    logger.info(f"Map phase: generated materials for {len(sections)} sections in {map_seconds:.2f}s (concurrency {MAP_CONCURRENCY}).")
+
+    reduce_start = time.perf_counter()
+    result = await _generate_json(get_reduce_prompt(list(section_results)), on_summary)
+    logger.info(f"Reduce phase: merged {len(sections)} sections in {time.perf_counter() - reduce_start:.2f}s.")
+    return result
+
+
+async def generate_learning_materials(text_content: str, use_cache: bool = True, on_summary=None) -> dict:
     """
     Sends the content to the Gemini API and gets a summary, quiz, and flashcards.
+    Identical content is served from the materials cache unless use_cache is False.
 
     Args:
         text_content (str): The text to be processed.
+        use_cache (bool): Whether cached materials may be returned. Freshly generated
+            materials are always written to the cache, so regenerating replaces a stale entry.
+        on_summary (callable, optional): If given, the response is streamed and
+            on_summary(text) is called with each new piece of the summary.
 
     Returns:
         dict: A dictionary containing the summary, quiz, and flashcards.
     """
-    if not model:
+    # The output depends on the generation mode and, for map-reduce, on how the text is split into sections
+    mode = choose_generation_mode(text_content)
+    settings = f"{MODEL_NAME}:{PROMPT_VERSION}:{mode}" + (f":{MAP_SECTION_TOKENS}" if mode == "map_reduce" else "")
+    cache_key = content_key(text_content, settings)
+    if use_cache:
+        cached = await executor.run_in_pool(executor.IO, materials_cache.get, cache_key)
+        if cached is not None:
+            logger.info(f"Served learning materials from cache (key {cache_key[:12]}).")
+            if on_summary and cached.get("summary"):
+                on_summary(cached["summary"])
+            return cached
+
+    if not await get_model_async():
         raise HTTPException(status_code=500, detail="AI service is not configured. Check API key and configuration.")
 
     try:
-        prompt = get_generation_prompt(text_content)
-        
-        # Generate content using the async method
-        response = await model.generate_content_async(prompt)
-        
-        # Clean up the response and parse the JSON
-        # The model might sometimes wrap the JSON in ```json ... ```
-        response_text = response.text.strip().replace("```json", "").replace("```", "").strip()
-        
-        # Find the start of the JSON object
-        json_start = response_text.find('{')
-        if json_start == -1:
-            raise ValueError("No JSON object found in the AI response.")
-        
-        # Extract the JSON part of the string
-        json_string = response_text[json_start:]
-        
-        result = json.loads(json_string)
-        
+        logger.info(f"Generating learning materials for ~{estimate_tokens(text_content)} tokens using {mode} mode.")
+
+        start = time.perf_counter()
+        if mode == "single":
+            result = await _generate_json(get_generation_prompt(text_content), on_summary)
+        else:
+            result = await _generate_map_reduce(text_content, on_summary)
+        logger.info(f"Generation ({mode}) took {time.perf_counter() - start:.2f}s.")
+
         logger.info("Successfully generated summary, quiz, and flashcards from AI service.")
+        await executor.run_in_pool(executor.IO, materials_cache.put, cache_key, result)
         return result
 
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON Decode Error: {e}\nRaw AI Response:\n{response.text}", exc_info=True)
+    except HTTPException:
+        raise
+    except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail="Failed to parse the AI's response. The format was invalid.")
     except Exception as e:
         logger.error(f"An error occurred while generating AI content: {e}", exc_info=True)
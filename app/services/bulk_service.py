@@ -0,0 +1,493 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import zipfile
+import threading
+import logging
+from fastapi import HTTPException, UploadFile
+from app.services import file_service, ai_service, ingest_service, executor
+from app.services.executor import run_in_pool, PoolSaturatedError
+from app.utils import helpers
+
+logger = logging.getLogger(__name__)
+
+# --- Bulk Import Configuration ---
+
+# Maximum number of documents in one bulk import
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "5000"))
+# Maximum size of all documents of one bulk import together, after unpacking archives
+BULK_MAX_TOTAL_BYTES = int(os.getenv("BULK_MAX_TOTAL_BYTES", str(2 * 1024 * 1024 * 1024)))
+# New chunks collected across subjects before they are written in one Chroma add
+BULK_INDEX_BATCH_CHUNKS = int(os.getenv("BULK_INDEX_BATCH_CHUNKS", "2048"))
+# Subjects whose materials are generated at once (the LLM client applies its own limits too)
+BULK_GENERATE_CONCURRENCY = int(os.getenv("BULK_GENERATE_CONCURRENCY", "4"))
+# Imports share the worker pools with requests; while a pool is saturated they wait up to this long instead of failing
+BULK_POOL_RETRY_SECONDS = float(os.getenv("BULK_POOL_RETRY_SECONDS", "300"))
+
+BULK_FILE_EXTENSIONS = ingest_service.ALLOWED_EXTENSIONS
+ARCHIVE_EXTENSION = "zip"
+
+class BulkItem:
+    """
+    One document of a bulk import. The document name identifies the document
+    within its subject, so importing the same name again replaces it.
+    """
+    def __init__(self, subject: str, filename: str, path: str, document_name: str | None = None):
+        self.subject = subject
+        self.filename = filename
+        self.path = path
+        self.document_name = document_name or filename
+
+def _extension(filename: str) -> str:
+    return filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+
+def subject_for(relative_path: str, subject: str | None = None) -> tuple[str, str]:
+    """
+    Picks the subject of a document in a directory or archive: the given subject
+    if any, else its top-level folder, else its file name without extension.
+
+    Returns:
+        tuple[str, str]: The subject and the document's name within it, its path
+            below the subject's folder (or the whole path for a given subject).
+    """
+    parts = [part for part in relative_path.replace("\\", "/").split("/") if part not in ("", ".", "..")]
+    if subject:
+        return subject, "/".join(parts)
+    if len(parts) > 1:
+        return parts[0], "/".join(parts[1:])
+    return os.path.splitext(parts[-1])[0], parts[-1]
+
+# --- Collecting Documents ---
+
+def collect_directory(root: str, subject: str | None = None) -> list[BulkItem]:
+    """
+    Lists the supported documents under a directory, in a stable order.
+    """
+    items = []
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories[:] = sorted(name for name in subdirectories if not name.startswith("."))
+        for filename in sorted(filenames):
+            if filename.startswith(".") or _extension(filename) not in BULK_FILE_EXTENSIONS:
+                continue
+            path = os.path.join(directory, filename)
+            item_subject, document_name = subject_for(os.path.relpath(path, root), subject)
+            items.append(BulkItem(item_subject, filename, path, document_name))
+    return items
+
+def _check_total_size(total_bytes: int):
+    if total_bytes > BULK_MAX_TOTAL_BYTES:
+        raise HTTPException(status_code=413, detail=f"The documents add up to more than {BULK_MAX_TOTAL_BYTES // (1024 * 1024)} MB.")
+
+def extract_archive(archive_path: str, destination: str, subject: str | None = None, spooled_bytes: int = 0) -> list[BulkItem]:
+    """
+    Unpacks the supported documents of a zip archive into destination.
+
+    Member paths are never used as file system paths, so entries such as
+    "../x.pdf" cannot escape the destination.
+
+    Args:
+        spooled_bytes (int): The size of the import's documents so far, counted
+            against BULK_MAX_TOTAL_BYTES together with the archive's.
+
+    Raises:
+        HTTPException: If the archive is invalid, has too many documents, or a document or all of them are too large.
+    """
+    os.makedirs(destination, exist_ok=True)
+    items = []
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            members = [
+                member for member in archive.infolist()
+                if not member.is_dir() and _extension(member.filename) in BULK_FILE_EXTENSIONS
+                and not os.path.basename(member.filename).startswith(".")
+            ]
+            if len(members) > BULK_MAX_FILES:
+                raise HTTPException(status_code=413, detail=f"Archive has {len(members)} documents; the limit is {BULK_MAX_FILES}.")
+            # Checked before unpacking anything, from the sizes the archive declares
+            _check_total_size(spooled_bytes + sum(member.file_size for member in members))
+            for index, member in enumerate(sorted(members, key=lambda member: member.filename)):
+                if member.file_size > file_service.MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"{member.filename} is larger than {file_service.MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+                filename = os.path.basename(member.filename)
+                path = os.path.join(destination, f"{index:05d}.{_extension(filename)}")
+                with archive.open(member) as source, open(path, "wb") as target:
+                    while block := source.read(file_service.UPLOAD_READ_SIZE):
+                        target.write(block)
+                item_subject, document_name = subject_for(member.filename, subject)
+                items.append(BulkItem(item_subject, filename, path, document_name))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="The archive is not a valid zip file.")
+    return items
+
+def group_by_subject(items: list[BulkItem]) -> dict[str, list[BulkItem]]:
+    """
+    Groups documents by subject, keeping the order in which subjects first appear.
+    """
+    groups: dict[str, list[BulkItem]] = {}
+    for item in items:
+        groups.setdefault(item.subject, []).append(item)
+    return groups
+
+def group_signature(items: list[BulkItem]) -> str:
+    """
+    Identifies the exact files of a subject, so a checkpoint is only reused if they are unchanged.
+    """
+    digest = hashlib.sha256()
+    for item in items:
+        stat = os.stat(item.path)
+        digest.update(f"{item.filename}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+def validate_bulk_request(filenames: list[str | None]):
+    """
+    Validates the file names of a bulk upload: documents and zip archives only.
+
+    Raises:
+        HTTPException: If the request is invalid.
+    """
+    if not filenames or not any(filenames):
+        raise HTTPException(status_code=400, detail="No file selected.")
+    if len(filenames) > BULK_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"{len(filenames)} files were given; the limit is {BULK_MAX_FILES}.")
+    for filename in filenames:
+        file_extension = _extension(filename or "")
+        if file_extension != ARCHIVE_EXTENSION and file_extension not in BULK_FILE_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"Invalid file type: .{file_extension}.")
+
+async def spool_uploads(uploads: list[UploadFile], destination: str, subject: str | None = None) -> list[BulkItem]:
+    """
+    Writes the files of a bulk upload to destination, unpacking zip archives.
+    Loose files go to the given subject, or to a subject named after the file.
+    """
+    os.makedirs(destination, exist_ok=True)
+    items = []
+    total_bytes = 0
+    for index, upload in enumerate(uploads):
+        path = await file_service.spool_upload(upload, os.path.join(destination, f"upload-{index:05d}.{_extension(upload.filename)}"))
+        if _extension(upload.filename) == ARCHIVE_EXTENSION:
+            archive_items = await run_in_pool(executor.IO, extract_archive, path, os.path.join(destination, f"archive-{index:05d}"), subject, total_bytes)
+            await run_in_pool(executor.IO, os.remove, path)
+            items += archive_items
+            total_bytes += sum(os.path.getsize(item.path) for item in archive_items)
+        else:
+            item_subject, document_name = subject_for(upload.filename, subject)
+            items.append(BulkItem(item_subject, upload.filename, path, document_name))
+            total_bytes += os.path.getsize(path)
+            _check_total_size(total_bytes)
+    if not items:
+        raise HTTPException(status_code=400, detail="The upload contains no PDF or TXT documents.")
+    if len(items) > BULK_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"{len(items)} documents were given; the limit is {BULK_MAX_FILES}.")
+    return items
+
+# --- Checkpoints ---
+
+class Checkpoint:
+    """
+    Records finished subjects in a JSON-lines file, one line per subject, so an
+    interrupted import can resume where it stopped. Failed subjects are not
+    recorded and are retried on the next run.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done: dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash; everything before it is still valid
+                        continue
+                    self._done[entry["subject"]] = entry["signature"]
+
+    def is_done(self, subject: str, signature: str) -> bool:
+        return self._done.get(subject) == signature
+
+    def mark_done(self, subject: str, signature: str):
+        with self._lock:
+            self._done[subject] = signature
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"subject": subject, "signature": signature, "finished_at": time.time()}) + "\n")
+
+# --- Pipeline ---
+
+class _Group:
+    def __init__(self, subject: str, items: list[BulkItem], signature: str):
+        self.subject = subject
+        self.items = items
+        self.signature = signature
+        self.documents: list[_Document] = []
+        self.extracted = False
+        self.settled = 0
+        self.saved = 0
+        self.error: str | None = None
+
+class _Document:
+    def __init__(self, group: _Group, item: BulkItem, text: str, page_index: list[tuple[int, int]] | None):
+        self.group = group
+        self.item = item
+        self.document_id = helpers.document_id_for(item.document_name)
+        self.text = text
+        self.page_index = page_index
+        # Generation finishes out of order, so documents are ordered by when they were extracted
+        self.added_at = time.time()
+        # Indexing and generation both have to finish before the document is settled
+        self.pending_stages = 2
+        self.generated = False
+
+async def _when_not_saturated(func, *args, **kwargs):
+    """
+    Awaits func(*args, **kwargs), retrying with backoff while a worker pool is
+    saturated by other traffic, for up to BULK_POOL_RETRY_SECONDS.
+    """
+    deadline = time.monotonic() + BULK_POOL_RETRY_SECONDS
+    delay = 0.5
+    while True:
+        try:
+            return await func(*args, **kwargs)
+        except PoolSaturatedError:
+            if time.monotonic() + delay > deadline:
+                raise
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+async def _run_in_pool(pool_name: str, func, *args, **kwargs):
+    return await _when_not_saturated(run_in_pool, pool_name, func, *args, **kwargs)
+
+async def _extract_text(item: BulkItem) -> tuple[str, list[tuple[int, int]] | None]:
+    """
+    Returns the text of a file, with a page index for PDFs (see helpers.join_pages).
+    """
+    page_count = await _run_in_pool(executor.EXTRACTION, file_service.count_pages, item.path, item.filename)
+    file_service.check_page_count(page_count)
+    text, page_index = helpers.join_pages([page_text async for page_text in file_service.iter_pages(item.path, item.filename, page_count)])
+    return text, (page_index if item.filename.lower().endswith(".pdf") else None)
+
+async def run_bulk_import(items: list[BulkItem], checkpoint: Checkpoint | None = None, use_cache: bool = True, progress=None) -> dict:
+    """
+    Imports many documents as a pipeline of three stages that run concurrently:
+    extraction of the next files overlaps embedding of the previous ones, new
+    chunks of many documents are written in large Chroma add calls, and
+    materials are generated for each document as soon as its text is extracted.
+    Extraction stays at most BULK_GENERATE_CONCURRENCY documents ahead of
+    generation, so memory does not grow with the number of files.
+
+    Each file becomes one document of its subject. Once all documents of a
+    subject are settled, their materials are merged into the subject's once.
+
+    Args:
+        items (list[BulkItem]): The documents to import.
+        checkpoint (Checkpoint, optional): Subjects already finished with the same files are skipped,
+            and every newly finished subject is recorded.
+        use_cache (bool): Whether generated materials may be served from the cache.
+        progress (callable, optional): Called as progress(stage=..., **counts) as the import advances.
+
+    Returns:
+        dict: The final report, with counts, timings and per-subject errors.
+    """
+    if len(items) > BULK_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"{len(items)} documents were given; the limit is {BULK_MAX_FILES}.")
+
+    start = time.perf_counter()
+    groups = [_Group(subject, group_items, group_signature(group_items)) for subject, group_items in group_by_subject(items).items()]
+    skipped = [group for group in groups if checkpoint and checkpoint.is_done(group.subject, group.signature)]
+    pending = [group for group in groups if group not in skipped]
+    counts = {
+        "files_total": len(items),
+        "files_extracted": 0,
+        "subjects_total": len(groups),
+        "subjects_skipped": len(skipped),
+        "documents_indexed": 0,
+        "documents_generated": 0,
+        "subjects_done": 0,
+        "subjects_failed": 0,
+        "chunks_written": 0,
+    }
+    stage_seconds = {"extraction": 0.0, "indexing": 0.0, "generation": 0.0, "merging": 0.0}
+
+    def report(stage: str):
+        if progress:
+            progress(stage=stage, **counts)
+
+    def fail(group: _Group, error: str):
+        if group.error is None:
+            group.error = error
+            counts["subjects_failed"] += 1
+            logger.warning(f"Bulk import of subject {group.subject} failed: {error}")
+
+    async def finish_if_complete(group: _Group):
+        if not group.extracted or group.settled < len(group.documents):
+            return
+        # Documents that made it are merged even if others failed, so the subject matches what is indexed
+        if group.saved:
+            merge_start = time.perf_counter()
+            try:
+                await _run_in_pool(executor.IO, helpers.refresh_subject_materials, group.subject)
+            except Exception as e:
+                fail(group, f"Merging materials failed: {e}")
+            finally:
+                stage_seconds["merging"] += time.perf_counter() - merge_start
+        if not group.error:
+            counts["subjects_done"] += 1
+            if checkpoint:
+                checkpoint.mark_done(group.subject, group.signature)
+
+    async def discard_chunks(document: _Document):
+        # Chunks of a document without materials would be searchable in its subject, but not listed in it
+        try:
+            await _run_in_pool(executor.IO, helpers.delete_document_chunks, document.group.subject, document.document_id)
+        except Exception as e:
+            logger.warning(f"Could not remove the chunks of {document.item.filename} from subject {document.group.subject}: {e}")
+
+    async def settle(document: _Document):
+        document.pending_stages -= 1
+        if document.pending_stages == 0:
+            # Both stages are done with the text; the group keeps the document for merging only
+            document.text = document.page_index = None
+            if not document.generated:
+                await discard_chunks(document)
+            document.group.settled += 1
+            await finish_if_complete(document.group)
+
+    index_queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+    # A slot is taken before a file is extracted and given back when its materials are generated,
+    # so extraction waits for generation and only this many extracted texts are held at once
+    generate_slots = asyncio.Semaphore(max(1, BULK_GENERATE_CONCURRENCY))
+    generation_tasks = []
+
+    async def generate(document: _Document):
+        group = document.group
+        generate_start = time.perf_counter()
+        try:
+            if group.error:
+                return
+            materials = await _when_not_saturated(ai_service.generate_learning_materials, document.text, use_cache=use_cache)
+            await _run_in_pool(
+                executor.IO, helpers.save_document_materials,
+                group.subject, document.document_id, document.item.document_name, materials, False, document.added_at,
+            )
+            document.generated = True
+            group.saved += 1
+            counts["documents_generated"] += 1
+            report("generating")
+        except HTTPException as e:
+            fail(group, f"{document.item.filename}: {e.detail}")
+        except Exception as e:
+            fail(group, f"{document.item.filename}: {e}")
+        finally:
+            generate_slots.release()
+            stage_seconds["generation"] += time.perf_counter() - generate_start
+            await settle(document)
+
+    async def extract():
+        for group in pending:
+            extract_start = time.perf_counter()
+            try:
+                # Subjects from before multi-document subjects keep their materials as a document of their own
+                await _run_in_pool(executor.IO, helpers.adopt_legacy_subject, group.subject)
+            except Exception as e:
+                fail(group, f"Could not read the existing subject: {e}")
+            for item in group.items:
+                if group.error:
+                    break
+                wait_start = time.perf_counter()
+                await generate_slots.acquire()
+                extract_start += time.perf_counter() - wait_start
+                try:
+                    text, page_index = await _when_not_saturated(_extract_text, item)
+                except HTTPException as e:
+                    generate_slots.release()
+                    fail(group, f"{item.filename}: {e.detail}")
+                    break
+                except Exception as e:
+                    generate_slots.release()
+                    fail(group, f"{item.filename}: {e}")
+                    break
+                counts["files_extracted"] += 1
+                if not text or text.isspace():
+                    generate_slots.release()
+                    fail(group, f"{item.filename}: Could not extract any text.")
+                    break
+                document = _Document(group, item, text, page_index)
+                group.documents.append(document)
+                generation_tasks.append(asyncio.create_task(generate(document)))
+                stage_seconds["extraction"] += time.perf_counter() - extract_start
+                await index_queue.put(document)
+                extract_start = time.perf_counter()
+            stage_seconds["extraction"] += time.perf_counter() - extract_start
+            group.extracted = True
+            report("extracting")
+            await finish_if_complete(group)
+        await index_queue.put(None)
+
+    async def flush(batch: list[tuple[_Document, helpers.PreparedDocument | None]]):
+        if not batch:
+            return
+        index_start = time.perf_counter()
+        try:
+            await _run_in_pool(executor.EMBEDDING, helpers.add_documents, [prepared for _, prepared in batch if prepared])
+        except Exception as e:
+            for document, prepared in batch:
+                if prepared:
+                    fail(document.group, f"Indexing failed: {e}")
+        else:
+            for document, prepared in batch:
+                if prepared:
+                    counts["chunks_written"] += len(prepared.ids)
+                    counts["documents_indexed"] += 1
+        finally:
+            stage_seconds["indexing"] += time.perf_counter() - index_start
+        for document, _ in batch:
+            await settle(document)
+        report("indexing")
+
+    async def index():
+        batch = []
+        batch_chunks = 0
+        while (document := await index_queue.get()) is not None:
+            index_start = time.perf_counter()
+            prepared = None
+            try:
+                prepared = await _run_in_pool(
+                    executor.EMBEDDING, helpers.prepare_document,
+                    document.group.subject, document.document_id, document.text, page_index=document.page_index,
+                )
+            except Exception as e:
+                fail(document.group, f"{document.item.filename}: Embedding failed: {e}")
+            finally:
+                stage_seconds["indexing"] += time.perf_counter() - index_start
+            batch.append((document, prepared))
+            batch_chunks += len(prepared.ids) if prepared else 0
+            if batch_chunks >= BULK_INDEX_BATCH_CHUNKS:
+                await flush(batch)
+                batch, batch_chunks = [], 0
+        await flush(batch)
+
+    logger.info(f"Bulk import of {len(items)} documents in {len(groups)} subjects ({len(skipped)} already done).")
+    report("started")
+    try:
+        await asyncio.gather(extract(), index())
+        await asyncio.gather(*generation_tasks)
+    finally:
+        for task in generation_tasks:
+            task.cancel()
+
+    elapsed = time.perf_counter() - start
+    result = {
+        **counts,
+        "elapsed_seconds": round(elapsed, 3),
+        # Time spent in each stage summed over documents; overlapping stages add up to more than elapsed_seconds
+        "stage_seconds": {name: round(seconds, 3) for name, seconds in stage_seconds.items()},
+        "documents_per_second": round(counts["files_extracted"] / elapsed, 3) if elapsed else None,
+        "errors": {group.subject: group.error for group in groups if group.error},
+    }
+    logger.info(
+        f"Bulk import finished in {elapsed:.1f}s: {counts['subjects_done']} subjects done, "
+        f"{counts['subjects_skipped']} skipped, {counts['subjects_failed']} failed, {counts['chunks_written']} chunks written."
+    )
+    report("finished")
+    return result
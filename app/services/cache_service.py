@@ -0,0 +1,130 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+import logging
+from app.utils.helpers import DB_DIR
+
+logger = logging.getLogger(__name__)
+
+# --- Cache Configuration ---
+
+MATERIALS_CACHE_MAX_BYTES = int(os.getenv("MATERIALS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+MATERIALS_CACHE_MAX_AGE_SECONDS = int(os.getenv("MATERIALS_CACHE_MAX_AGE_SECONDS", str(30 * 24 * 3600)))
+MATERIALS_CACHE_PATH = os.path.join(DB_DIR, "materials_cache.sqlite3")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes text so that re-extracted copies of the same content hash identically.
+    """
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+def content_key(text: str, version: str) -> str:
+    """
+    Returns the cache key for a text and a prompt/model version.
+    """
+    digest = hashlib.sha256()
+    digest.update(version.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+# --- Persistent Cache ---
+
+class MaterialsCache:
+    """
+    A content-addressed SQLite cache for generated learning materials.
+
+    Entries are evicted when they are older than max_age_seconds, and the least
+    recently used entries are evicted once the cache grows past max_bytes.
+    """
+    def __init__(self, path: str, max_bytes: int, max_age_seconds: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS materials_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS materials_cache_last_used ON materials_cache (last_used)")
+        return self._conn
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created_at FROM materials_cache WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.max_age_seconds:
+                conn.execute("DELETE FROM materials_cache WHERE key = ?", (key,))
+                self.evictions += 1
+                row = None
+            if not row:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE materials_cache SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, materials: dict):
+        value = json.dumps(materials)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO materials_cache (key, value, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        expired = conn.execute(
+            "DELETE FROM materials_cache WHERE created_at < ?", (now - self.max_age_seconds,)
+        ).rowcount
+        self.evictions += expired
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM materials_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM materials_cache ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM materials_cache WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM materials_cache"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+materials_cache = MaterialsCache(MATERIALS_CACHE_PATH, MATERIALS_CACHE_MAX_BYTES, MATERIALS_CACHE_MAX_AGE_SECONDS)
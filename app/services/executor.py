@@ -0,0 +1,182 @@
+import os
+import asyncio
+import functools
+import contextvars
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# --- Executor Configuration ---
+
+# Extraction (pypdf parsing) is pure CPU work on picklable inputs, so it may run
+# in a process pool. Embedding and blocking I/O use in-process singletons
+# (the SentenceTransformer model, the Chroma client, network sockets), so they
+# always run in thread pools.
+EXTRACTION_POOL_KIND = os.getenv("EXTRACTION_POOL_KIND", "process").lower()
+EXTRACTION_POOL_SIZE = int(os.getenv("EXTRACTION_POOL_SIZE", "2"))
+EMBEDDING_POOL_SIZE = int(os.getenv("EMBEDDING_POOL_SIZE", "1"))
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "8"))
+# Transcript downloads can hang on a slow network, so they get workers of their own
+TRANSCRIPT_POOL_SIZE = int(os.getenv("TRANSCRIPT_POOL_SIZE", "2"))
+
+# Maximum number of tasks allowed to wait for a free worker in each pool.
+# Once a pool has this many tasks queued, new work is rejected with a 503.
+MAX_QUEUE_DEPTH = int(os.getenv("EXECUTOR_MAX_QUEUE_DEPTH", "16"))
+
+EXTRACTION = "extraction"
+EMBEDDING = "embedding"
+IO = "io"
+TRANSCRIPT = "transcript"
+
+
+class PoolSaturatedError(HTTPException):
+    """
+    Raised when a pool already has the maximum number of tasks queued.
+    """
+    def __init__(self, pool_name: str):
+        super().__init__(
+            status_code=503,
+            detail=f"The server is busy ({pool_name} workers saturated). Please retry shortly.",
+            headers={"Retry-After": "5"},
+        )
+
+
+class BoundedPool:
+    """
+    Wraps a concurrent.futures executor with an admission limit.
+
+    The pending counter is only touched from the event loop thread, so it
+    does not need a lock. A task keeps its slot until its worker is done with
+    it, even when the caller stops waiting (a timeout or a cancelled request),
+    because the worker cannot be interrupted.
+    """
+    def __init__(self, name: str, kind: str, max_workers: int, max_queue_depth: int):
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.max_queue_depth = max(0, max_queue_depth)
+        self.pending = 0
+        self._executor: Executor | None = None
+
+    @property
+    def limit(self) -> int:
+        return self.max_workers + self.max_queue_depth
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                # Use "spawn" so worker processes do not inherit the parent's
+                # threads (torch, grpc) or its loaded models.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=f"flashlearn-{self.name}",
+                )
+            logger.info(f"Started {self.kind} pool '{self.name}' with {self.max_workers} workers.")
+        return self._executor
+
+    async def run(self, func, *args, **kwargs):
+        if self.pending >= self.limit:
+            logger.warning(f"Rejecting task for pool '{self.name}': {self.pending} tasks pending (limit {self.limit}).")
+            raise PoolSaturatedError(self.name)
+
+        loop = asyncio.get_running_loop()
+        pool_executor = self._get_executor()
+        call = functools.partial(func, *args, **kwargs)
+        if self.kind == "thread":
+            # Carry context variables (the request's trace id) into the worker thread
+            call = functools.partial(contextvars.copy_context().run, call)
+        try:
+            future = pool_executor.submit(call)
+        except BrokenProcessPool:
+            self._restart_broken(pool_executor)
+            raise
+        self.pending += 1
+        future.add_done_callback(lambda _: self._release(loop))
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._restart_broken(pool_executor)
+            raise
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        # Called from the worker thread when the task finishes, so hand the update to the loop
+        try:
+            loop.call_soon_threadsafe(self._decrement)
+        except RuntimeError:
+            # The loop is closed; nothing is left to admit
+            pass
+
+    def _decrement(self):
+        self.pending -= 1
+
+    def _restart_broken(self, pool_executor: Executor):
+        # A worker died (e.g. a crash in native PDF code); start a fresh pool for later tasks
+        if self._executor is pool_executor:
+            logger.error(f"Process pool '{self.name}' is broken; it will be restarted.")
+            self.shutdown()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "limit": self.limit,
+        }
+
+
+if EXTRACTION_POOL_KIND not in {"thread", "process"}:
+    logger.warning(f"Unknown EXTRACTION_POOL_KIND '{EXTRACTION_POOL_KIND}', falling back to 'thread'.")
+    EXTRACTION_POOL_KIND = "thread"
+
+pools = {
+    EXTRACTION: BoundedPool(EXTRACTION, EXTRACTION_POOL_KIND, EXTRACTION_POOL_SIZE, MAX_QUEUE_DEPTH),
+    EMBEDDING: BoundedPool(EMBEDDING, "thread", EMBEDDING_POOL_SIZE, MAX_QUEUE_DEPTH),
+    IO: BoundedPool(IO, "thread", IO_POOL_SIZE, MAX_QUEUE_DEPTH),
+    TRANSCRIPT: BoundedPool(TRANSCRIPT, "thread", TRANSCRIPT_POOL_SIZE, MAX_QUEUE_DEPTH),
+}
+
+# --- Public API ---
+
+async def run_in_pool(pool_name: str, func, *args, **kwargs):
+    """
+    Runs a blocking function in the named pool without blocking the event loop.
+
+    Args:
+        pool_name (str): One of EXTRACTION, EMBEDDING, IO or TRANSCRIPT.
+        func: The blocking callable. For process pools it must be picklable.
+
+    Returns:
+        The return value of func.
+
+    Raises:
+        PoolSaturatedError: If the pool's queue is full.
+    """
+    return await pools[pool_name].run(func, *args, **kwargs)
+
+def get_pool_stats() -> dict:
+    """
+    Returns the current size and load of every pool.
+    """
+    return {name: pool.stats() for name, pool in pools.items()}
+
+def shutdown_pools():
+    """
+    Stops all worker pools. Called when the application shuts down.
+    """
+    for pool in pools.values():
+        pool.shutdown()
+    logger.info("Executor pools shut down.")
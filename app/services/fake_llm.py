@@ -0,0 +1,80 @@
+import os
+import re
+import json
+import random
+import asyncio
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- Fake LLM Configuration ---
+
+# Time before the first token of a response
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+# Output speed once the response has started, in estimated tokens (about 4 characters each)
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "200"))
+# Characters per streamed chunk
+FAKE_LLM_CHUNK_CHARS = 32
+
+class FakeResponse:
+    """
+    Mimics the parts of a Gemini response the app uses: .text, and async
+    iteration over chunks that each have .text when streaming.
+    """
+    def __init__(self, text: str, chunk_delay: float = 0.0):
+        self.text = text
+        self._chunk_delay = chunk_delay
+
+    async def __aiter__(self):
+        for start in range(0, len(self.text), FAKE_LLM_CHUNK_CHARS):
+            if start and self._chunk_delay:
+                await asyncio.sleep(self._chunk_delay)
+            yield FakeResponse(self.text[start:start + FAKE_LLM_CHUNK_CHARS])
+
+
+class FakeGenerativeModel:
+    """
+    A stand-in for genai.GenerativeModel that needs no API key or network.
+
+    Responses are deterministic for a given prompt: prompts asking for a JSON
+    object get learning materials built from words of the prompt, and any other
+    prompt (RAG questions) gets a plain-text answer. Latency follows
+    latency_ms plus the output length at tokens_per_second, so benchmarks see
+    realistic waiting without a live model.
+    """
+    def __init__(self, latency_ms: float = FAKE_LLM_LATENCY_MS, tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND):
+        self.latency = max(0.0, latency_ms) / 1000
+        self.tokens_per_second = tokens_per_second
+
+    def _respond(self, prompt: str) -> str:
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16], 16)
+        rng = random.Random(seed)
+        words = re.findall(r"[A-Za-z]{4,}", prompt) or ["flashlearn"]
+
+        def phrase(count: int) -> str:
+            return " ".join(rng.choice(words) for _ in range(count))
+
+        if "valid JSON object" not in prompt:
+            return f"Based on the context, {phrase(30)}."
+
+        quiz = []
+        for _ in range(5):
+            options = [phrase(3) for _ in range(4)]
+            quiz.append({"question": f"What about {phrase(6)}?", "options": options, "answer": rng.choice(options)})
+        flashcards = [{"term": phrase(2), "definition": phrase(12)} for _ in range(8)]
+        return json.dumps({"summary": phrase(60) + ".", "quiz": quiz, "flashcards": flashcards})
+
+    def _output_seconds(self, text: str) -> float:
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return len(text) / 4 / self.tokens_per_second
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs) -> FakeResponse:
+        text = self._respond(prompt)
+        await asyncio.sleep(self.latency)
+        if stream:
+            chunks = max(1, -(-len(text) // FAKE_LLM_CHUNK_CHARS))
+            return FakeResponse(text, self._output_seconds(text) / chunks)
+        await asyncio.sleep(self._output_seconds(text))
+        return FakeResponse(text)
@@ -1,78 +1,183 @@
+import os
+import time
+import asyncio
 import logging
+import tempfile
 from pypdf import PdfReader
-from pytube import YouTube
 from io import BytesIO
+from fastapi import HTTPException, UploadFile
+from app.services import executor
+from app.services.executor import run_in_pool
+from app.utils.tracing import stage, record_stage
 
 logger = logging.getLogger(__name__)
 
+# --- Extraction Limits ---
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "2000"))
+# Pages parsed per task in the extraction pool
+EXTRACTION_BATCH_PAGES = int(os.getenv("EXTRACTION_BATCH_PAGES", "8"))
+
+UPLOAD_READ_SIZE = 1024 * 1024
+
 # --- Text Extraction Service ---
 
-def get_text_from_file(filename: str, contents: bytes) -> str:
+def get_pages_from_file(filename: str, contents: bytes) -> list[str]:
     """
-    Extracts text from an uploaded file based on its extension.
+    Extracts text from an uploaded file page by page, based on its extension.
 
     Args:
         filename (str): The name of the file.
         contents (bytes): The byte content of the file.
 
     Returns:
-        str: The extracted text content.
+        list[str]: The text of each page. Text files are returned as a single page.
     """
     file_extension = filename.split('.')[-1].lower()
-    text = ""
 
     try:
         if file_extension == 'pdf':
             pdf_reader = PdfReader(BytesIO(contents))
-            for page in pdf_reader.pages:
-                text += page.extract_text() or ""
+            pages = [page.extract_text() or "" for page in pdf_reader.pages]
         elif file_extension == 'txt':
-            text = contents.decode('utf-8')
+            pages = [contents.decode('utf-8')]
         else:
             # This case is already handled in the router, but good for safety
             raise ValueError(f"Unsupported file type: {file_extension}")
-        
-        logger.info(f"Successfully extracted {len(text)} characters from {filename}")
-        return text
+
+        logger.info(f"Successfully extracted {sum(len(page) for page in pages)} characters from {len(pages)} pages of {filename}")
+        return pages
 
     except Exception as e:
         logger.error(f"Failed to extract text from {filename}: {e}", exc_info=True)
         raise
 
-def get_transcript_from_youtube(url: str) -> str:
+def get_text_from_file(filename: str, contents: bytes) -> str:
     """
-    Downloads the audio from a YouTube video and returns its transcription.
-    Note: This uses pytube's caption functionality, which relies on YouTube's auto-generated captions.
+    Extracts text from an uploaded file based on its extension.
 
     Args:
-        url (str): The YouTube video URL.
+        filename (str): The name of the file.
+        contents (bytes): The byte content of the file.
 
     Returns:
-        str: The video's transcript or an empty string if not available.
+        str: The extracted text content.
     """
-    try:
-        yt = YouTube(url)
-        
-        # Ensure the video is available
-        yt.check_availability()
-
-        # Get the English caption track
-        # Pytube returns a list of available caption tracks
-        caption = yt.captions.get_by_language_code('en')
-
-        if not caption:
-            logger.warning(f"No English captions found for YouTube video: {url}")
-            # Try to get auto-generated captions if official ones aren't there
-            caption = yt.captions.get_by_language_code('a.en')
-
-        if caption:
-            transcript = caption.generate_srt_captions()
-            logger.info(f"Successfully fetched transcript for YouTube video: {url}")
-            return transcript
-        else:
-            logger.error(f"Could not retrieve any English transcript for {url}")
-            return ""
+    return "\n".join(get_pages_from_file(filename, contents))
 
-    except Exception as e:
-        logger.error(f"Failed to get transcript from YouTube URL {url}: {e}", exc_info=True)
-        raise
+# --- Streaming Extraction ---
+
+async def spool_upload(file: UploadFile, path: str | None = None) -> str:
+    """
+    Copies an upload to disk in fixed-size blocks so it never has to be held in memory.
+
+    Args:
+        file (UploadFile): The uploaded file.
+        path (str, optional): Where to write the upload. A temporary file is used if omitted.
+
+    Returns:
+        str: The path of the spooled file. The caller is responsible for removing it.
+
+    Raises:
+        HTTPException: If the upload is larger than MAX_UPLOAD_BYTES.
+    """
+    if path is None:
+        suffix = os.path.splitext(file.filename or "")[1]
+        fd, path = tempfile.mkstemp(prefix="flashlearn-upload-", suffix=suffix)
+        os.close(fd)
+
+    size = 0
+    with open(path, "wb") as f:
+        try:
+            while block := await file.read(UPLOAD_READ_SIZE):
+                size += len(block)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"File is larger than the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit.")
+                await run_in_pool(executor.IO, f.write, block)
+        except BaseException:
+            f.close()
+            os.remove(path)
+            raise
+    return path
+
+def count_pages(path: str, filename: str) -> int:
+    """
+    Returns the number of pages in a spooled file. Text files count as one page.
+    """
+    if filename.split('.')[-1].lower() != 'pdf':
+        return 1
+    return len(PdfReader(path).pages)
+
+def check_page_count(page_count: int):
+    """
+    Rejects documents with more than MAX_PDF_PAGES pages.
+
+    Raises:
+        HTTPException: If the limit is exceeded.
+    """
+    if page_count > MAX_PDF_PAGES:
+        raise HTTPException(status_code=413, detail=f"Document has {page_count} pages; the limit is {MAX_PDF_PAGES}.")
+
+def extract_pdf_pages(path: str, start: int, stop: int) -> list[str]:
+    """
+    Extracts the text of pages [start, stop) of a PDF on disk. Runs in the extraction pool.
+    """
+    pdf_reader = PdfReader(path)
+    return [pdf_reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+def _read_text_file(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+async def iter_pages(path: str, filename: str, page_count: int):
+    """
+    Yields the text of each page of a spooled file, in order.
+
+    PDF pages are parsed in batches across the extraction pool. At most one
+    batch per pool worker is in flight, so callers can start processing early
+    pages while later ones are still being parsed.
+
+    Args:
+        path (str): The spooled file, see spool_upload.
+        filename (str): The original filename, used to detect the file type.
+        page_count (int): The number of pages, see count_pages.
+    """
+    file_extension = filename.split('.')[-1].lower()
+    if file_extension == 'txt':
+        with stage("extraction") as timer:
+            text = await run_in_pool(executor.IO, _read_text_file, path)
+            timer.output_chars = len(text)
+        yield text
+        return
+    if file_extension != 'pdf':
+        raise ValueError(f"Unsupported file type: {file_extension}")
+
+    # Only the time spent waiting for the pool counts as extraction, not the caller's work between pages
+    extraction_seconds = 0.0
+    characters = 0
+
+    async def next_batch() -> list[str]:
+        nonlocal extraction_seconds, characters
+        wait_start = time.perf_counter()
+        page_texts = await in_flight.pop(0)
+        extraction_seconds += time.perf_counter() - wait_start
+        characters += sum(len(page_text) for page_text in page_texts)
+        return page_texts
+
+    batches = [(start, min(start + EXTRACTION_BATCH_PAGES, page_count)) for start in range(0, page_count, EXTRACTION_BATCH_PAGES)]
+    window = executor.pools[executor.EXTRACTION].max_workers
+    in_flight = []
+    try:
+        for start, stop in batches:
+            in_flight.append(asyncio.ensure_future(run_in_pool(executor.EXTRACTION, extract_pdf_pages, path, start, stop)))
+            if len(in_flight) >= window:
+                for page_text in await next_batch():
+                    yield page_text
+        while in_flight:
+            for page_text in await next_batch():
+                yield page_text
+    finally:
+        for task in in_flight:
+            task.cancel()
+    record_stage("extraction", extraction_seconds, output_chars=characters)
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+from fastapi import HTTPException
+from app.services import file_service, youtube_service, ai_service, executor
+from app.services.executor import run_in_pool
+from app.utils import helpers
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = {"pdf", "txt"}
+
+# --- Request Validation ---
+
+def validate_file_request(subject: str, filename: str | None):
+    """
+    Validates the subject and filename of a file upload.
+
+    Raises:
+        HTTPException: If the request is invalid.
+    """
+    if not filename:
+        raise HTTPException(status_code=400, detail="No file selected.")
+    if not subject or subject.isspace():
+        raise HTTPException(status_code=400, detail="Subject cannot be empty.")
+
+    file_extension = filename.split('.')[-1].lower()
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid file type: .{file_extension}.")
+
+def validate_youtube_request(subject: str, url: str):
+    """
+    Validates the subject and URL of a YouTube request.
+
+    Raises:
+        HTTPException: If the request is invalid.
+    """
+    if not youtube_service.extract_video_id(url):
+        raise HTTPException(status_code=400, detail="Invalid YouTube URL provided.")
+    if not subject or subject.isspace():
+        raise HTTPException(status_code=400, detail="Subject cannot be empty.")
+
+# --- Ingestion Pipeline ---
+
+def _report(progress, stage: str, **fields):
+    if progress:
+        progress(stage=stage, **fields)
+
+async def ingest_text(subject: str, document_name: str, text_content: str, progress=None, use_cache: bool = True, on_summary=None, timestamps=None, page_index=None) -> bytes:
+    """
+    Runs the shared part of the pipeline: embedding for RAG, material generation
+    and saving.
+
+    The text is added to the subject as one document. Only this document is
+    embedded and generated for; its materials are then merged with those of
+    the subject's other documents. A document with the same name replaces the
+    earlier one.
+
+    Args:
+        subject (str): The subject to store the materials under.
+        document_name (str): The document's file name or URL, which identifies it within the subject.
+        text_content (str): The extracted text.
+        progress (callable, optional): Called as progress(stage=..., **fields) when
+            the pipeline advances. May be called from worker threads.
+        use_cache (bool): Whether generated materials may be served from the cache.
+        on_summary (callable, optional): Receives pieces of the summary while it is generated.
+        timestamps (list, optional): (character offset, seconds) pairs locating the text in a video,
+            stored with the chunks so answers can cite them.
+        page_index (list, optional): (character offset, page number) pairs locating the text in a PDF,
+            stored with the chunks.
+
+    Returns:
+        bytes: All materials for the subject, as the stored JSON body.
+    """
+    # Subjects from before multi-document subjects keep their materials as a document of their own
+    await run_in_pool(executor.IO, helpers.adopt_legacy_subject, subject)
+    document_id = helpers.document_id_for(document_name)
+
+    # Store document for RAG
+    _report(progress, "embedding")
+    embedding_progress = (lambda **fields: progress(stage="embedding", **fields)) if progress else None
+    await run_in_pool(executor.EMBEDDING, helpers.upsert_document, subject, document_id, text_content, embedding_progress, timestamps, page_index)
+
+    # Generate learning materials
+    _report(progress, "generating")
+    materials = await ai_service.generate_learning_materials(text_content, use_cache=use_cache, on_summary=on_summary)
+
+    # Save the document's materials and merge them into the subject's
+    _report(progress, "saving")
+    # The stored body is returned as-is, so the response needs no second read or re-serialization
+    return await run_in_pool(executor.IO, helpers.save_document_materials, subject, document_id, document_name, materials)
+
+async def _extract_pages(path: str, filename: str, progress=None) -> list[str]:
+    """
+    Streams pages out of a spooled file and embeds completed chunks into the
+    embedding cache while later pages are still being parsed.
+    """
+    page_count = await run_in_pool(executor.EXTRACTION, file_service.count_pages, path, filename)
+    file_service.check_page_count(page_count)
+    _report(progress, "extracting", pages_extracted=0, pages_total=page_count)
+
+    pages = []
+    chunker = helpers.StreamingChunker()
+    ready_chunks = []
+    prefetch = None
+
+    async def flush(chunks: list[str]):
+        nonlocal prefetch
+        # Keep at most one prefetch batch in flight so the embedding pool is not flooded
+        if prefetch:
+            await prefetch
+        prefetch = asyncio.ensure_future(run_in_pool(executor.EMBEDDING, helpers.prefetch_embeddings, chunks))
+
+    try:
+        async for page_text in file_service.iter_pages(path, filename, page_count):
+            pages.append(page_text)
+            _report(progress, "extracting", pages_extracted=len(pages), pages_total=page_count)
+            ready_chunks.extend(chunker.feed(page_text))
+            if len(ready_chunks) >= helpers.EMBEDDING_BATCH_SIZE:
+                await flush(ready_chunks)
+                ready_chunks = []
+        ready_chunks.extend(chunker.finish())
+        if ready_chunks:
+            await flush(ready_chunks)
+        if prefetch:
+            await prefetch
+    except BaseException:
+        if prefetch:
+            prefetch.cancel()
+        raise
+    return pages
+
+async def ingest_file(subject: str, filename: str, path: str, progress=None, use_cache: bool = True, on_summary=None) -> bytes:
+    """
+    Extracts text from a spooled upload and runs it through the pipeline.
+
+    Args:
+        subject (str): The subject to store the materials under.
+        filename (str): The original filename.
+        path (str): The upload on disk, see file_service.spool_upload.
+    """
+    _report(progress, "extracting")
+    pages = await _extract_pages(path, filename, progress)
+    text_content, page_index = helpers.join_pages(pages)
+    _report(progress, "extracted", pages_extracted=len(pages), characters=len(text_content))
+
+    if not text_content or text_content.isspace():
+        raise HTTPException(status_code=400, detail="Could not extract any text from the file.")
+
+    # Text files count as one page, which says nothing about where a chunk is
+    page_index = page_index if filename.lower().endswith(".pdf") else None
+    return await ingest_text(subject, filename, text_content, progress, use_cache, on_summary, page_index=page_index)
+
+async def ingest_youtube(subject: str, url: str, progress=None, use_cache: bool = True, on_summary=None) -> bytes:
+    """
+    Fetches a YouTube transcript (or reuses a cached one) and runs its plain text
+    through the pipeline.
+    """
+    _report(progress, "extracting")
+    transcript = await youtube_service.get_transcript(url)
+    _report(progress, "extracted", characters=len(transcript.text))
+
+    # Named by the canonical URL, so other URL forms of the same video replace the same document
+    document_name = f"https://www.youtube.com/watch?v={transcript.video_id}"
+    return await ingest_text(subject, document_name, transcript.text, progress, use_cache, on_summary, transcript.timestamps)
@@ -0,0 +1,564 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import threading
+import shutil
+import logging
+from fastapi import HTTPException, UploadFile
+from app.services import ingest_service, bulk_service, file_service, executor
+from app.services.executor import run_in_pool
+from app.utils.helpers import DB_DIR
+from app.utils.tracing import trace_id_var
+
+logger = logging.getLogger(__name__)
+
+# --- Job Configuration ---
+
+# Number of jobs processed concurrently
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+# Maximum number of jobs waiting in the queue before submissions are rejected
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+# Finished jobs older than this are removed from the store on startup
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+# Job progress (stage, pages extracted, chunks embedded) is written to the store at most this often;
+# status changes are written right away
+JOB_PROGRESS_SAVE_SECONDS = float(os.getenv("JOB_PROGRESS_SAVE_SECONDS", "1"))
+# A job is run by the process holding its lease, which renews it every third of this;
+# jobs whose lease runs out (e.g. their worker died) are taken over by another process
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "30"))
+
+JOB_DB_PATH = os.path.join(DB_DIR, "jobs.sqlite3")
+JOB_UPLOAD_DIR = os.path.join(DB_DIR, "job_uploads")
+
+TERMINAL_STATUSES = {"done", "failed"}
+
+# --- Persistence ---
+
+class JobStore:
+    """
+    Stores job state in a small SQLite database so it survives restarts.
+
+    The database is shared by all API worker processes. Each unfinished job is
+    leased to one of them (its owner), which is the only one that runs it.
+    """
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        # Stores from before job leases get the lease columns
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, definition in (("owner", "TEXT"), ("lease_until", "REAL NOT NULL DEFAULT 0")):
+            if name not in columns:
+                try:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+                except sqlite3.OperationalError:
+                    # Added by another worker in the meantime
+                    pass
+
+    def create(self, job: dict, owner: str, lease_seconds: float):
+        """
+        Adds a new job, leased to owner.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, data, updated_at, owner, lease_until) VALUES (?, ?, ?, ?, ?, ?)",
+                (job["id"], job["status"], json.dumps(job), job["updated_at"], owner, time.time() + lease_seconds)
+            )
+
+    def save(self, job: dict):
+        self.save_many([job])
+
+    def save_many(self, jobs: list[dict]):
+        """
+        Writes job snapshots in one transaction. A snapshot older than the stored
+        one is ignored, so writes from different threads cannot go back in time.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO jobs (id, status, data, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET status = excluded.status, data = excluded.data, updated_at = excluded.updated_at "
+                    "WHERE excluded.updated_at >= jobs.updated_at",
+                    [(job["id"], job["status"], json.dumps(job), job["updated_at"]) for job in jobs]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def unowned(self) -> list[dict]:
+        """
+        Returns the unfinished jobs that no process holds a lease on.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM jobs WHERE status NOT IN ('done', 'failed') AND (owner IS NULL OR lease_until < ?) ORDER BY updated_at",
+                (time.time(),)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def claim(self, job_id: str, owner: str, lease_seconds: float) -> dict | None:
+        """
+        Leases an unfinished job to owner if no other process holds it. The check
+        and the update are one statement, so only one process can win a job.
+
+        Returns:
+            dict | None: The claimed job, or None if another process owns it.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET owner = ?, lease_until = ? "
+                "WHERE id = ? AND status NOT IN ('done', 'failed') AND (owner IS NULL OR owner = ? OR lease_until < ?)",
+                (owner, now + lease_seconds, job_id, owner, now)
+            )
+            if cursor.rowcount == 0:
+                return None
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def renew(self, owner: str, job_ids: list[str], lease_seconds: float) -> int:
+        """
+        Extends owner's leases on the given jobs. Returns how many it still held.
+        """
+        lease_until = time.time() + lease_seconds
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                renewed = sum(
+                    self._conn.execute(
+                        "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ?", (lease_until, job_id, owner)
+                    ).rowcount
+                    for job_id in job_ids
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return renewed
+
+    def release(self, owner: str):
+        """
+        Gives up all of owner's leases, so other processes can take the jobs over right away.
+        """
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET owner = NULL, lease_until = 0 WHERE owner = ?", (owner,))
+
+    def prune(self, older_than: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (older_than,)
+            )
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# --- Job Manager ---
+
+def _public_view(job: dict) -> dict:
+    return {key: value for key, value in job.items() if key != "payload"}
+
+def _upload_path(job_id: str) -> str:
+    return os.path.join(JOB_UPLOAD_DIR, f"{job_id}.upload")
+
+def _bulk_dir(job_id: str) -> str:
+    # Bulk jobs keep their documents and import checkpoint in a directory
+    return os.path.join(JOB_UPLOAD_DIR, f"{job_id}.bulk")
+
+def _upload_exists(job: dict) -> bool:
+    if job["kind"] == "file":
+        return os.path.exists(_upload_path(job["id"]))
+    if job["kind"] == "bulk":
+        return os.path.isdir(_bulk_dir(job["id"]))
+    return True
+
+def _remove_upload(job_id: str):
+    try:
+        os.remove(_upload_path(job_id))
+    except FileNotFoundError:
+        pass
+    shutil.rmtree(_bulk_dir(job_id), ignore_errors=True)
+
+class JobManager:
+    """
+    Queues ingestion jobs, drains them with a fixed number of workers and
+    publishes progress to subscribers.
+
+    Progress updates may arrive from pool threads, so job state is guarded by a
+    lock and subscriber notifications are handed to the event loop. Snapshots
+    are written to the store from the IO pool, never on the event loop.
+
+    With several API workers, each runs only the jobs it holds a lease on in
+    the shared store: the ones submitted to it and the ones it took over from
+    a worker that stopped. Subscribers to a job run elsewhere follow it
+    through the store.
+    """
+    def __init__(self, concurrency: int, max_queue: int):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.store: JobStore | None = None
+        self._jobs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # Latest unsaved snapshot of each job, written by the flusher
+        self._dirty: dict[str, dict] = {}
+        self._dirty_event: asyncio.Event | None = None
+        self._flusher: asyncio.Task | None = None
+        # Identifies this process as the owner of job leases
+        self.owner = uuid.uuid4().hex
+        self._leaser: asyncio.Task | None = None
+
+    async def start(self):
+        """
+        Opens the job store, takes over jobs that no running process owns and starts the workers.
+        """
+        os.makedirs(JOB_UPLOAD_DIR, exist_ok=True)
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._dirty_event = asyncio.Event()
+        self.store = JobStore(JOB_DB_PATH)
+
+        pruned = self.store.prune(time.time() - JOB_RETENTION_SECONDS)
+        if pruned:
+            logger.info(f"Pruned {pruned} finished jobs from the job store.")
+
+        for job_id in self._take_over_jobs():
+            self._queue.put_nowait(job_id)
+
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._flusher = asyncio.create_task(self._flush_progress())
+        self._leaser = asyncio.create_task(self._renew_leases())
+        logger.info(f"Job manager started with {self.concurrency} workers.")
+
+    async def stop(self):
+        """
+        Cancels the workers. Running jobs stay unfinished in the store and their
+        leases are released, so another worker or the next start takes them over.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for task in (self._flusher, self._leaser):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._flusher = self._leaser = None
+        if self.store:
+            with self._lock:
+                snapshots = list(self._dirty.values())
+                self._dirty.clear()
+                self._jobs.clear()
+            if snapshots:
+                self.store.save_many(snapshots)
+            self.store.release(self.owner)
+            self.store.close()
+            self.store = None
+        logger.info("Job manager stopped.")
+
+    # --- Submission ---
+
+    async def _submit(self, kind: str, subject: str, payload: dict, upload: UploadFile | None = None, spool=None) -> dict:
+        if self._queue is None or self.store is None:
+            raise HTTPException(status_code=503, detail="The job service is not running.")
+        if self._queue.qsize() >= self.max_queue:
+            raise HTTPException(status_code=503, detail="Too many jobs are queued. Please retry shortly.", headers={"Retry-After": "30"})
+
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "subject": subject,
+            "status": "queued",
+            "stage": "queued",
+            "progress": {},
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "payload": payload,
+        }
+        if upload is not None:
+            await file_service.spool_upload(upload, _upload_path(job["id"]))
+        if spool is not None:
+            try:
+                payload.update(await spool(job["id"]))
+            except BaseException:
+                await run_in_pool(executor.IO, _remove_upload, job["id"])
+                raise
+
+        with self._lock:
+            self._jobs[job["id"]] = job
+        await run_in_pool(executor.IO, self.store.create, job, self.owner, JOB_LEASE_SECONDS)
+        self._queue.put_nowait(job["id"])
+        logger.info(f"Queued {kind} job {job['id']} for subject: {subject}")
+        return _public_view(job)
+
+    async def submit_file(self, subject: str, upload: UploadFile, use_cache: bool = True) -> dict:
+        return await self._submit("file", subject, {"filename": upload.filename, "use_cache": use_cache}, upload)
+
+    async def submit_bulk(self, subject: str | None, uploads: list[UploadFile], use_cache: bool = True) -> dict:
+        async def spool(job_id: str) -> dict:
+            directory = _bulk_dir(job_id)
+            items = await bulk_service.spool_uploads(uploads, directory, subject)
+            return {"items": [
+                {"subject": item.subject, "filename": item.filename, "path": os.path.relpath(item.path, directory), "document_name": item.document_name}
+                for item in items
+            ]}
+
+        return await self._submit("bulk", subject or "(bulk import)", {"use_cache": use_cache}, spool=spool)
+
+    async def submit_youtube(self, subject: str, url: str, use_cache: bool = True) -> dict:
+        return await self._submit("youtube", subject, {"url": url, "use_cache": use_cache})
+
+    # --- State ---
+
+    async def get(self, job_id: str) -> dict | None:
+        """
+        Returns a job's public state: from memory if it runs here, else read from the store in the IO pool.
+        """
+        with self._lock:
+            # A finished job's last state may not be in the store yet
+            job = self._jobs.get(job_id) or self._dirty.get(job_id)
+            if job:
+                return _public_view(job)
+        job = await run_in_pool(executor.IO, self.store.get, job_id) if self.store else None
+        return _public_view(job) if job else None
+
+    def update(self, job_id: str, progress: dict | None = None, **changes) -> dict | None:
+        """
+        Updates a job and notifies subscribers. Safe to call from any thread.
+
+        The job is written to the store by the progress flusher, at most every
+        JOB_PROGRESS_SAVE_SECONDS; use save_update for changes that must be
+        stored before the caller continues.
+
+        Returns:
+            dict | None: The job's new state, or None if it is not running here.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(changes)
+            if progress:
+                job["progress"].update(progress)
+            job["updated_at"] = time.time()
+            snapshot = json.loads(json.dumps(job))
+            if job["status"] in TERMINAL_STATUSES:
+                del self._jobs[job_id]
+            self._dirty[job_id] = snapshot
+
+        self._loop.call_soon_threadsafe(self._publish, job_id, "job", _public_view(snapshot))
+        self._loop.call_soon_threadsafe(self._dirty_event.set)
+        return snapshot
+
+    async def save_update(self, job_id: str, **changes):
+        """
+        Updates a job like update and writes it to the store before returning.
+
+        The write runs in its own thread rather than the IO pool: status changes
+        must not be turned away when the pool is saturated with requests.
+        """
+        snapshot = self.update(job_id, **changes)
+        if snapshot is None:
+            return
+        try:
+            await asyncio.to_thread(self.store.save, snapshot)
+        except Exception as e:
+            # Left to the flusher, which retries
+            logger.warning(f"Could not save job {job_id} yet: {e}")
+            return
+        with self._lock:
+            if self._dirty.get(job_id) is snapshot:
+                del self._dirty[job_id]
+
+    async def _flush_progress(self):
+        while True:
+            await self._dirty_event.wait()
+            self._dirty_event.clear()
+            with self._lock:
+                snapshots = list(self._dirty.values())
+                self._dirty.clear()
+            try:
+                await run_in_pool(executor.IO, self.store.save_many, snapshots)
+            except Exception as e:
+                logger.warning(f"Could not save progress of {len(snapshots)} jobs, retrying: {e}")
+                with self._lock:
+                    for snapshot in snapshots:
+                        self._dirty.setdefault(snapshot["id"], snapshot)
+                self._dirty_event.set()
+            await asyncio.sleep(JOB_PROGRESS_SAVE_SECONDS)
+
+    # --- Leases ---
+
+    def _take_over_jobs(self) -> list[str]:
+        """
+        Claims the unfinished jobs no process owns, e.g. after a restart or when
+        their worker died. Returns the ids of the claimed jobs to queue.
+        """
+        job_ids = []
+        for job in self.store.unowned():
+            job = self.store.claim(job["id"], self.owner, JOB_LEASE_SECONDS)
+            if job is None:
+                # Claimed by another worker first
+                continue
+            if not _upload_exists(job):
+                job.update(status="failed", stage="failed", error="Upload was lost before the job could run.", updated_at=time.time())
+                self.store.save(job)
+                continue
+            job.update(status="queued", stage="queued", updated_at=time.time())
+            with self._lock:
+                self._jobs[job["id"]] = job
+            self.store.save(job)
+            job_ids.append(job["id"])
+            logger.info(f"Took over interrupted job {job['id']} for subject {job['subject']}.")
+        return job_ids
+
+    async def _renew_leases(self):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                with self._lock:
+                    job_ids = list(self._jobs)
+                if job_ids:
+                    renewed = await run_in_pool(executor.IO, self.store.renew, self.owner, job_ids, JOB_LEASE_SECONDS)
+                    if renewed < len(job_ids):
+                        logger.warning(f"Lost the lease on {len(job_ids) - renewed} jobs; another worker may run them too.")
+                for job_id in await run_in_pool(executor.IO, self._take_over_jobs):
+                    self._queue.put_nowait(job_id)
+            except Exception as e:
+                logger.warning(f"Could not renew job leases, retrying: {e}")
+
+    def publish_summary(self, job_id: str, text: str):
+        """
+        Forwards a piece of the streamed summary to subscribers. Summary pieces are
+        transient and not persisted; the full summary is saved with the materials.
+        """
+        self._loop.call_soon_threadsafe(self._publish, job_id, "summary", {"text": text})
+
+    def _publish(self, job_id: str, event: str, data: dict):
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait((event, data))
+
+    async def subscribe(self, job_id: str):
+        """
+        Yields (event, data) pairs as the job changes, starting with the current
+        state and ending once the job reaches a terminal status. Event is "job"
+        for job snapshots and "summary" for streamed summary text.
+
+        A job run by another worker is followed by polling the store, so its
+        snapshots arrive every JOB_PROGRESS_SAVE_SECONDS and no summary text is sent.
+        """
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            yield "job", job
+            while job["status"] not in TERMINAL_STATUSES:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=max(JOB_PROGRESS_SAVE_SECONDS, 0.5))
+                except asyncio.TimeoutError:
+                    with self._lock:
+                        local = job_id in self._jobs or job_id in self._dirty
+                    if local or self.store is None:
+                        continue
+                    try:
+                        stored = await run_in_pool(executor.IO, self.store.get, job_id)
+                    except HTTPException:
+                        # The IO pool is saturated; poll again later
+                        continue
+                    # The store lags behind what was published here, so older snapshots are skipped
+                    if stored is None or stored["updated_at"] <= job["updated_at"]:
+                        continue
+                    event, data = "job", _public_view(stored)
+                if event == "job":
+                    job = data
+                yield event, data
+        finally:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[job_id]
+
+    # --- Workers ---
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            # Log lines of the job's pipeline carry the job id as their trace id
+            token = trace_id_var.set(job_id)
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                # A worker must outlive any one job, or the manager slowly runs out of them
+                logger.error(f"Job worker failed on job {job_id}: {e}", exc_info=True)
+            finally:
+                trace_id_var.reset(token)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            kind, subject, payload = job["kind"], job["subject"], dict(job["payload"])
+
+        def progress(stage: str, **fields):
+            self.update(job_id, stage=stage, progress=fields)
+
+        def on_summary(text: str):
+            self.publish_summary(job_id, text)
+
+        await self.save_update(job_id, status="running", stage="starting")
+        try:
+            if kind == "file":
+                await ingest_service.ingest_file(subject, payload["filename"], _upload_path(job_id), progress, payload.get("use_cache", True), on_summary)
+            elif kind == "bulk":
+                # The checkpoint lives next to the documents, so a job interrupted by a restart resumes where it stopped
+                directory = _bulk_dir(job_id)
+                items = [
+                    bulk_service.BulkItem(item["subject"], item["filename"], os.path.join(directory, item["path"]), item.get("document_name"))
+                    for item in payload["items"]
+                ]
+                checkpoint = bulk_service.Checkpoint(os.path.join(directory, "checkpoint.jsonl"))
+                report = await bulk_service.run_bulk_import(items, checkpoint, payload.get("use_cache", True), progress)
+                await self.save_update(job_id, result=report)
+                if report["subjects_failed"]:
+                    raise HTTPException(status_code=500, detail=f"{report['subjects_failed']} of {report['subjects_total']} subjects failed.")
+            else:
+                await ingest_service.ingest_youtube(subject, payload["url"], progress, payload.get("use_cache", True), on_summary)
+            await self.save_update(job_id, status="done", stage="done")
+            logger.info(f"Job {job_id} for subject {subject} finished.")
+        except HTTPException as e:
+            await self.save_update(job_id, status="failed", stage="failed", error=e.detail)
+            logger.warning(f"Job {job_id} for subject {subject} failed: {e.detail}")
+        except Exception as e:
+            await self.save_update(job_id, status="failed", stage="failed", error=str(e))
+            logger.error(f"Job {job_id} for subject {subject} failed: {e}", exc_info=True)
+        # Cancellation skips this, so interrupted jobs keep their upload for the next start.
+        # Not in the IO pool, which may turn it away when saturated.
+        await asyncio.to_thread(_remove_upload, job_id)
+
+
+job_manager = JobManager(JOB_CONCURRENCY, JOB_QUEUE_MAX)
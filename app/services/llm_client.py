@@ -0,0 +1,270 @@
+import os
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from app.utils.metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+# --- LLM Client Configuration ---
+
+# Upstream requests in flight at once across all routes
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Per-route caps, e.g. "generate=4,ask=8". Routes not listed only share the global cap.
+LLM_ROUTE_CONCURRENCY = os.getenv("LLM_ROUTE_CONCURRENCY", "generate=4,ask=8")
+# Token bucket: sustained requests per minute (0 disables) and the burst allowed above it
+LLM_RATE_LIMIT_PER_MINUTE = float(os.getenv("LLM_RATE_LIMIT_PER_MINUTE", "60"))
+LLM_RATE_LIMIT_BURST = int(os.getenv("LLM_RATE_LIMIT_BURST", "10"))
+# Retries of transient upstream errors, with exponential backoff and full jitter
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "30"))
+
+# Gemini (google.api_core) exceptions worth retrying: quota, overload and timeouts
+TRANSIENT_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "InternalServerError", "DeadlineExceeded", "Aborted",
+}
+TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
+
+LLM_QUEUE_WAIT = histogram(
+    "flashlearn_llm_queue_wait_seconds",
+    "Time an LLM request waited for a concurrency slot and a rate-limit token.",
+    labels=("route",),
+)
+LLM_RETRIES = counter(
+    "flashlearn_llm_retries_total",
+    "LLM requests retried after a transient error, by error type.",
+    labels=("route", "reason"),
+)
+LLM_REQUESTS = counter(
+    "flashlearn_llm_requests_total",
+    "Upstream LLM requests by result.",
+    labels=("route", "result"),
+)
+LLM_COALESCED = counter(
+    "flashlearn_llm_coalesced_total",
+    "LLM calls served by an identical request that was already in flight.",
+    labels=("route",),
+)
+LLM_IN_FLIGHT = gauge(
+    "flashlearn_llm_requests_in_flight",
+    "Upstream LLM requests currently running.",
+)
+
+def is_transient(error: Exception) -> bool:
+    """
+    Returns whether an upstream error is likely to succeed on retry.
+    """
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in TRANSIENT_ERROR_NAMES:
+        return True
+    return getattr(error, "code", None) in TRANSIENT_STATUS_CODES
+
+def parse_route_limits(value: str) -> dict[str, int]:
+    limits = {}
+    for item in value.split(","):
+        route, _, limit = item.partition("=")
+        if route.strip() and limit.strip().isdigit():
+            limits[route.strip()] = int(limit)
+    return limits
+
+# --- Rate Limiting ---
+
+class TokenBucket:
+    """
+    Allows rate_per_second requests on average, with bursts of up to capacity.
+    Waiters are served in arrival order.
+    """
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+# --- Single-Flight Calls ---
+
+class _Flight:
+    """
+    One upstream call and its output so far. Every caller with the same prompt
+    and streaming mode follows it and receives all chunks from the start.
+    """
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.done = False
+        self.error: Exception | None = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, text: str):
+        self.chunks.append(text)
+        self._notify()
+
+    def finish(self, error: Exception | None = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def follow(self):
+        position = 0
+        while True:
+            while position < len(self.chunks):
+                yield self.chunks[position]
+                position += 1
+            if self.done:
+                if self.error:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+class LLMClient:
+    """
+    Wraps the generative model with the limits every caller should share:
+    a global and per-route concurrency cap, a token-bucket rate limit, retries
+    of transient errors with exponential backoff, and single-flight coalescing
+    so identical prompts in flight share one upstream call.
+
+    The upstream call runs in its own task, so a caller that goes away does not
+    cancel it for the others following the same prompt.
+    """
+    def __init__(self, get_model, max_concurrency: int = LLM_MAX_CONCURRENCY, route_limits: dict[str, int] | None = None,
+                 rate_per_minute: float = LLM_RATE_LIMIT_PER_MINUTE, burst: int = LLM_RATE_LIMIT_BURST,
+                 max_retries: int = LLM_MAX_RETRIES, retry_base_seconds: float = LLM_RETRY_BASE_SECONDS,
+                 retry_max_seconds: float = LLM_RETRY_MAX_SECONDS):
+        self._get_model = get_model
+        self.max_concurrency = max(1, max_concurrency)
+        self.route_limits = route_limits if route_limits is not None else parse_route_limits(LLM_ROUTE_CONCURRENCY)
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._loop = None
+        self._flights: dict[str, _Flight] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def _ensure_loop(self):
+        # asyncio primitives belong to one event loop; recreate them if the app runs on a new one
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._route_semaphores = {route: asyncio.Semaphore(max(1, limit)) for route, limit in self.route_limits.items()}
+            self._bucket = TokenBucket(self.rate_per_minute / 60, self.burst)
+            self._flights = {}
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt))
+
+    @asynccontextmanager
+    async def _slot(self, route: str):
+        """
+        Holds the route and global concurrency slots and a rate-limit token for one upstream attempt.
+        """
+        wait_start = time.perf_counter()
+        route_semaphore = self._route_semaphores.get(route)
+        if route_semaphore:
+            await route_semaphore.acquire()
+        try:
+            async with self._semaphore:
+                await self._bucket.acquire()
+                LLM_QUEUE_WAIT.observe(time.perf_counter() - wait_start, route=route)
+                yield
+        finally:
+            if route_semaphore:
+                route_semaphore.release()
+
+    async def _call(self, flight: _Flight, prompt: str, route: str, stream: bool):
+        attempt = 0
+        while True:
+            # The slots are given up during the backoff, so other requests can run meanwhile
+            async with self._slot(route):
+                model = await self._get_model()
+                if not model:
+                    raise RuntimeError("AI model is not available.")
+                LLM_IN_FLIGHT.inc()
+                try:
+                    if stream:
+                        response = await model.generate_content_async(prompt, stream=True)
+                        async for chunk in response:
+                            flight.publish(chunk.text)
+                    else:
+                        response = await model.generate_content_async(prompt)
+                        flight.publish(response.text)
+                    LLM_REQUESTS.inc(route=route, result="ok")
+                    return
+                except Exception as e:
+                    # Output already sent to callers cannot be taken back, so partial streams are not retried
+                    if attempt >= self.max_retries or flight.chunks or not is_transient(e):
+                        LLM_REQUESTS.inc(route=route, result="error")
+                        raise
+                    delay = self._backoff(attempt)
+                    attempt += 1
+                    LLM_RETRIES.inc(route=route, reason=type(e).__name__)
+                    logger.warning(f"LLM request ({route}) failed with {type(e).__name__}: {e}. Retry {attempt}/{self.max_retries} in {delay:.1f}s.")
+                finally:
+                    LLM_IN_FLIGHT.dec()
+            await asyncio.sleep(delay)
+
+    async def _run(self, key: str, flight: _Flight, prompt: str, route: str, stream: bool):
+        try:
+            await self._call(flight, prompt, route, stream)
+            flight.finish()
+        except Exception as e:
+            flight.finish(e)
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _join(self, prompt: str, route: str, stream: bool) -> _Flight:
+        self._ensure_loop()
+        # Streaming and non-streaming calls publish differently, so they only coalesce with their own kind
+        key = f"{'stream' if stream else 'generate'}:{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}"
+        flight = self._flights.get(key)
+        if flight is not None:
+            LLM_COALESCED.inc(route=route)
+            logger.info(f"Coalesced LLM request ({route}) with an identical one in flight.")
+            return flight
+        flight = self._flights[key] = _Flight()
+        task = asyncio.create_task(self._run(key, flight, prompt, route, stream))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return flight
+
+    async def stream(self, prompt: str, route: str):
+        """
+        Yields the response text in pieces as the model produces them.
+
+        Args:
+            prompt (str): The prompt to send.
+            route (str): The caller's route, used for per-route limits and metrics.
+        """
+        async for text in self._join(prompt, route, stream=True).follow():
+            yield text
+
+    async def generate(self, prompt: str, route: str) -> str:
+        """
+        Returns the full response text for a prompt.
+        """
+        return "".join([text async for text in self._join(prompt, route, stream=False).follow()])
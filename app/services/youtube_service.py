@@ -0,0 +1,286 @@
+import os
+import re
+import json
+import html
+import time
+import asyncio
+import tempfile
+import logging
+from urllib.parse import urlparse, parse_qs
+from fastapi import HTTPException
+from app.services import executor
+from app.services.executor import run_in_pool
+from app.utils.helpers import DB_DIR, timestamp_at
+from app.utils.metrics import counter
+from app.utils.tracing import stage
+
+logger = logging.getLogger(__name__)
+
+# --- Transcript Configuration ---
+
+# Cached transcripts older than this are fetched again (0 keeps them forever)
+YOUTUBE_CACHE_TTL_SECONDS = int(os.getenv("YOUTUBE_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+# Give up on a transcript download after this many seconds
+YOUTUBE_FETCH_TIMEOUT_SECONDS = float(os.getenv("YOUTUBE_FETCH_TIMEOUT_SECONDS", "30"))
+# Read transcripts from <video id>.srt files in this directory instead of YouTube (for offline tests)
+YOUTUBE_FIXTURE_DIR = os.getenv("YOUTUBE_FIXTURE_DIR")
+
+YOUTUBE_CACHE_DIR = os.path.join(DB_DIR, "youtube_transcripts")
+# Manual English captions first, then auto-generated ones
+CAPTION_LANGUAGE_CODES = ("en", "a.en")
+# A pause this long between captions starts a new paragraph
+PARAGRAPH_GAP_SECONDS = 2.0
+# Minimum spacing of timestamp index entries, which keeps the index small for long videos
+TIMESTAMP_INTERVAL_SECONDS = 5.0
+
+TRANSCRIPT_LOOKUPS = counter(
+    "flashlearn_youtube_transcripts_total",
+    "YouTube transcript lookups by result: hit, miss or error for the caller that downloads, coalesced for callers sharing its download.",
+    labels=("result",),
+)
+
+# --- Video Ids ---
+
+_VIDEO_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+_YOUTUBE_HOSTS = {"youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com", "youtube-nocookie.com", "www.youtube-nocookie.com"}
+_VIDEO_PATH_PREFIXES = ("shorts", "embed", "live", "v")
+
+def extract_video_id(url: str) -> str | None:
+    """
+    Returns the video id of a YouTube URL, or None if the URL does not point to a video.
+    Supports watch, youtu.be, shorts, embed and live URLs, with or without a scheme.
+    """
+    if not url:
+        return None
+    parsed = urlparse(url.strip() if "://" in url else f"https://{url.strip()}")
+    host = (parsed.hostname or "").lower()
+    parts = [part for part in parsed.path.split("/") if part]
+    video_id = None
+    if host == "youtu.be" and parts:
+        video_id = parts[0]
+    elif host in _YOUTUBE_HOSTS:
+        if parts == ["watch"]:
+            video_id = parse_qs(parsed.query).get("v", [None])[0]
+        elif len(parts) >= 2 and parts[0] in _VIDEO_PATH_PREFIXES:
+            video_id = parts[1]
+    return video_id if video_id and _VIDEO_ID.match(video_id) else None
+
+# --- SRT Normalization ---
+
+class Transcript:
+    """
+    A video's transcript as plain text, with a compact index of (character
+    offset, seconds) pairs that maps positions in the text back to the video.
+    """
+    def __init__(self, video_id: str, text: str, timestamps: list[tuple[int, float]]):
+        self.video_id = video_id
+        self.text = text
+        self.timestamps = timestamps
+
+    def seconds_at(self, offset: int) -> float | None:
+        """
+        Returns the time in the video at which the text at offset is spoken.
+        """
+        return timestamp_at(self.timestamps, offset)
+
+    def to_dict(self) -> dict:
+        return {"video_id": self.video_id, "text": self.text, "timestamps": self.timestamps}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Transcript":
+        return cls(data["video_id"], data["text"], [(offset, seconds) for offset, seconds in data["timestamps"]])
+
+_SRT_TIMING = re.compile(
+    r"^\s*(\d+):(\d{2}):(\d{2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{2}):(\d{2})[,.](\d{1,3})"
+)
+_CAPTION_MARKUP = re.compile(r"<[^>]*>|\{\\[^}]*\}")
+
+def _seconds(hours: str, minutes: str, seconds: str, millis: str) -> float:
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(millis.ljust(3, "0")) / 1000
+
+def parse_srt(srt: str) -> tuple[str, list[tuple[int, float]]]:
+    """
+    Converts SRT captions to plain text and a timestamp index.
+
+    Sequence numbers, timing lines and formatting tags are dropped, and lines
+    that auto-generated captions repeat from the previous cue are kept once.
+    Captions are joined with spaces, and longer pauses start a new paragraph.
+
+    Returns:
+        tuple: The text and a list of (character offset, seconds) pairs, at most
+            one per TIMESTAMP_INTERVAL_SECONDS.
+    """
+    cues = []
+    lines = srt.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    for i, line in enumerate(lines):
+        timing = _SRT_TIMING.match(line)
+        if timing:
+            # The sequence number above a timing line belongs to the new cue, not the previous one's text
+            if cues and cues[-1][2] and lines[i - 1].strip().isdigit():
+                cues[-1][2].pop()
+            cues.append((_seconds(*timing.groups()[:4]), _seconds(*timing.groups()[4:]), []))
+        elif cues and line.strip():
+            cues[-1][2].append(line)
+
+    parts = []
+    length = 0
+    timestamps: list[tuple[int, float]] = []
+    previous_line = None
+    previous_end = None
+    for start, end, cue_lines in cues:
+        texts = []
+        for line in cue_lines:
+            line = " ".join(html.unescape(_CAPTION_MARKUP.sub("", line)).split())
+            if line and line != previous_line:
+                texts.append(line)
+                previous_line = line
+        if texts:
+            if parts:
+                separator = "\n" if previous_end is not None and start - previous_end >= PARAGRAPH_GAP_SECONDS else " "
+                parts.append(separator)
+                length += 1
+            if not timestamps or start - timestamps[-1][1] >= TIMESTAMP_INTERVAL_SECONDS:
+                timestamps.append((length, round(start, 3)))
+            text = " ".join(texts)
+            parts.append(text)
+            length += len(text)
+        previous_end = end
+    return "".join(parts), timestamps
+
+# --- Transcript Sources ---
+
+class PytubeSource:
+    """
+    Downloads English captions from YouTube with pytube. Blocking; runs in the I/O pool.
+    """
+    def fetch_srt(self, video_id: str) -> str | None:
+        # Imported here so the app starts without pytube's import cost
+        from pytube import YouTube
+
+        yt = YouTube(f"https://www.youtube.com/watch?v={video_id}")
+        yt.check_availability()
+        for language_code in CAPTION_LANGUAGE_CODES:
+            caption = yt.captions.get_by_language_code(language_code)
+            if caption:
+                return caption.generate_srt_captions()
+        return None
+
+class FixtureSource:
+    """
+    Reads captions from <video id>.srt files in a local directory.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def fetch_srt(self, video_id: str) -> str | None:
+        path = os.path.join(self.directory, f"{video_id}.srt")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+# Can be replaced, e.g. by tests or to plug in another caption provider
+transcript_source = FixtureSource(YOUTUBE_FIXTURE_DIR) if YOUTUBE_FIXTURE_DIR else PytubeSource()
+
+# --- Transcript Cache ---
+
+class TranscriptCache:
+    """
+    Stores normalized transcripts as one JSON file per video id.
+    """
+    def __init__(self, directory: str, ttl_seconds: int):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+
+    def _path(self, video_id: str) -> str:
+        return os.path.join(self.directory, f"{video_id}.json")
+
+    def get(self, video_id: str) -> Transcript | None:
+        try:
+            with open(self._path(video_id), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if self.ttl_seconds and time.time() - data.get("fetched_at", 0) > self.ttl_seconds:
+            return None
+        return Transcript.from_dict(data)
+
+    def put(self, transcript: Transcript):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial transcript
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({**transcript.to_dict(), "fetched_at": time.time()}, f)
+        os.replace(temp_path, self._path(transcript.video_id))
+
+transcript_cache = TranscriptCache(YOUTUBE_CACHE_DIR, YOUTUBE_CACHE_TTL_SECONDS)
+
+# --- Fetching ---
+
+# Downloads in flight by video id, so concurrent requests for one video share a download
+_in_flight: dict[str, asyncio.Task] = {}
+
+async def _download(video_id: str) -> Transcript:
+    # Counted here rather than by each caller, so a shared download counts once
+    try:
+        transcript = await _fetch(video_id)
+    except Exception:
+        TRANSCRIPT_LOOKUPS.inc(result="error")
+        raise
+    TRANSCRIPT_LOOKUPS.inc(result="miss")
+    return transcript
+
+async def _fetch(video_id: str) -> Transcript:
+    with stage("youtube_fetch") as timer:
+        try:
+            srt = await asyncio.wait_for(
+                run_in_pool(executor.TRANSCRIPT, transcript_source.fetch_srt, video_id), YOUTUBE_FETCH_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Timed out fetching the transcript for this video.")
+        if not srt:
+            logger.error(f"Could not retrieve any English transcript for video {video_id}")
+            raise HTTPException(status_code=400, detail="Could not retrieve transcript for this video.")
+        text, timestamps = parse_srt(srt)
+        timer.input_chars = len(srt)
+        timer.output_chars = len(text)
+
+    if not text:
+        raise HTTPException(status_code=400, detail="Could not retrieve transcript for this video.")
+    transcript = Transcript(video_id, text, timestamps)
+    await run_in_pool(executor.IO, transcript_cache.put, transcript)
+    logger.info(f"Fetched transcript for video {video_id}: {len(srt)} SRT chars normalized to {len(text)}.")
+    return transcript
+
+async def get_transcript(url: str) -> Transcript:
+    """
+    Returns the normalized transcript of a YouTube video, from the on-disk cache
+    if it was fetched before.
+
+    Raises:
+        HTTPException: If the URL is invalid, the video has no English transcript or the download times out.
+    """
+    video_id = extract_video_id(url)
+    if not video_id:
+        raise HTTPException(status_code=400, detail="Invalid YouTube URL provided.")
+
+    transcript = await run_in_pool(executor.IO, transcript_cache.get, video_id)
+    if transcript is not None:
+        TRANSCRIPT_LOOKUPS.inc(result="hit")
+        logger.info(f"Using cached transcript for video {video_id}.")
+        return transcript
+
+    task = _in_flight.get(video_id)
+    if task is None:
+        task = _in_flight[video_id] = asyncio.create_task(_download(video_id))
+        task.add_done_callback(lambda _: _in_flight.pop(video_id, None))
+    else:
+        TRANSCRIPT_LOOKUPS.inc(result="coalesced")
+    try:
+        # Shielded so a caller that goes away does not cancel the download for the others
+        return await asyncio.shield(task)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get transcript from YouTube URL {url}: {e}", exc_info=True)
+        raise
@@ -0,0 +1,111 @@
+import time
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+from app.utils.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_REQUESTS = counter(
+    "flashlearn_answer_cache_requests_total",
+    "Semantic answer cache lookups by result.",
+    labels=("result",),
+)
+
+class _SubjectEntries:
+    def __init__(self):
+        self.entries: OrderedDict[int, tuple[np.ndarray, str, int, float]] = OrderedDict()
+        self.next_id = 0
+
+class SemanticAnswerCache:
+    """
+    Caches RAG answers per subject and serves them for new questions whose
+    embedding is within a cosine-similarity threshold of a cached question.
+
+    An entry is only served while the subject's document version matches the
+    version it was cached under, and while it is younger than ttl_seconds.
+    Entries are evicted least-recently-used, both per subject and across subjects.
+    """
+    def __init__(self, threshold: float, ttl_seconds: int, max_entries_per_subject: int, max_subjects: int):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_subject = max_entries_per_subject
+        self.max_subjects = max_subjects
+        self._lock = threading.Lock()
+        self._subjects: OrderedDict[str, _SubjectEntries] = OrderedDict()
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, subject: str, embedding, version: int) -> str | None:
+        """
+        Returns a cached answer for a semantically equivalent question, or None.
+        """
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            subject_entries = self._subjects.get(subject)
+            best_id, best_score = None, self.threshold
+            if subject_entries:
+                self._subjects.move_to_end(subject)
+                for entry_id, (vector, _, entry_version, created_at) in list(subject_entries.entries.items()):
+                    if entry_version != version or now - created_at > self.ttl_seconds:
+                        del subject_entries.entries[entry_id]
+                        continue
+                    score = float(vector @ query)
+                    if score >= best_score:
+                        best_id, best_score = entry_id, score
+
+            if best_id is None:
+                ANSWER_CACHE_REQUESTS.inc(result="miss")
+                return None
+            subject_entries.entries.move_to_end(best_id)
+            answer = subject_entries.entries[best_id][1]
+
+        ANSWER_CACHE_REQUESTS.inc(result="hit")
+        logger.info(f"Answer cache hit for subject {subject} (similarity {best_score:.3f}).")
+        return answer
+
+    def store(self, subject: str, embedding, answer: str, version: int):
+        """
+        Caches an answer for a question embedding under the subject's document version.
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            subject_entries = self._subjects.get(subject)
+            if subject_entries is None:
+                subject_entries = self._subjects[subject] = _SubjectEntries()
+            self._subjects.move_to_end(subject)
+            subject_entries.entries[subject_entries.next_id] = (vector, answer, version, time.time())
+            subject_entries.next_id += 1
+            while len(subject_entries.entries) > self.max_entries_per_subject:
+                subject_entries.entries.popitem(last=False)
+            while len(self._subjects) > self.max_subjects:
+                self._subjects.popitem(last=False)
+
+    def invalidate(self, subject: str):
+        """
+        Drops every cached answer for a subject.
+        """
+        with self._lock:
+            self._subjects.pop(subject, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = sum(len(subject_entries.entries) for subject_entries in self._subjects.values())
+            subjects = len(self._subjects)
+        hits = ANSWER_CACHE_REQUESTS.value(result="hit")
+        misses = ANSWER_CACHE_REQUESTS.value(result="miss")
+        return {
+            "subjects": subjects,
+            "entries": entries,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": int(hits),
+            "misses": int(misses),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
@@ -0,0 +1,156 @@
+import time
+import asyncio
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- Lazily Initialized Components ---
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+# A component that failed to load is retried on first use after this many seconds
+RETRY_AFTER_SECONDS = 30
+
+class LazyComponent:
+    """
+    A heavy resource (a model, a database client) that is created on first use
+    instead of at import time.
+
+    The loader runs at most once at a time; concurrent callers wait for it. If it
+    fails, get() returns None, matching how the app treated resources that failed
+    to load at import, and the load is retried after RETRY_AFTER_SECONDS.
+    """
+    def __init__(self, name: str, description: str, loader, warmup=None, required: bool = True):
+        self.name = name
+        self.description = description
+        self.required = required
+        self._loader = loader
+        self._warmup = warmup
+        self._lock = threading.Lock()
+        self._value = None
+        self.state = PENDING
+        self.error: str | None = None
+        self.load_seconds: float | None = None
+        self.warmup_seconds: float | None = None
+        self._failed_at = 0.0
+
+    def get(self):
+        """
+        Returns the resource, loading it first if needed, or None if it is unavailable.
+        """
+        if self.state == READY:
+            return self._value
+        with self._lock:
+            if self.state == READY:
+                return self._value
+            if self.state == FAILED and time.monotonic() - self._failed_at < RETRY_AFTER_SECONDS:
+                return None
+
+            self.state = LOADING
+            start = time.perf_counter()
+            try:
+                value = self._loader()
+            except Exception as e:
+                self.state = FAILED
+                self.error = str(e)
+                self._failed_at = time.monotonic()
+                logger.error(f"Failed to initialize {self.name}: {e}", exc_info=True)
+                return None
+
+            self._value = value
+            self.load_seconds = time.perf_counter() - start
+            self.error = None
+            self.state = READY
+            logger.info(f"Initialized {self.name} in {self.load_seconds:.2f}s.")
+            return value
+
+    async def get_async(self):
+        """
+        Like get(), but loads in a worker thread so the event loop is not blocked.
+        """
+        if self.state == READY:
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+    def require(self):
+        """
+        Returns the resource or raises RuntimeError if it is unavailable.
+        """
+        value = self.get()
+        if value is None:
+            raise RuntimeError(f"{self.description} is not available.")
+        return value
+
+    def warm_up(self):
+        """
+        Loads the resource and runs its warmup hook once, e.g. a dummy encode so
+        the first real request does not pay for lazy weight initialization.
+        """
+        value = self.get()
+        if value is None or self._warmup is None or self.warmup_seconds is not None:
+            return
+        start = time.perf_counter()
+        try:
+            self._warmup(value)
+        except Exception as e:
+            logger.warning(f"Warmup of {self.name} failed: {e}")
+            return
+        self.warmup_seconds = time.perf_counter() - start
+        logger.info(f"Warmed up {self.name} in {self.warmup_seconds:.2f}s.")
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "required": self.required,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+        }
+
+
+components: dict[str, LazyComponent] = {}
+
+def component(name: str, description: str, loader, warmup=None, required: bool = True) -> LazyComponent:
+    """
+    Creates a lazily initialized component and registers it for warm_up_all() and readiness().
+
+    Args:
+        name (str): The name reported by /ready and in startup logs.
+        description (str): Used in the error raised by require().
+        loader (callable): Creates the resource. Called with no arguments.
+        warmup (callable, optional): Called with the loaded resource by warm_up().
+        required (bool): Whether the app is not ready until this component has loaded.
+    """
+    lazy = LazyComponent(name, description, loader, warmup, required)
+    components[name] = lazy
+    return lazy
+
+def warm_up_all():
+    """
+    Loads and warms up every registered component in registration order.
+    This blocks, so the lifespan hook runs it in a background thread.
+    """
+    start = time.perf_counter()
+    for lazy in list(components.values()):
+        lazy.warm_up()
+    logger.info(f"Startup warmup finished in {time.perf_counter() - start:.2f}s.")
+
+def readiness(require_loaded: bool = True) -> tuple[bool, dict]:
+    """
+    Returns whether the app can serve requests and the state of each component.
+
+    A required component that failed always makes the app not ready. If
+    require_loaded is True, required components must also have finished loading;
+    otherwise components that have not been used yet are assumed to load on demand.
+    """
+    ready = True
+    for lazy in components.values():
+        if not lazy.required:
+            continue
+        if lazy.state == FAILED or (require_loaded and lazy.state != READY):
+            ready = False
+    return ready, {name: lazy.status() for name, lazy in components.items()}
@@ -0,0 +1,172 @@
+import time
+import hashlib
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Documents of subjects created before subjects held several documents
+LEGACY_DOCUMENT_ID = "legacy"
+LEGACY_DOCUMENT_NAME = "Earlier uploads"
+
+def document_id_for(source: str) -> str:
+    """
+    Returns the id of the document added from source (a file name, archive path
+    or video URL). Adding a document from the same source again replaces it.
+    """
+    return hashlib.sha256(source.strip().encode("utf-8")).hexdigest()[:16]
+
+# --- Document Store ---
+
+class DocumentStore:
+    """
+    Stores the materials generated for each document of a subject as
+    ready-to-send JSON bytes, in an embedded SQLite database.
+
+    Every change to a subject's documents bumps the subject's revision, so a
+    writer can tell whether the documents changed while it was merging them.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "subject TEXT NOT NULL, document_id TEXT NOT NULL, name TEXT NOT NULL, summary TEXT NOT NULL, "
+            "body BLOB NOT NULL, added_at REAL NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (subject, document_id))"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS subject_revisions (subject TEXT PRIMARY KEY, revision INTEGER NOT NULL)")
+
+    def _bump_revision(self, subject: str):
+        self._conn.execute(
+            "INSERT INTO subject_revisions (subject, revision) VALUES (?, 1) "
+            "ON CONFLICT (subject) DO UPDATE SET revision = revision + 1",
+            (subject,)
+        )
+
+    def put(self, subject: str, document_id: str, name: str, summary: str, body: bytes, replace: bool = True, added_at: float | None = None):
+        """
+        Stores a document's materials. A replaced document keeps its position
+        (added_at) among the subject's documents.
+        """
+        now = time.time()
+        conflict = "DO UPDATE SET name = excluded.name, summary = excluded.summary, body = excluded.body, updated_at = excluded.updated_at" if replace else "DO NOTHING"
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(
+                    "INSERT INTO documents (subject, document_id, name, summary, body, added_at, updated_at) "
+                    f"VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (subject, document_id) {conflict}",
+                    (subject, document_id, name, summary, body, added_at or now, now)
+                )
+                if cursor.rowcount:
+                    self._bump_revision(subject)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, subject: str, document_id: str) -> bytes | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM documents WHERE subject = ? AND document_id = ?", (subject, document_id)
+            ).fetchone()
+        return row[0] if row else None
+
+    def list_documents(self, subject: str) -> list[dict]:
+        """
+        Returns {"id", "name", "summary", "added_at", "updated_at"} for each of the
+        subject's documents, in the order they were added.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT document_id, name, summary, added_at, updated_at FROM documents "
+                "WHERE subject = ? ORDER BY added_at, document_id",
+                (subject,)
+            ).fetchall()
+        return [dict(zip(("id", "name", "summary", "added_at", "updated_at"), row)) for row in rows]
+
+    def snapshot(self, subject: str) -> tuple[int, list[bytes]]:
+        """
+        Returns the subject's revision and the bodies of its documents in the
+        order they were added, read consistently.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute("SELECT revision FROM subject_revisions WHERE subject = ?", (subject,)).fetchone()
+                bodies = [body for (body,) in self._conn.execute(
+                    "SELECT body FROM documents WHERE subject = ? ORDER BY added_at, document_id", (subject,)
+                )]
+            finally:
+                self._conn.execute("COMMIT")
+        return (row[0] if row else 0), bodies
+
+    def revision(self, subject: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT revision FROM subject_revisions WHERE subject = ?", (subject,)).fetchone()
+        return row[0] if row else 0
+
+    def has_documents(self, subject: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM documents WHERE subject = ? LIMIT 1", (subject,)).fetchone() is not None
+
+    def delete(self, subject: str, document_id: str) -> bool:
+        """
+        Deletes a document's materials. Returns False if there was no such document.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                deleted = self._conn.execute(
+                    "DELETE FROM documents WHERE subject = ? AND document_id = ?", (subject, document_id)
+                ).rowcount
+                if deleted:
+                    self._bump_revision(subject)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return bool(deleted)
+
+# --- Merging ---
+
+def _normalized(text) -> str:
+    return " ".join(str(text or "").split()).casefold()
+
+def merge_materials(documents: list[dict]) -> dict:
+    """
+    Combines the materials of a subject's documents into the subject's materials
+    without calling the AI.
+
+    The summary is each document's summary under its name (or the only summary
+    as-is), and the quiz and flashcards are concatenated in document order,
+    keeping the first of questions or terms that repeat.
+
+    Args:
+        documents (list[dict]): Per-document materials with "name", "summary",
+            "quiz" and "flashcards", in the order the documents were added.
+    """
+    summaries = [(document.get("name", ""), document.get("summary") or "") for document in documents]
+    summaries = [(name, summary) for name, summary in summaries if summary.strip()]
+    if len(summaries) == 1:
+        summary = summaries[0][1]
+    else:
+        summary = "\n\n".join(f"{name}\n{summary}" for name, summary in summaries)
+
+    quiz, seen_questions = [], set()
+    flashcards, seen_terms = [], set()
+    for document in documents:
+        for question in document.get("quiz", []):
+            key = _normalized(question.get("question"))
+            if key not in seen_questions:
+                seen_questions.add(key)
+                quiz.append(question)
+        for card in document.get("flashcards", []):
+            key = _normalized(card.get("term"))
+            if key not in seen_terms:
+                seen_terms.add(key)
+                flashcards.append(card)
+    return {"summary": summary, "quiz": quiz, "flashcards": flashcards}
@@ -0,0 +1,179 @@
+import os
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- Embedding Backend Configuration ---
+
+# "sentence-transformers" (default) runs the model in PyTorch at full precision.
+# "onnx" runs an int8-quantized ONNX export with ONNX Runtime, which is faster
+# on CPU-only machines and does not import PyTorch.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers").lower()
+# Texts per forward pass inside the backend
+EMBEDDING_MODEL_BATCH_SIZE = int(os.getenv("EMBEDDING_MODEL_BATCH_SIZE", "32"))
+# CPU threads used by the model; 0 keeps the library default (usually one per core)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# Precision of vectors kept in the embedding cache: float32 or float16 (half the size)
+EMBEDDING_STORAGE_DTYPE = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32").lower()
+# ONNX file within the model repository; the default is the int8 model quantized for AVX2 CPUs
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+# Local directory with tokenizer.json and the ONNX file, for machines without Hugging Face Hub access
+EMBEDDING_ONNX_MODEL_DIR = os.getenv("EMBEDDING_ONNX_MODEL_DIR")
+
+# Longer inputs are truncated, as sentence-transformers does for this model family
+MAX_SEQUENCE_TOKENS = 256
+
+def storage_dtype() -> np.dtype:
+    if EMBEDDING_STORAGE_DTYPE not in ("float32", "float16"):
+        logger.warning(f"Unknown EMBEDDING_STORAGE_DTYPE '{EMBEDDING_STORAGE_DTYPE}', using float32.")
+        return np.dtype(np.float32)
+    return np.dtype(EMBEDDING_STORAGE_DTYPE)
+
+# --- Backends ---
+
+class EmbeddingBackend:
+    """
+    Turns texts into normalized embedding vectors. Exposes the two methods of
+    SentenceTransformer the app uses, so backends are interchangeable with it.
+    """
+    name = "base"
+
+    def __init__(self, model_name: str, batch_size: int, threads: int):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.threads = threads
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def get_sentence_embedding_dimension(self) -> int:
+        raise NotImplementedError
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """
+    The full-precision PyTorch model, through sentence-transformers.
+    """
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str, batch_size: int, threads: int):
+        super().__init__(model_name, batch_size, threads)
+        # Imported here because PyTorch is slow to import
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        return self.model.encode(list(texts), batch_size=self.batch_size, convert_to_numpy=True)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    An ONNX export of the model run with ONNX Runtime, by default the int8
+    quantized file published with the model.
+
+    Reproduces the sentence-transformers pipeline: tokenize with truncation,
+    mean-pool the token embeddings over the attention mask and L2-normalize.
+    Texts are sorted by length before batching so batches carry little padding.
+    """
+    name = "onnx"
+
+    def __init__(self, model_name: str, batch_size: int, threads: int, onnx_file: str = EMBEDDING_ONNX_FILE, model_dir: str | None = EMBEDDING_ONNX_MODEL_DIR):
+        super().__init__(model_name, batch_size, threads)
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        if model_dir:
+            tokenizer_path = os.path.join(model_dir, "tokenizer.json")
+            model_path = os.path.join(model_dir, onnx_file)
+            if not os.path.exists(model_path):
+                model_path = os.path.join(model_dir, os.path.basename(onnx_file))
+        else:
+            from huggingface_hub import hf_hub_download
+            repository = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+            tokenizer_path = hf_hub_download(repository, "tokenizer.json")
+            model_path = hf_hub_download(repository, onnx_file)
+        self.onnx_file = onnx_file
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=MAX_SEQUENCE_TOKENS)
+        pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+        dimension = self.session.get_outputs()[0].shape[-1]
+        self._dimension = dimension if isinstance(dimension, int) else None
+        logger.info(f"Loaded ONNX embedding model {model_path}.")
+
+    def _encode_batch(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        mask = attention_mask[..., None].astype(np.float32)
+        vectors = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors.astype(np.float32)
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            batch_vectors = self._encode_batch([texts[i] for i in batch])
+            if not vectors.shape[1]:
+                vectors = np.empty((len(texts), batch_vectors.shape[1]), dtype=np.float32)
+            vectors[batch] = batch_vectors
+        return vectors
+
+    def get_sentence_embedding_dimension(self) -> int:
+        if self._dimension is None:
+            self._dimension = self._encode_batch(["dimension"]).shape[1]
+        return self._dimension
+
+BACKENDS = {backend.name: backend for backend in (SentenceTransformerBackend, OnnxBackend)}
+
+def _backend_class(name: str) -> type[EmbeddingBackend]:
+    if name not in BACKENDS:
+        logger.warning(f"Unknown EMBEDDING_BACKEND '{name}', using sentence-transformers.")
+        return SentenceTransformerBackend
+    return BACKENDS[name]
+
+def load_embedding_backend(model_name: str, name: str = EMBEDDING_BACKEND) -> EmbeddingBackend:
+    """
+    Loads the configured embedding backend for a model.
+    """
+    backend = _backend_class(name)(model_name, EMBEDDING_MODEL_BATCH_SIZE, EMBEDDING_THREADS)
+    logger.info(f"Using the {backend.name} embedding backend (batch size {backend.batch_size}, threads {backend.threads or 'default'}).")
+    return backend
+
+def embedding_cache_key(model_name: str, name: str = EMBEDDING_BACKEND) -> str:
+    """
+    Identifies the vectors the configured backend produces, so cached vectors
+    from another backend or storage precision are never mixed in.
+    Full-precision sentence-transformers vectors keep the plain model name,
+    which is what the cache used before backends were configurable.
+    """
+    key = model_name
+    if _backend_class(name) is OnnxBackend:
+        key += f":onnx:{EMBEDDING_ONNX_FILE}"
+    if storage_dtype() != np.float32:
+        key += f":{storage_dtype().name}"
+    return key
@@ -0,0 +1,134 @@
+import time
+import queue
+import asyncio
+import threading
+import logging
+from concurrent.futures import Future
+import numpy as np
+from app.utils.metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BATCH_SIZE = histogram(
+    "flashlearn_embedding_batch_size",
+    "Number of texts encoded per model forward pass by the embedding batcher.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+EMBEDDING_BATCH_REQUESTS = histogram(
+    "flashlearn_embedding_batch_requests",
+    "Number of caller requests merged into one embedding batch.",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+EMBEDDING_BATCH_SECONDS = histogram(
+    "flashlearn_embedding_batch_seconds",
+    "Time spent in the model for one embedding batch.",
+)
+
+class EmbeddingBatcher:
+    """
+    Merges encode requests from concurrent callers into batched model calls.
+
+    A single background thread owns the model. It takes the first waiting
+    request, then keeps collecting requests for up to max_wait_ms or until
+    max_batch_size texts are pending, runs one encode call and hands each caller
+    its slice of the result. Callers on the event loop use encode_async; callers
+    on pool threads use encode.
+    """
+    def __init__(self, encode, max_batch_size: int, max_wait_ms: float):
+        self._encode = encode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="flashlearn-embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, texts: list[str]) -> Future:
+        """
+        Queues texts for encoding and returns a future for their vectors.
+        """
+        future = Future()
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return future
+        self._ensure_started()
+        self._queue.put((list(texts), future))
+        return future
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """
+        Encodes texts, blocking the calling thread until the batch completes.
+        """
+        return self.submit(texts).result()
+
+    async def encode_async(self, texts: list[str]) -> np.ndarray:
+        """
+        Encodes texts without blocking the event loop.
+        """
+        return await asyncio.wrap_future(self.submit(texts))
+
+    def close(self):
+        """
+        Stops the batcher thread after the queued requests are processed.
+        """
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join(timeout=5)
+                self._thread = None
+
+    def _collect(self, first) -> tuple[list, bool]:
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+            size += len(item[0])
+        return batch, False
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, stop = self._collect(first)
+            # Skip requests whose callers have gone away
+            batch = [(texts, future) for texts, future in batch if future.set_running_or_notify_cancel()]
+            if batch:
+                self._encode_batch(batch)
+            if stop:
+                return
+
+    def _encode_batch(self, batch: list):
+        texts = [text for request_texts, _ in batch for text in request_texts]
+        start = time.perf_counter()
+        try:
+            vectors = np.asarray(self._encode(texts))
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(texts)} texts failed: {e}", exc_info=True)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        EMBEDDING_BATCH_SECONDS.observe(time.perf_counter() - start)
+        EMBEDDING_BATCH_SIZE.observe(len(texts))
+        EMBEDDING_BATCH_REQUESTS.observe(len(batch))
+
+        offset = 0
+        for request_texts, future in batch:
+            future.set_result(vectors[offset:offset + len(request_texts)])
+            offset += len(request_texts)
@@ -0,0 +1,93 @@
+import sqlite3
+import threading
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """
+    Persists chunk embeddings keyed by (model name, chunk hash) so unchanged
+    chunks never go through the model twice.
+
+    Vectors are stored as raw float32 bytes, or float16 bytes when dtype is
+    float16, which halves the cache at a small loss of precision. When the
+    cache holds more than max_entries vectors, the oldest ones are dropped
+    first, down to PRUNE_TO of max_entries so pruning only happens now and then.
+    """
+    # Fraction of max_entries left after pruning
+    PRUNE_TO = 0.9
+
+    def __init__(self, path: str, model_name: str, max_entries: int, dtype=np.float32):
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        # Upper bound on the number of stored vectors (replaced rows count as new), recounted when it passes max_entries
+        self._count_bound = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, hash))"
+            )
+            self._count_bound = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return self._conn
+
+    def get_many(self, hashes: list[str]) -> dict[str, list[float]]:
+        """
+        Returns the cached vectors for the given chunk hashes. Unknown hashes are omitted.
+        """
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [self.model_name, *batch]
+                ).fetchall()
+                for chunk_hash, vector in rows:
+                    found[chunk_hash] = np.frombuffer(vector, dtype=self.dtype).astype(np.float32).tolist()
+        return found
+
+    def put_many(self, items: dict[str, list[float]]):
+        """
+        Stores vectors for the given chunk hashes.
+        """
+        if not items:
+            return
+        rows = [
+            (self.model_name, chunk_hash, np.asarray(vector, dtype=self.dtype).tobytes())
+            for chunk_hash, vector in items.items()
+        ]
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)", rows)
+                self._count_bound += len(rows)
+                if self._count_bound > self.max_entries:
+                    total = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                    if total > self.max_entries:
+                        keep = int(self.max_entries * self.PRUNE_TO)
+                        conn.execute(
+                            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY rowid LIMIT ?)",
+                            (total - keep,)
+                        )
+                        total = keep
+                    self._count_bound = total
+                conn.execute("COMMIT")
+            except BaseException:
+                # Leave the shared connection usable for the next transaction
+                conn.execute("ROLLBACK")
+                self._count_bound = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                raise
@@ -1,161 +1,947 @@
-import chromadb
 import os
+import re
 import json
-from sentence_transformers import SentenceTransformer
+import time
+import bisect
+import hashlib
 import logging
+import zlib
+from collections import deque
+from app.services import executor
+from app.utils.components import component
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.embedding_backends import load_embedding_backend, embedding_cache_key, storage_dtype
+from app.utils.materials_store import (
+    MaterialsStore, SQLiteMaterialsStore, ChromaMaterialsStore,
+    serialize_materials, migrate_from_chroma, LEGACY_MIGRATION_KEY,
+)
+from app.utils.document_store import DocumentStore, merge_materials, document_id_for, LEGACY_DOCUMENT_ID, LEGACY_DOCUMENT_NAME
+from app.utils.metrics import LLM_TIME_TO_FIRST_TOKEN
+from app.utils.responses import json_bytes
+from app.utils.tracing import stage
+from app.utils.answer_cache import SemanticAnswerCache
+from app.utils.subject_index import SubjectVectorIndex
+from app.utils.embedding_batcher import EmbeddingBatcher
+from app.utils.index_ipc import IndexClient, RemoteChromaClient, RemoteEmbeddingModel
 
 logger = logging.getLogger(__name__)
 
 # --- Database and Embedding Configuration ---
 
-# Initialize a persistent ChromaDB client
-DB_DIR = os.path.join(os.path.dirname(__file__), "..", "db")
+# The Chroma client, the embedding model and the materials store are heavy, so they
+# are created on first use (or by the startup warmup) rather than at import.
+DB_DIR = os.getenv("FLASHLEARN_DB_DIR") or os.path.join(os.path.dirname(__file__), "..", "db")
 if not os.path.exists(DB_DIR):
     os.makedirs(DB_DIR)
-client = chromadb.PersistentClient(path=DB_DIR)
 
-# Initialize the sentence transformer model for embeddings
+# "local" loads the embedding model and Chroma in this process. "remote" uses the
+# ones owned by the index server (python -m app.index_server), so that several API
+# workers share one model and one Chroma writer; see app/serve.py.
+INDEX_SERVER_MODE = os.getenv("INDEX_SERVER_MODE", "local").lower()
+# Unix socket path, or host:port
+INDEX_SERVER_ADDRESS = os.getenv("INDEX_SERVER_ADDRESS") or os.path.join(DB_DIR, "index_server.sock")
+INDEX_SERVER_KEY_PATH = os.path.join(DB_DIR, "index_server.key")
+
+index_client = IndexClient(INDEX_SERVER_ADDRESS, INDEX_SERVER_KEY_PATH) if INDEX_SERVER_MODE == "remote" else None
+
+def _load_chroma_client():
+    if index_client:
+        return RemoteChromaClient(index_client)
+    import chromadb
+    return chromadb.PersistentClient(path=DB_DIR)
+
+_chroma_client = component("chroma", "Vector database", _load_chroma_client)
+
+def get_chroma_client():
+    """
+    Returns the Chroma client. Raises RuntimeError if unavailable.
+    """
+    return _chroma_client.require()
+
 # Using a lightweight model for efficiency
-try:
-    embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-    logger.info("SentenceTransformer model loaded successfully.")
-except Exception as e:
-    logger.error(f"Failed to load SentenceTransformer model: {e}", exc_info=True)
-    embedding_model = None
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+def _load_embedding_model():
+    if index_client:
+        return RemoteEmbeddingModel(index_client)
+    # EMBEDDING_BACKEND picks sentence-transformers or the quantized ONNX model (see app/utils/embedding_backends.py)
+    return load_embedding_backend(EMBEDDING_MODEL_NAME)
+
+_embedding_model = component(
+    "embedding_model", "Embedding model", _load_embedding_model,
+    warmup=lambda model: model.encode(["FlashLearn warmup"]),
+)
+
+def get_embedding_model():
+    """
+    Returns the embedding backend, loading it on first use, or None if it failed to load.
+    """
+    return _embedding_model.get()
+
+def _encode(texts: list[str]):
+    return _embedding_model.require().encode(texts)
+
+# Encode calls from concurrent requests are merged into batched forward passes.
+# The batcher thread loads the model on its first batch if warmup has not.
+embedding_batcher = EmbeddingBatcher(
+    _encode,
+    max_batch_size=int(os.getenv("EMBEDDING_BATCHER_MAX_BATCH", "64")),
+    max_wait_ms=float(os.getenv("EMBEDDING_BATCHER_MAX_WAIT_MS", "5")),
+)
+
+_document_collection = component(
+    "document_collection", "Vector database",
+    lambda: _chroma_client.require().get_or_create_collection(name="flashlearn_documents"),
+)
+
+def get_document_collection():
+    """
+    Returns the Chroma collection holding document chunks. Raises RuntimeError if unavailable.
+    """
+    return _document_collection.require()
+
+# Subject materials live in a separate store. "sqlite" (default) keeps them in an
+# embedded database; "chroma" keeps the legacy flashlearn_subjects collection.
+MATERIALS_STORE_BACKEND = os.getenv("MATERIALS_STORE", "sqlite").lower()
+LEGACY_SUBJECT_COLLECTION = "flashlearn_subjects"
+
+def _create_materials_store() -> MaterialsStore:
+    if MATERIALS_STORE_BACKEND == "chroma":
+        embedding_model = get_embedding_model()
+        dimension = embedding_model.get_sentence_embedding_dimension() if embedding_model else 0
+        return ChromaMaterialsStore(_chroma_client.require().get_or_create_collection(name=LEGACY_SUBJECT_COLLECTION), dimension)
+    if MATERIALS_STORE_BACKEND != "sqlite":
+        logger.warning(f"Unknown MATERIALS_STORE '{MATERIALS_STORE_BACKEND}', using sqlite.")
+
+    store = SQLiteMaterialsStore(os.path.join(DB_DIR, "materials.sqlite3"))
+    # One-time migration of subjects saved before the SQLite store existed
+    client = _chroma_client.get() if store.get_meta(LEGACY_MIGRATION_KEY) is None else None
+    if client is not None:
+        try:
+            legacy_collection = client.get_collection(name=LEGACY_SUBJECT_COLLECTION)
+        except Exception:
+            legacy_collection = None
+        if legacy_collection is not None:
+            migrate_from_chroma(legacy_collection, store)
+        else:
+            store.set_meta(LEGACY_MIGRATION_KEY, "none")
+    return store
+
+_materials_store = component("materials_store", "Materials store", _create_materials_store)
+
+def get_materials_store() -> MaterialsStore:
+    """
+    Returns the subject materials store. Raises RuntimeError if unavailable.
+    """
+    return _materials_store.require()
+
+# The materials of each document of a subject, which are merged into the subject's materials
+_document_store = component(
+    "document_store", "Document store",
+    lambda: DocumentStore(os.path.join(DB_DIR, "documents.sqlite3")),
+)
+
+def get_document_store() -> DocumentStore:
+    """
+    Returns the per-document materials store. Raises RuntimeError if unavailable.
+    """
+    return _document_store.require()
+
+# Answers to semantically equivalent questions are reused until the subject's documents change
+answer_cache = SemanticAnswerCache(
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92")),
+    ttl_seconds=int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+    max_entries_per_subject=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES_PER_SUBJECT", "256")),
+    max_subjects=int(os.getenv("ANSWER_CACHE_MAX_SUBJECTS", "1024")),
+)
+# Chunk embeddings of recently queried subjects, searched in memory until the subject's documents change.
+# A few hundred chunks of 384-d vectors take well under 1 MiB; 0 disables the index.
+subject_index = SubjectVectorIndex(max_bytes=int(os.getenv("SUBJECT_INDEX_MAX_BYTES", str(256 * 1024 * 1024))))
+# Incremented whenever a subject's indexed chunks change. With an index server,
+# versions are kept there so that every worker sees changes made by the others.
+document_versions: dict[str, int] = {}
+
+def get_document_version(subject: str) -> int:
+    """
+    Returns the version of a subject's indexed chunks, used to expire cached answers.
+    """
+    if index_client:
+        return index_client.call("version", subject)
+    return document_versions.get(subject, 0)
+
+async def get_document_version_async(subject: str) -> int:
+    if index_client:
+        return await executor.run_in_pool(executor.IO, get_document_version, subject)
+    return get_document_version(subject)
 
-# Get or create ChromaDB collections
-document_collection = client.get_or_create_collection(name="flashlearn_documents")
-subject_collection = client.get_or_create_collection(name="flashlearn_subjects")
+# Chunk embeddings keyed by content hash, so re-ingesting unchanged text skips the model
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+# Identifies the vectors of the configured backend; chunks record it in their metadata,
+# and chunks indexed before it was recorded came from the full-precision model
+EMBEDDING_KEY = embedding_cache_key(EMBEDDING_MODEL_NAME)
+embedding_cache = EmbeddingCache(
+    os.path.join(DB_DIR, "embedding_cache.sqlite3"), EMBEDDING_KEY,
+    EMBEDDING_CACHE_MAX_ENTRIES, storage_dtype(),
+)
 
 # --- Text Processing ---
 
-def split_text_into_chunks(text: str, chunk_size: int = 500, overlap: int = 50) -> list[str]:
+# Chunk sizes for retrieval, in estimated model tokens (about 4 characters per token, as in ai_service.estimate_tokens)
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "800"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "64"))
+CHARS_PER_TOKEN = 4
+
+# The end of a sentence (punctuation, closing quotes or brackets, whitespace) or a blank line between paragraphs
+_SENTENCE_BOUNDARY = re.compile(r"[.!?]+[\"'”’)\]]*(?P<space>\s+)|(?P<paragraph>\n[ \t]*\n\s*)")
+_WORD = re.compile(r"\S+")
+
+def _iter_sentences(text: str, pos: int = 0, final: bool = True):
     """
-    Splits a long text into smaller, overlapping chunks.
+    Yields (start, end, paragraph_end, next_pos) for each sentence of text from pos.
+
+    Unless final, more text may follow, so a sentence is only yielded once the
+    next one has started; scanning resumes at the last next_pos.
     """
-    if not text:
-        return []
-    
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), chunk_size - overlap):
-        chunks.append(" ".join(words[i:i + chunk_size]))
-    return chunks
+    while pos < len(text):
+        match = _SENTENCE_BOUNDARY.search(text, pos)
+        if match is None or (not final and match.end() == len(text)):
+            if final:
+                yield pos, len(text), True, len(text)
+            return
+        if match["paragraph"]:
+            yield pos, match.start("paragraph"), True, match.end()
+        else:
+            yield pos, match.start("space"), match["space"].count("\n") >= 2, match.end()
+        pos = match.end()
+
+def _is_anchor(text: str, start: int, end: int, target_chars: int) -> bool:
+    """
+    Whether a span of text is a content-defined chunk boundary. It depends only on
+    the span's own text, with a chance proportional to its length, so boundaries
+    fall on average every target_chars characters wherever the span is in the document.
+    """
+    return zlib.crc32(text[start:end].encode("utf-8")) % max(1, target_chars) < end - start
+
+def _iter_pieces(text: str, start: int, end: int, paragraph_end: bool, max_chars: int, piece_chars: int):
+    """
+    Yields (start, end, paragraph_end) for a sentence without surrounding
+    whitespace, or for word-aligned pieces of at most piece_chars if the sentence
+    is longer than max_chars (e.g. transcripts without punctuation). Pieces end
+    at content-defined words, so an edit only moves the piece boundaries near it.
+    """
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if start == end:
+        return
+    if end - start <= max_chars:
+        yield start, end, paragraph_end
+        return
+    piece_start = piece_end = start
+    for word in _WORD.finditer(text, start, end):
+        if piece_end == piece_start:
+            piece_start = word.start()
+        elif word.end() - piece_start > piece_chars:
+            yield piece_start, piece_end, False
+            piece_start = word.start()
+        piece_end = word.end()
+        if piece_end < end and piece_end - piece_start >= piece_chars // 2 and _is_anchor(text, word.start(), piece_end, piece_chars // 4):
+            yield piece_start, piece_end, False
+            piece_start = piece_end
+    yield piece_start, piece_end, paragraph_end
+
+class _ChunkWindow:
+    """
+    Packs consecutive sentence spans into chunks of at most max_chars. Each chunk
+    starts with the trailing sentences of the previous one that fit in the overlap.
+
+    Chunk boundaries are content-defined: once a chunk holds half its budget of new
+    text, it closes after a sentence whose hash marks it as an anchor (see _is_anchor),
+    or at the end of a paragraph once it is three quarters full. An edit therefore
+    only changes the chunks around it; the boundaries after it fall back on the same
+    anchors, so unchanged chunks keep their hashes and cached embeddings. Only a run
+    of text without anchors is cut at the budget, from the previous boundary.
+    """
+    def __init__(self, chunk_tokens: int, overlap_tokens: int):
+        self.max_chars = max(1, chunk_tokens) * CHARS_PER_TOKEN
+        self.overlap_chars = max(0, min(overlap_tokens, chunk_tokens - 1)) * CHARS_PER_TOKEN
+        # New text per chunk, leaving room for the overlap
+        self.new_chars = self.max_chars - self.overlap_chars
+        # Unpunctuated text is cut into pieces the size of the overlap, so it still overlaps
+        self.piece_chars = self.overlap_chars or self.max_chars
+        self.spans: deque[tuple[int, int]] = deque()
+        # Start of the first span not already in the previous chunk
+        self._new_start = None
+
+    def start(self) -> int | None:
+        return self.spans[0][0] if self.spans else None
+
+    def _emit(self) -> tuple[int, int]:
+        chunk = (self.spans[0][0], self.spans[-1][1])
+        while self.spans and chunk[1] - self.spans[0][0] > self.overlap_chars:
+            self.spans.popleft()
+        self._new_start = None
+        return chunk
+
+    def add(self, text: str, start: int, end: int, paragraph_end: bool, offset: int = 0) -> list[tuple[int, int]]:
+        """
+        Adds a sentence of text (at offset in the whole document) and returns the chunks it completes.
+        """
+        chunks = []
+        for piece_start, piece_end, piece_paragraph_end in _iter_pieces(text, start, end, paragraph_end, self.max_chars, self.piece_chars):
+            if self._new_start is not None and piece_end + offset - self._new_start > self.new_chars:
+                chunks.append(self._emit())
+            while self.spans and piece_end + offset - self.spans[0][0] > self.max_chars:
+                self.spans.popleft()
+            self.spans.append((piece_start + offset, piece_end + offset))
+            if self._new_start is None:
+                self._new_start = piece_start + offset
+            size = piece_end + offset - self._new_start
+            if (size >= self.new_chars // 2 and _is_anchor(text, piece_start, piece_end, self.new_chars // 4)) or (
+                piece_paragraph_end and size >= self.new_chars * 3 // 4
+            ):
+                chunks.append(self._emit())
+        return chunks
+
+    def finish(self) -> list[tuple[int, int]]:
+        return [self._emit()] if self._new_start is not None else []
+
+def iter_chunk_spans(text: str, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+    """
+    Yields the (start, end) character offsets of overlapping chunks of text.
+
+    Chunks end at sentence or paragraph boundaries and hold about chunk_tokens
+    tokens; consecutive chunks share up to overlap_tokens tokens of whole
+    sentences. Only offsets are produced, so the text is never copied.
+    """
+    window = _ChunkWindow(chunk_tokens, overlap_tokens)
+    for start, end, paragraph_end, _ in _iter_sentences(text):
+        yield from window.add(text, start, end, paragraph_end)
+    yield from window.finish()
+
+def split_text_into_chunks(text: str, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> list[str]:
+    """
+    Splits a long text into smaller, overlapping chunks, see iter_chunk_spans.
+    """
+    return [text[start:end] for start, end in iter_chunk_spans(text, chunk_tokens, overlap_tokens)]
+
+def join_pages(pages: list[str]) -> tuple[str, list[tuple[int, int]]]:
+    """
+    Joins extracted pages into one text, with a (character offset, page number) index.
+    """
+    page_index = []
+    offset = 0
+    for number, page in enumerate(pages, 1):
+        page_index.append((offset, number))
+        offset += len(page) + 1
+    return "\n".join(pages), page_index
+
+def timestamp_at(timestamps: list[tuple[int, float]], offset: int) -> float | None:
+    """
+    Looks up the time of a character offset in a (character offset, seconds) index.
+    """
+    index = bisect.bisect_right(timestamps, (offset, float("inf"))) - 1
+    return timestamps[index][1] if index >= 0 else None
+
+def page_at(page_index: list[tuple[int, int]], offset: int) -> int | None:
+    """
+    Looks up the page of a character offset in a (character offset, page number) index.
+    """
+    index = bisect.bisect_right(page_index, (offset, float("inf"))) - 1
+    return page_index[index][1] if index >= 0 else None
+
+def format_timestamp(seconds: float) -> str:
+    """
+    Formats a position in a video as m:ss or h:mm:ss.
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+class StreamingChunker:
+    """
+    Produces the same chunks as split_text_into_chunks("\n".join(pieces)), but
+    accepts the text piece by piece and emits each chunk as soon as it is complete.
+    Only the text of the current chunk and the unfinished sentence is kept in memory.
+    """
+    def __init__(self, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+        self._window = _ChunkWindow(chunk_tokens, overlap_tokens)
+        self._buffer = ""
+        # Offset of the buffer in the whole text, and where sentence scanning resumes in the buffer
+        self._offset = 0
+        self._pos = 0
+        self._started = False
+
+    def _scan(self, final: bool) -> list[str]:
+        spans = []
+        for start, end, paragraph_end, next_pos in _iter_sentences(self._buffer, self._pos, final):
+            spans.extend(self._window.add(self._buffer, start, end, paragraph_end, self._offset))
+            self._pos = next_pos
+        if final:
+            spans.extend(self._window.finish())
+        chunks = [self._buffer[start - self._offset:end - self._offset] for start, end in spans]
+
+        # Drop the text that no chunk will need again
+        window_start = self._window.start()
+        keep = self._pos if window_start is None else min(self._pos, window_start - self._offset)
+        self._buffer = self._buffer[keep:]
+        self._offset += keep
+        self._pos -= keep
+        return chunks
+
+    def feed(self, text: str) -> list[str]:
+        """
+        Adds a piece of text and returns the chunks that are now complete.
+        """
+        self._buffer += "\n" + text if self._started else text
+        self._started = True
+        return self._scan(final=False)
+
+    def finish(self) -> list[str]:
+        """
+        Returns the remaining chunks at the end of the text.
+        """
+        return self._scan(final=True)
 
 # --- Database Operations ---
 
-def upsert_document(subject: str, text_content: str):
+# Number of chunks encoded per forward pass when ingesting a document
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+def chunk_hash(chunk: str) -> str:
     """
-    Splits text into chunks, generates embeddings, and stores them in ChromaDB
-    for RAG. Associates chunks with a subject.
+    Returns the content hash used to identify a chunk.
+    """
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:32]
+
+def embed_chunks(chunk_hashes: list[str], chunks: list[str], progress=None) -> list[list[float]]:
+    """
+    Returns embeddings for the given chunks, reusing cached vectors and only
+    encoding chunks that have never been seen before.
     """
-    if not embedding_model:
-        raise RuntimeError("Embedding model is not available.")
+    cached = embedding_cache.get_many(chunk_hashes)
+    missing = [i for i, h in enumerate(chunk_hashes) if h not in cached]
+    embedded = len(chunk_hashes) - len(missing)
+    if progress:
+        progress(chunks_embedded=embedded, chunks_total=len(chunks))
 
-    # First, clear any old chunks for this subject to avoid duplicates
-    document_collection.delete(where={"subject": subject})
-    logger.info(f"Cleared old document chunks for subject: {subject}")
+    # Fully cached documents skip the stage, so its timings only cover real model work
+    if missing:
+        with stage("embedding", input_chars=sum(len(chunks[i]) for i in missing)):
+            for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+                batch = missing[start:start + EMBEDDING_BATCH_SIZE]
+                vectors = embedding_batcher.encode([chunks[i] for i in batch]).tolist()
+                fresh = {chunk_hashes[i]: vector for i, vector in zip(batch, vectors)}
+                embedding_cache.put_many(fresh)
+                cached.update(fresh)
+                embedded += len(batch)
+                if progress:
+                    progress(chunks_embedded=embedded, chunks_total=len(chunks))
 
-    chunks = split_text_into_chunks(text_content)
-    if not chunks:
-        logger.warning(f"No text chunks to process for subject: {subject}")
+    logger.info(f"Embedded {len(missing)} chunks, reused {len(chunks) - len(missing)} cached embeddings.")
+    return [cached[h] for h in chunk_hashes]
+
+def prefetch_embeddings(chunks: list[str]):
+    """
+    Embeds chunks into the embedding cache ahead of upsert_document, so
+    embedding can overlap with extraction of the rest of a document.
+    """
+    if not chunks or not get_embedding_model():
         return
+    embed_chunks([chunk_hash(chunk) for chunk in chunks], chunks)
+
+def mark_documents_changed(subject: str):
+    """
+    Records that a subject's chunks changed and drops its cached answers.
+    """
+    if index_client:
+        index_client.call("mark_changed", subject)
+    document_versions[subject] = document_versions.get(subject, 0) + 1
+    answer_cache.invalidate(subject)
+    subject_index.invalidate(subject)
+
+# Chroma rejects add calls above its maximum batch size (about 5,000 records with SQLite)
+CHROMA_MAX_ADD_BATCH = 5000
+
+class PreparedDocument:
+    """
+    The chunks of a document that still have to be written to Chroma, with their embeddings and metadata.
+    """
+    def __init__(self, subject: str, ids: list[str], chunks: list[str], embeddings: list[list[float]], metadatas: list[dict]):
+        self.subject = subject
+        self.ids = ids
+        self.chunks = chunks
+        self.embeddings = embeddings
+        self.metadatas = metadatas
 
-    embeddings = embedding_model.encode(chunks).tolist()
-    ids = [f"{subject}_{i}" for i in range(len(chunks))]
-    metadata = [{"subject": subject, "text": chunk} for chunk in chunks]
+def _document_filter(subject: str, document_id: str) -> dict:
+    return {"$and": [{"subject": subject}, {"document_id": document_id}]}
 
-    document_collection.add(
-        ids=ids,
-        embeddings=embeddings,
-        documents=chunks,
-        metadatas=metadata
+def prepare_document(subject: str, document_id: str, text_content: str, progress=None, timestamps=None, page_index=None) -> PreparedDocument:
+    """
+    Chunks a document, deletes the document's chunks that are no longer in it and
+    embeds the chunks that are new. The new chunks are written by add_documents.
+    Chunks of the subject's other documents are left alone.
+
+    Args:
+        subject (str): The subject the document belongs to.
+        document_id (str): The document's id within the subject, see document_id_for.
+        text_content (str): The full document text.
+        progress (callable, optional): Called as progress(chunks_embedded=..., chunks_total=...)
+            after each embedding batch.
+        timestamps (list, optional): (character offset, seconds) pairs locating the text in a video.
+            Each chunk's metadata then records the time its text starts at.
+        page_index (list, optional): (character offset, page number) pairs, see join_pages.
+            Each chunk's metadata then records the page its text starts on.
+    """
+    _embedding_model.require()
+    document_collection = get_document_collection()
+
+    # Content-addressed ids; identical chunks within a document collapse into one entry.
+    # Only offsets are kept, and the text of a chunk is sliced again if it has to be embedded.
+    spans = {}
+    with stage("chunking", input_chars=len(text_content)):
+        for start, end in iter_chunk_spans(text_content):
+            spans.setdefault(f"{subject}:{document_id}:{chunk_hash(text_content[start:end])}", (start, end))
+
+    existing = document_collection.get(where=_document_filter(subject, document_id), include=["metadatas"])
+    # Chunks embedded by another backend are embedded again, so the subject never mixes vectors
+    existing_ids = {
+        chunk_id for chunk_id, metadata in zip(existing["ids"], existing["metadatas"])
+        if (metadata or {}).get("embedding", EMBEDDING_MODEL_NAME) == EMBEDDING_KEY
+    }
+    stale_ids = [chunk_id for chunk_id in existing["ids"] if chunk_id not in existing_ids or chunk_id not in spans]
+    new_ids = [chunk_id for chunk_id in spans if chunk_id not in existing_ids]
+
+    if stale_ids:
+        with stage("chroma_write"):
+            document_collection.delete(ids=stale_ids)
+        mark_documents_changed(subject)
+    logger.info(
+        f"Re-indexing document {document_id} of subject {subject}: {len(new_ids)} new, {len(stale_ids)} removed, "
+        f"{len(spans) - len(new_ids)} unchanged chunks."
     )
-    logger.info(f"Successfully added {len(chunks)} document chunks for subject: {subject}")
 
-def save_learning_materials(subject: str, materials: dict):
+    if not new_ids:
+        if not spans:
+            logger.warning(f"No text chunks to process for subject: {subject}")
+        if progress:
+            progress(chunks_embedded=0, chunks_total=0)
+        return PreparedDocument(subject, [], [], [], [])
+
+    chunks = [text_content[slice(*spans[chunk_id])] for chunk_id in new_ids]
+    embeddings = embed_chunks([chunk_id.rsplit(":", 1)[1] for chunk_id in new_ids], chunks, progress)
+    # The text is stored once, as the Chroma document; metadata locates it in the source
+    metadatas = []
+    for chunk_id in new_ids:
+        start, end = spans[chunk_id]
+        metadata = {"subject": subject, "document_id": document_id, "start": start, "end": end, "embedding": EMBEDDING_KEY}
+        seconds = timestamp_at(timestamps, start) if timestamps else None
+        if seconds is not None:
+            metadata["start_seconds"] = seconds
+        page = page_at(page_index, start) if page_index else None
+        if page is not None:
+            metadata["page"] = page
+        metadatas.append(metadata)
+    return PreparedDocument(subject, new_ids, chunks, embeddings, metadatas)
+
+def add_documents(documents: list[PreparedDocument]):
+    """
+    Writes the new chunks of prepared documents to Chroma, combining documents
+    into as few add calls as Chroma's batch limit allows.
     """
-    Saves the generated summary, quiz, and flashcards for a given subject.
-    The subject name is used as the ID.
+    ids, chunks, embeddings, metadata = [], [], [], []
+    for document in documents:
+        ids.extend(document.ids)
+        chunks.extend(document.chunks)
+        embeddings.extend(document.embeddings)
+        metadata.extend(document.metadatas)
+    if not ids:
+        return
+
+    document_collection = get_document_collection()
+    for start in range(0, len(ids), CHROMA_MAX_ADD_BATCH):
+        stop = start + CHROMA_MAX_ADD_BATCH
+        with stage("chroma_write", input_chars=sum(len(chunk) for chunk in chunks[start:stop])):
+            document_collection.add(
+                ids=ids[start:stop],
+                embeddings=embeddings[start:stop],
+                documents=chunks[start:stop],
+                metadatas=metadata[start:stop]
+            )
+    for document in documents:
+        if document.ids:
+            mark_documents_changed(document.subject)
+            logger.info(f"Successfully added {len(document.ids)} document chunks for subject: {document.subject}")
+
+def upsert_document(subject: str, document_id: str, text_content: str, progress=None, timestamps=None, page_index=None):
     """
-    # ChromaDB metadata values must be strings, numbers, or booleans.
-    # We'll serialize the quiz and flashcards to JSON strings.
-    metadata = {
+    Splits text into chunks, generates embeddings, and stores them in ChromaDB
+    for RAG. Associates chunks with a subject and one of its documents.
+
+    Chunk ids are derived from chunk content, so re-upserting a document only
+    embeds and writes chunks that are new and only deletes chunks that are gone.
+
+    Args:
+        subject (str): The subject the document belongs to.
+        document_id (str): The document's id within the subject.
+        text_content (str): The full document text.
+        progress (callable, optional): Called as progress(chunks_embedded=..., chunks_total=...)
+            after each embedding batch.
+        timestamps (list, optional): (character offset, seconds) pairs locating the text in a video.
+        page_index (list, optional): (character offset, page number) pairs locating the text in a PDF.
+    """
+    add_documents([prepare_document(subject, document_id, text_content, progress, timestamps, page_index)])
+
+# Chunks read per page when looking for chunks embedded by another backend
+REEMBED_PAGE_SIZE = 1000
+
+def reembed_outdated_chunks() -> int:
+    """
+    Embeds again, with the configured backend, every stored chunk that another
+    backend embedded, e.g. after switching EMBEDDING_BACKEND. Chunk ids and
+    text are kept; only the vectors and the recorded backend change.
+
+    Returns:
+        int: The number of chunks embedded again.
+    """
+    _embedding_model.require()
+    document_collection = get_document_collection()
+    # Usually every chunk is current, which ids alone can tell without reading the chunks
+    current = document_collection.get(where={"embedding": EMBEDDING_KEY}, include=[])["ids"]
+    if len(current) == document_collection.count():
+        return 0
+    updated = 0
+    subjects = set()
+    offset = 0
+    while True:
+        page = document_collection.get(limit=REEMBED_PAGE_SIZE, offset=offset, include=["metadatas", "documents"])
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+        outdated, untagged = [], []
+        for chunk_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+            metadata = metadata or {}
+            if metadata.get("embedding", EMBEDDING_MODEL_NAME) != EMBEDDING_KEY:
+                outdated.append((chunk_id, document, metadata))
+            elif "embedding" not in metadata:
+                untagged.append((chunk_id, metadata))
+        if untagged:
+            # Current vectors from before the backend was recorded only get the record, so the next start skips the scan
+            document_collection.update(
+                ids=[chunk_id for chunk_id, _ in untagged],
+                metadatas=[{**metadata, "embedding": EMBEDDING_KEY} for _, metadata in untagged],
+            )
+        if not outdated:
+            continue
+        chunks = [document for _, document, _ in outdated]
+        embeddings = embed_chunks([chunk_hash(chunk) for chunk in chunks], chunks)
+        with stage("chroma_write"):
+            document_collection.update(
+                ids=[chunk_id for chunk_id, _, _ in outdated],
+                embeddings=embeddings,
+                metadatas=[{**metadata, "embedding": EMBEDDING_KEY} for _, _, metadata in outdated],
+            )
+        updated += len(outdated)
+        subjects.update(metadata.get("subject") for _, _, metadata in outdated)
+    for subject in subjects - {None}:
+        mark_documents_changed(subject)
+    if updated:
+        logger.info(f"Embedded {updated} chunks of {len(subjects)} subjects again with {EMBEDDING_KEY}.")
+    return updated
+
+def reembed_outdated_chunks_safely():
+    """
+    Runs reembed_outdated_chunks, logging instead of raising; for background startup tasks.
+    """
+    try:
+        reembed_outdated_chunks()
+    except Exception as e:
+        logger.error(f"Could not embed outdated chunks again: {e}", exc_info=True)
+
+def delete_document_chunks(subject: str, document_id: str):
+    """
+    Removes a document's chunks from ChromaDB, leaving the subject's other documents.
+    """
+    get_document_collection().delete(where=_document_filter(subject, document_id))
+    mark_documents_changed(subject)
+    logger.info(f"Deleted the chunks of document {document_id} of subject {subject}.")
+
+# --- Subject Materials ---
+
+def serialize_document_materials(document_id: str, name: str, materials: dict) -> bytes:
+    """
+    Serializes the materials generated for one document into its stored response body.
+    """
+    return json_bytes({
+        "id": document_id,
+        "name": name,
         "summary": materials.get("summary", ""),
-        "quiz": json.dumps(materials.get("quiz", [])),
-        "flashcards": json.dumps(materials.get("flashcards", []))
-    }
+        "quiz": materials.get("quiz", []),
+        "flashcards": materials.get("flashcards", []),
+    })
+
+def _legacy_materials(subject: str) -> dict | None:
+    """
+    Returns the materials of a subject saved before subjects held several
+    documents and not adopted yet, or None for any other subject. Read-only.
+    """
+    if get_document_store().has_documents(subject):
+        return None
+    body = get_materials_store().get(subject)
+    return json.loads(body) if body is not None else None
+
+def adopt_legacy_subject(subject: str):
+    """
+    Converts a subject saved before subjects held several documents into a
+    subject with one document holding its existing materials and chunks, so
+    adding another document keeps them and they can be deleted on their own.
+    Does nothing for subjects that already have documents.
+
+    Only the write paths (ingestion and document deletion) call this; reads
+    present such a subject as one document without changing it.
+    """
+    document_store = get_document_store()
+    if document_store.has_documents(subject):
+        return
+    body = get_materials_store().get(subject)
+    if body is None:
+        return
+    materials = json.loads(body)
+    document_store.put(
+        subject, LEGACY_DOCUMENT_ID, LEGACY_DOCUMENT_NAME, materials.get("summary") or "",
+        serialize_document_materials(LEGACY_DOCUMENT_ID, LEGACY_DOCUMENT_NAME, materials), replace=False,
+    )
+
+    document_collection = get_document_collection()
+    chunks = document_collection.get(where={"subject": subject}, include=["metadatas"])
+    untagged = [(chunk_id, metadata) for chunk_id, metadata in zip(chunks["ids"], chunks["metadatas"]) if "document_id" not in metadata]
+    if untagged:
+        document_collection.update(
+            ids=[chunk_id for chunk_id, _ in untagged],
+            metadatas=[{**metadata, "document_id": LEGACY_DOCUMENT_ID} for _, metadata in untagged],
+        )
+    logger.info(f"Moved the existing materials and {len(untagged)} chunks of subject {subject} into document {LEGACY_DOCUMENT_ID}.")
+
+def refresh_subject_materials(subject: str) -> bytes | None:
+    """
+    Merges the materials of a subject's documents into the subject's stored
+    materials (see merge_materials); no AI call is involved. A subject without
+    documents is removed.
 
-    # We use the subject as the ID. We need to provide a dummy embedding.
-    # Since we won't search this collection by vector, it can be simple.
-    dummy_embedding = [0] * embedding_model.get_sentence_embedding_dimension() if embedding_model else []
+    If the documents change while they are being merged, for example because
+    another worker added one, the merge is repeated so the last write wins
+    with the latest documents.
 
+    Returns:
+        bytes | None: The subject's stored JSON body, or None if it has no documents.
+    """
+    document_store = get_document_store()
+    while True:
+        revision, bodies = document_store.snapshot(subject)
+        if bodies:
+            materials = merge_materials([json.loads(body) for body in bodies])
+            body = serialize_materials(subject, materials)
+            get_materials_store().put(subject, materials["summary"], body)
+        else:
+            body = None
+            get_materials_store().delete(subject)
+        if document_store.revision(subject) == revision:
+            logger.info(f"Merged the materials of {len(bodies)} documents into subject {subject}.")
+            return body
+
+def save_document_materials(subject: str, document_id: str, name: str, materials: dict, merge: bool = True, added_at: float | None = None) -> bytes | None:
+    """
+    Saves the generated summary, quiz, and flashcards of one document, replacing
+    the document's previous materials, and merges them into the subject's.
+    The materials are serialized once here and served as-is afterwards.
+
+    Args:
+        merge (bool): Set to False when saving several documents in a row; call
+            refresh_subject_materials once afterwards.
+        added_at (float, optional): The document's position among the subject's documents,
+            as a Unix time; defaults to now.
 
-    subject_collection.upsert(
-        ids=[subject],
-        embeddings=[dummy_embedding],
-        metadatas=[metadata]
+    Returns:
+        bytes | None: The subject's stored JSON body, or None if merge is False.
+    """
+    get_document_store().put(
+        subject, document_id, name, materials.get("summary", ""),
+        serialize_document_materials(document_id, name, materials), added_at=added_at,
     )
-    logger.info(f"Saved learning materials for subject: {subject}")
+    logger.info(f"Saved learning materials for document {name} of subject: {subject}")
+    return refresh_subject_materials(subject) if merge else None
+
+def list_documents(subject: str) -> list[dict]:
+    """
+    Returns the id, name, summary and timestamps of each of a subject's documents.
+    """
+    documents = get_document_store().list_documents(subject)
+    if documents:
+        return documents
+    materials = _legacy_materials(subject)
+    if materials is None:
+        return []
+    return [{"id": LEGACY_DOCUMENT_ID, "name": LEGACY_DOCUMENT_NAME, "summary": materials.get("summary") or "", "added_at": None, "updated_at": None}]
+
+def get_document_materials_json(subject: str, document_id: str) -> bytes | None:
+    """
+    Retrieves the stored JSON body of one document's learning materials.
+    """
+    body = get_document_store().get(subject, document_id)
+    if body is None and document_id == LEGACY_DOCUMENT_ID:
+        materials = _legacy_materials(subject)
+        if materials is not None:
+            return serialize_document_materials(LEGACY_DOCUMENT_ID, LEGACY_DOCUMENT_NAME, materials)
+    return body
+
+def delete_document(subject: str, document_id: str) -> bool:
+    """
+    Removes one document from a subject: its chunks, its materials and its part
+    of the subject's materials. The subject is removed with its last document.
+
+    Returns:
+        bool: False if the subject has no such document.
+    """
+    adopt_legacy_subject(subject)
+    document_store = get_document_store()
+    if document_store.get(subject, document_id) is None:
+        return False
+    delete_document_chunks(subject, document_id)
+    document_store.delete(subject, document_id)
+    refresh_subject_materials(subject)
+    return True
 
 def get_all_subjects() -> list[dict]:
     """
     Retrieves all unique subjects and their materials from the database.
     """
-    results = subject_collection.get()    
     subjects = []
-    for i, subject_id in enumerate(results['ids']):
-        metadata = results['metadatas'][i]
-        subjects.append({
-            "name": subject_id,
-            "summary": metadata.get("summary"),
-            "quiz": json.loads(metadata.get("quiz", "[]")),
-            "flashcards": json.loads(metadata.get("flashcards", "[]"))
-        })
-        
-    return subjects
+    cursor = None
+    while True:
+        page, cursor = get_materials_store().list_page(cursor, 500, include_body=True)
+        subjects.extend(json.loads(row["body"]) for row in page)
+        if cursor is None:
+            return subjects
+
+SUBJECT_FIELDS = ("name", "summary", "quiz", "flashcards")
+DEFAULT_SUBJECT_FIELDS = ("name", "summary")
+
+def get_subjects_page(cursor: str | None = None, limit: int = 50, fields: tuple[str, ...] = DEFAULT_SUBJECT_FIELDS) -> tuple[bytes, str | None]:
+    """
+    Retrieves one page of subjects with only the requested fields.
+
+    Names and summaries come straight from the store's columns. When all fields
+    are requested, the stored bodies are spliced together without re-parsing.
+
+    Args:
+        cursor (str, optional): The cursor returned for the previous page.
+        limit (int): The maximum number of subjects to return.
+        fields (tuple[str, ...]): The fields to include, a subset of SUBJECT_FIELDS.
+
+    Returns:
+        tuple[bytes, str | None]: The page as a JSON array and the cursor of the
+        next page, or None if this is the last page.
+    """
+    include_body = "quiz" in fields or "flashcards" in fields
+    page, next_cursor = get_materials_store().list_page(cursor, limit, include_body)
+
+    if set(fields) == set(SUBJECT_FIELDS):
+        return b"[" + b",".join(row["body"] for row in page) + b"]", next_cursor
+
+    subjects = []
+    for row in page:
+        materials = json.loads(row["body"]) if include_body else row
+        subjects.append({field: materials.get(field) for field in SUBJECT_FIELDS if field in fields})
+    return json_bytes(subjects), next_cursor
+
+def get_subject_materials_json(subject: str) -> bytes | None:
+    """
+    Retrieves the stored JSON body of a subject's learning materials.
+    """
+    return get_materials_store().get(subject)
+
+def get_many_subject_materials_json(subjects: list[str]) -> dict[str, bytes]:
+    """
+    Retrieves the stored JSON bodies of several subjects in one read.
+    """
+    return get_materials_store().get_many(subjects)
 
 def get_subject_materials(subject: str) -> dict | None:
     """
     Retrieves the learning materials for a specific subject.
     """
-    result = subject_collection.get(ids=[subject])
-    if not result['ids']:
-        return None
-        
-    metadata = result['metadatas'][0]
-    return {
-        "name": result['ids'][0],
-        "summary": metadata.get("summary"),
-        "quiz": json.loads(metadata.get("quiz", "[]")),
-        "flashcards": json.loads(metadata.get("flashcards", "[]"))
-    }
+    body = get_materials_store().get(subject)
+    return json.loads(body) if body is not None else None
 
-async def query_rag_for_answer(subject: str, question: str) -> str:
+def embed_query(question: str) -> list[float]:
     """
-    Finds relevant text chunks and uses the AI to generate an answer.
+    Embeds a question for retrieval. This blocks until the batcher has encoded it.
     """
-    if not embedding_model:
-        raise RuntimeError("Embedding model is not available.")
+    return embedding_batcher.encode([question])[0].tolist()
 
-    # Find relevant document chunks for the given subject
-    query_embedding = embedding_model.encode([question]).tolist()
-    results = document_collection.query(
-        query_embeddings=query_embedding,
-        n_results=3,
-        where={"subject": subject}
-    )
+async def embed_query_async(question: str) -> list[float]:
+    """
+    Embeds a question for retrieval without blocking the event loop. Concurrent
+    questions are encoded together in one batch.
+    """
+    with stage("embed_query", input_chars=len(question)):
+        return (await embedding_batcher.encode_async([question]))[0].tolist()
 
-    context_chunks = results['documents'][0]
-    if not context_chunks:
-        return "I couldn't find any relevant information in the documents for this subject to answer your question."
+def _load_subject_chunks(subject: str) -> dict:
+    with stage("chroma_load"):
+        return get_document_collection().get(where={"subject": subject}, include=["embeddings", "documents", "metadatas"])
+
+def retrieve_context_chunks(subject: str, query_embedding: list[float], n_results: int = 3, version: int | None = None) -> list[str]:
+    """
+    Returns the document chunks for the subject that are most relevant to a
+    question embedding. This is blocking (a Chroma read the first time a
+    subject is searched, or when it does not fit the subject index).
+
+    Chunks of video transcripts are labelled with the time they start at, e.g.
+    "[at 12:34] ...", so answers can cite them.
+
+    Args:
+        version (int, optional): The subject's document version, if the caller already has it.
+    """
+    if version is None:
+        version = get_document_version(subject)
+    with stage("subject_index_search") as timer:
+        results = subject_index.search(subject, query_embedding, n_results, version, _load_subject_chunks)
+        if results is not None:
+            timer.output_chars = sum(len(document) for document in results['documents'][0])
+    if results is None:
+        with stage("chroma_query") as timer:
+            results = get_document_collection().query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                where={"subject": subject},
+                include=["documents", "metadatas"]
+            )
+            timer.output_chars = sum(len(document) for document in results['documents'][0])
+    return [
+        f"[at {format_timestamp(metadata['start_seconds'])}] {document}" if metadata and "start_seconds" in metadata else document
+        for document, metadata in zip(results['documents'][0], results['metadatas'][0])
+    ]
+
+NO_CONTEXT_ANSWER = "I couldn't find any relevant information in the documents for this subject to answer your question."
 
+_TIMESTAMP_LABEL = re.compile(r"^\[at \d+:\d{2}(:\d{2})?\] ")
+
+def build_rag_prompt(context_chunks: list[str], question: str) -> str:
+    """
+    Builds the prompt that asks the AI to answer a question from retrieved context.
+    """
     context = "\n\n---\n\n".join(context_chunks)
+    citation = (
+        "\n    When you use a passage that starts with a timestamp such as [at 12:34], cite that timestamp in your answer."
+        if any(_TIMESTAMP_LABEL.match(chunk) for chunk in context_chunks) else ""
+    )
 
-    # Now, build a prompt for the AI
-    prompt = f"""
+    return f"""
     Based on the following context from the document, please answer the user's question.
-    If the context does not contain the answer, say so.
+    If the context does not contain the answer, say so.{citation}
 
     Context:
     {context}
@@ -165,12 +951,70 @@ async def query_rag_for_answer(subject: str, question: str) -> str:
 
     Answer:
     """
-    
-    # We need to import the AI model here to avoid circular dependencies
-    from app.services.ai_service import model
-    
-    if not model:
+
+async def _get_llm_client():
+    # We need to import the AI service here to avoid circular dependencies
+    from app.services.ai_service import get_model_async, llm_client
+
+    if not await get_model_async():
         raise RuntimeError("AI model is not available.")
+    return llm_client
+
+async def query_rag_for_answer(subject: str, question: str) -> str:
+    """
+    Finds relevant text chunks and uses the AI to generate an answer.
+    Answers to semantically equivalent questions are served from the answer cache.
+    """
+    query_embedding = await embed_query_async(question)
+    version = await get_document_version_async(subject)
+    cached_answer = answer_cache.lookup(subject, query_embedding, version)
+    if cached_answer is not None:
+        return cached_answer
+
+    # Find relevant document chunks for the given subject
+    context_chunks = await executor.run_in_pool(executor.IO, retrieve_context_chunks, subject, query_embedding, 3, version)
+    if not context_chunks:
+        return NO_CONTEXT_ANSWER
+
+    # Now, build a prompt for the AI
+    prompt = build_rag_prompt(context_chunks, question)
+    llm_client = await _get_llm_client()
+
+    with stage("llm_answer", input_chars=len(prompt)) as timer:
+        answer = await llm_client.generate(prompt, route="ask")
+        timer.output_chars = len(answer)
+    answer_cache.store(subject, query_embedding, answer, version)
+    return answer
+
+async def stream_rag_answer(subject: str, question: str):
+    """
+    Like query_rag_for_answer, but yields the answer in pieces as the AI produces them.
+    """
+    query_embedding = await embed_query_async(question)
+    version = await get_document_version_async(subject)
+    cached_answer = answer_cache.lookup(subject, query_embedding, version)
+    if cached_answer is not None:
+        yield cached_answer
+        return
+
+    context_chunks = await executor.run_in_pool(executor.IO, retrieve_context_chunks, subject, query_embedding, 3, version)
+    if not context_chunks:
+        yield NO_CONTEXT_ANSWER
+        return
+
+    prompt = build_rag_prompt(context_chunks, question)
+    llm_client = await _get_llm_client()
 
-    response = await model.generate_content_async(prompt)
-    return response.text
\ No newline at end of file
+    start = time.perf_counter()
+    parts = []
+    with stage("llm_answer", input_chars=len(prompt)) as timer:
+        async for text in llm_client.stream(prompt, route="ask"):
+            if not parts:
+                ttft = time.perf_counter() - start
+                LLM_TIME_TO_FIRST_TOKEN.observe(ttft, route="ask")
+                logger.info(f"First answer token for subject {subject} after {ttft:.3f}s.")
+            parts.append(text)
+            if text:
+                yield text
+        timer.output_chars = sum(len(part) for part in parts)
+    answer_cache.store(subject, query_embedding, "".join(parts), version)
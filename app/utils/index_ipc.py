@@ -0,0 +1,317 @@
+import os
+import time
+import random
+import socket
+import threading
+import logging
+from multiprocessing.connection import Listener, Client, AuthenticationError
+from app.utils.metrics import counter, histogram
+
+logger = logging.getLogger(__name__)
+
+# --- Index Server Protocol ---
+#
+# Requests are tuples sent over a multiprocessing connection (pickled, so both
+# ends must share the authkey). Responses are ("ok", value) or ("error", exception).
+#
+#   ("ping",)
+#   ("encode", texts)                          -> embeddings as a NumPy array
+#   ("dimension",)                             -> embedding dimension
+#   ("collection", name, method, kwargs)       -> result of collection.<method>(**kwargs)
+#   ("get_collection", name)                   -> None; raises if the collection does not exist
+#   ("mark_changed", subject)                  -> the subject's new document version
+#   ("version", subject)                       -> the subject's document version
+
+COLLECTION_READ_METHODS = {"get", "query", "count", "peek"}
+COLLECTION_WRITE_METHODS = {"add", "upsert", "update", "delete"}
+# Requests without side effects, which the client may send again after a broken connection
+REPEATABLE_REQUESTS = {"ping", "encode", "dimension", "get_collection", "version"}
+
+def is_repeatable(request: tuple) -> bool:
+    if request[0] == "collection":
+        return request[2] in COLLECTION_READ_METHODS
+    return request[0] in REPEATABLE_REQUESTS
+
+INDEX_RPC_SECONDS = histogram(
+    "flashlearn_index_rpc_seconds",
+    "Round trip time of requests from an API worker to the index server.",
+    labels=("method",),
+)
+INDEX_RPC_RECONNECTS = counter(
+    "flashlearn_index_rpc_reconnects_total",
+    "Index server requests retried on a new connection after the old one broke.",
+)
+
+def parse_address(address: str):
+    """
+    Returns a multiprocessing.connection address: ("host", port) for "host:port",
+    otherwise the path of a Unix socket.
+    """
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit() and "/" not in address:
+        return host, int(port)
+    return address
+
+def load_authkey(path: str, create: bool = False) -> bytes:
+    """
+    Returns the key that authenticates workers to the index server, from the
+    INDEX_SERVER_AUTHKEY variable or a key file readable only by its owner.
+    """
+    if os.getenv("INDEX_SERVER_AUTHKEY"):
+        return os.environ["INDEX_SERVER_AUTHKEY"].encode("utf-8")
+    if create and not os.path.exists(path):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(os.urandom(32).hex())
+    with open(path, "r") as f:
+        return f.read().strip().encode("utf-8")
+
+# --- Client ---
+
+class IndexClient:
+    """
+    Sends requests to the index server over a small pool of connections, so
+    pool threads can call it concurrently. Idle connections the server has
+    closed (e.g. it restarted) are replaced before a request is sent. A read
+    whose connection breaks later is retried once on a new connection; a write
+    is not, since the server may already have applied it, and raises
+    ConnectionError instead.
+    """
+    def __init__(self, address: str, authkey_path: str):
+        self.address = parse_address(address)
+        self.authkey_path = authkey_path
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        return Client(self.address, authkey=load_authkey(self.authkey_path))
+
+    def call(self, *request):
+        start = time.perf_counter()
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is not None and self._is_closed(connection):
+            INDEX_RPC_RECONNECTS.inc()
+            connection = None
+        repeatable = is_repeatable(request)
+        for attempt in range(2):
+            sent = False
+            try:
+                if connection is None:
+                    connection = self._connect()
+                connection.send(request)
+                sent = True
+                status, value = connection.recv()
+                break
+            except (EOFError, OSError):
+                if connection is not None:
+                    connection.close()
+                connection = None
+                if attempt or (sent and not repeatable):
+                    raise ConnectionError(f"Index server at {self.address} is not reachable.")
+                INDEX_RPC_RECONNECTS.inc()
+        with self._lock:
+            self._idle.append(connection)
+        INDEX_RPC_SECONDS.observe(time.perf_counter() - start, method=request[0] if request[0] != "collection" else request[2])
+        if status == "error":
+            raise value
+        return value
+
+    @staticmethod
+    def _is_closed(connection) -> bool:
+        # An idle connection has nothing to read unless the server closed it
+        try:
+            if not connection.poll():
+                return False
+        except (EOFError, OSError):
+            pass
+        connection.close()
+        return True
+
+    def close(self):
+        with self._lock:
+            for connection in self._idle:
+                connection.close()
+            self._idle = []
+
+class RemoteEmbeddingModel:
+    """
+    Stands in for the embedding backend in API workers; encoding runs in the index server.
+    """
+    def __init__(self, client: IndexClient):
+        self._client = client
+
+    def encode(self, texts: list[str]):
+        return self._client.call("encode", list(texts))
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._client.call("dimension")
+
+class RemoteCollection:
+    """
+    Stands in for a Chroma collection in API workers, forwarding each call to the index server.
+    """
+    def __init__(self, client: IndexClient, name: str):
+        self._client = client
+        self.name = name
+
+    def _call(self, method: str, **kwargs):
+        return self._client.call("collection", self.name, method, kwargs)
+
+    def get(self, **kwargs):
+        return self._call("get", **kwargs)
+
+    def query(self, **kwargs):
+        return self._call("query", **kwargs)
+
+    def count(self) -> int:
+        return self._call("count")
+
+    def add(self, **kwargs):
+        return self._call("add", **kwargs)
+
+    def upsert(self, **kwargs):
+        return self._call("upsert", **kwargs)
+
+    def update(self, **kwargs):
+        return self._call("update", **kwargs)
+
+    def delete(self, **kwargs):
+        return self._call("delete", **kwargs)
+
+class RemoteChromaClient:
+    """
+    Stands in for the Chroma client in API workers.
+    """
+    def __init__(self, client: IndexClient):
+        self._client = client
+
+    def get_or_create_collection(self, name: str) -> RemoteCollection:
+        return RemoteCollection(self._client, name)
+
+    def get_collection(self, name: str) -> RemoteCollection:
+        self._client.call("get_collection", name)
+        return RemoteCollection(self._client, name)
+
+# --- Server ---
+
+class IndexServer:
+    """
+    Owns the embedding model and the Chroma client on behalf of all API workers.
+
+    Each worker connection is served by its own thread. Encode requests go
+    through an EmbeddingBatcher, so concurrent requests from different workers
+    share model forward passes. Collection writes are serialized by one lock,
+    so only this process ever writes to Chroma's database.
+    """
+    def __init__(self, address: str, authkey: bytes, batcher, get_chroma_client, get_dimension):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.batcher = batcher
+        self._get_chroma_client = get_chroma_client
+        self._get_dimension = get_dimension
+        self._collections = {}
+        self._write_lock = threading.Lock()
+        # Document versions are offset by a random generation, so versions cached
+        # by workers before a server restart never match versions issued after it
+        self._generation = random.getrandbits(31) << 32
+        self._versions: dict[str, int] = {}
+        self._versions_lock = threading.Lock()
+        self._listener: Listener | None = None
+
+    def _collection(self, name: str):
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = self._get_chroma_client().get_or_create_collection(name=name)
+        return collection
+
+    def _dispatch(self, request: tuple):
+        kind = request[0]
+        if kind == "ping":
+            return "pong"
+        if kind == "encode":
+            return self.batcher.encode(request[1])
+        if kind == "dimension":
+            return self._get_dimension()
+        if kind == "collection":
+            _, name, method, kwargs = request
+            if method in COLLECTION_READ_METHODS:
+                return getattr(self._collection(name), method)(**kwargs)
+            if method in COLLECTION_WRITE_METHODS:
+                with self._write_lock:
+                    return getattr(self._collection(name), method)(**kwargs)
+            raise ValueError(f"Unsupported collection method: {method}")
+        if kind == "get_collection":
+            self._collections[request[1]] = self._get_chroma_client().get_collection(name=request[1])
+            return None
+        if kind == "mark_changed":
+            with self._versions_lock:
+                self._versions[request[1]] = self._versions.get(request[1], 0) + 1
+                return self._generation + self._versions[request[1]]
+        if kind == "version":
+            return self._generation + self._versions.get(request[1], 0)
+        raise ValueError(f"Unknown index server request: {kind}")
+
+    def _serve_connection(self, connection):
+        with connection:
+            while True:
+                try:
+                    request = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    response = ("ok", self._dispatch(request))
+                except Exception as e:
+                    response = ("error", e)
+                try:
+                    connection.send(response)
+                except (EOFError, OSError):
+                    return
+                except Exception:
+                    # The exception could not be pickled; send its message instead
+                    connection.send(("error", RuntimeError(f"{type(response[1]).__name__}: {response[1]}")))
+
+    def serve_forever(self):
+        """
+        Accepts worker connections until close() is called.
+        """
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            # A socket left behind by a server that did not shut down cleanly
+            os.remove(self.address)
+        self._listener = Listener(self.address, authkey=self.authkey)
+        if isinstance(self.address, str):
+            os.chmod(self.address, 0o600)
+        logger.info(f"Index server listening on {self.address}.")
+        while self._listener is not None:
+            try:
+                connection = self._listener.accept()
+            except AuthenticationError:
+                logger.warning("Rejected an index server connection with a wrong authkey.")
+                continue
+            except OSError:
+                if self._listener is None:
+                    return
+                raise
+            threading.Thread(target=self._serve_connection, args=(connection,), name="flashlearn-index-connection", daemon=True).start()
+
+    def close(self):
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+def wait_for_server(address: str, authkey_path: str, timeout: float) -> bool:
+    """
+    Waits until an index server answers at address. Returns False on timeout.
+    """
+    client = IndexClient(address, authkey_path)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            client.call("ping")
+            client.close()
+            return True
+        except (ConnectionError, FileNotFoundError, socket.error, AuthenticationError):
+            time.sleep(0.2)
+    return False
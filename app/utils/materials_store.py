@@ -0,0 +1,223 @@
+import json
+import time
+import sqlite3
+import threading
+import logging
+from app.utils.responses import json_bytes
+
+logger = logging.getLogger(__name__)
+
+# --- Materials Store Interface ---
+
+class MaterialsStore:
+    """
+    Stores the learning materials of each subject as ready-to-send JSON bytes.
+
+    The stored body is the full response for GET /api/subjects/{subject}:
+    {"name": ..., "summary": ..., "quiz": [...], "flashcards": [...]}.
+    """
+    name = "base"
+
+    def put(self, subject: str, summary: str, body: bytes):
+        raise NotImplementedError
+
+    def get(self, subject: str) -> bytes | None:
+        raise NotImplementedError
+
+    def get_many(self, subjects: list[str]) -> dict[str, bytes]:
+        raise NotImplementedError
+
+    def delete(self, subject: str):
+        raise NotImplementedError
+
+    def list_page(self, cursor: str | None, limit: int, include_body: bool) -> tuple[list[dict], str | None]:
+        """
+        Returns up to limit rows of {"name", "summary"} (plus "body" if include_body)
+        and an opaque cursor for the next page, or None on the last page.
+        """
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+
+def serialize_materials(subject: str, materials: dict) -> bytes:
+    """
+    Serializes materials into the stored response body.
+    """
+    return json_bytes({
+        "name": subject,
+        "summary": materials.get("summary", ""),
+        "quiz": materials.get("quiz", []),
+        "flashcards": materials.get("flashcards", []),
+    })
+
+# --- SQLite Backend ---
+
+class SQLiteMaterialsStore(MaterialsStore):
+    """
+    The default backend: one row per subject in an embedded SQLite database,
+    looked up by primary key and paged by name.
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS subjects ("
+            "name TEXT PRIMARY KEY, summary TEXT NOT NULL, body BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def put(self, subject: str, summary: str, body: bytes):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO subjects (name, summary, body, updated_at) VALUES (?, ?, ?, ?)",
+                (subject, summary, body, time.time())
+            )
+
+    def put_many(self, rows: list[tuple[str, str, bytes]]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO subjects (name, summary, body, updated_at) VALUES (?, ?, ?, ?)",
+                    [(subject, summary, body, now) for subject, summary, body in rows]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                # Leave the shared connection usable for the next transaction
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, subject: str) -> bytes | None:
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM subjects WHERE name = ?", (subject,)).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, subjects: list[str]) -> dict[str, bytes]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(subjects), 500):
+                batch = subjects[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(f"SELECT name, body FROM subjects WHERE name IN ({placeholders})", batch).fetchall()
+                found.update(rows)
+        return found
+
+    def delete(self, subject: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM subjects WHERE name = ?", (subject,))
+
+    def list_page(self, cursor: str | None, limit: int, include_body: bool) -> tuple[list[dict], str | None]:
+        columns = "name, summary, body" if include_body else "name, summary"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM subjects WHERE name > ? ORDER BY name LIMIT ?",
+                (cursor or "", limit + 1)
+            ).fetchall()
+        page = [dict(zip(("name", "summary", "body"), row)) for row in rows[:limit]]
+        next_cursor = page[-1]["name"] if len(rows) > limit else None
+        return page, next_cursor
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM subjects").fetchone()[0]
+
+    def get_meta(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)", (key, value))
+
+# --- Chroma Backend ---
+
+def _chroma_body(subject: str, metadata: dict) -> bytes:
+    return json_bytes({
+        "name": subject,
+        "summary": metadata.get("summary"),
+        "quiz": json.loads(metadata.get("quiz", "[]")),
+        "flashcards": json.loads(metadata.get("flashcards", "[]")),
+    })
+
+class ChromaMaterialsStore(MaterialsStore):
+    """
+    The legacy backend: one record per subject in a Chroma collection with a
+    dummy embedding and the quiz and flashcards as JSON strings in metadata.
+    """
+    name = "chroma"
+
+    def __init__(self, collection, embedding_dimension: int):
+        self.collection = collection
+        self.embedding_dimension = embedding_dimension
+
+    def put(self, subject: str, summary: str, body: bytes):
+        materials = json.loads(body)
+        # ChromaDB metadata values must be strings, numbers, or booleans.
+        metadata = {
+            "summary": summary,
+            "quiz": json.dumps(materials.get("quiz", [])),
+            "flashcards": json.dumps(materials.get("flashcards", []))
+        }
+        # We won't search this collection by vector, so a dummy embedding is enough
+        self.collection.upsert(ids=[subject], embeddings=[[0] * self.embedding_dimension], metadatas=[metadata])
+
+    def get(self, subject: str) -> bytes | None:
+        return self.get_many([subject]).get(subject)
+
+    def get_many(self, subjects: list[str]) -> dict[str, bytes]:
+        result = self.collection.get(ids=subjects, include=["metadatas"])
+        return {subject_id: _chroma_body(subject_id, metadata) for subject_id, metadata in zip(result['ids'], result['metadatas'])}
+
+    def delete(self, subject: str):
+        self.collection.delete(ids=[subject])
+
+    def list_page(self, cursor: str | None, limit: int, include_body: bool) -> tuple[list[dict], str | None]:
+        offset = int(cursor) if cursor else 0
+        results = self.collection.get(limit=limit + 1, offset=offset, include=["metadatas"])
+        page = []
+        for subject_id, metadata in zip(results['ids'][:limit], results['metadatas']):
+            row = {"name": subject_id, "summary": metadata.get("summary")}
+            if include_body:
+                row["body"] = _chroma_body(subject_id, metadata)
+            page.append(row)
+        next_cursor = str(offset + limit) if len(results['ids']) > limit else None
+        return page, next_cursor
+
+    def count(self) -> int:
+        return self.collection.count()
+
+# --- Migration ---
+
+LEGACY_MIGRATION_KEY = "migrated_from_chroma"
+
+def migrate_from_chroma(collection, store: SQLiteMaterialsStore, batch_size: int = 500) -> int:
+    """
+    Copies every subject from a legacy Chroma subjects collection into the SQLite store.
+    The Chroma collection is left untouched.
+
+    Returns:
+        int: The number of subjects migrated.
+    """
+    migrated = 0
+    offset = 0
+    while True:
+        results = collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+        if not results['ids']:
+            break
+        store.put_many([
+            (subject_id, metadata.get("summary") or "", _chroma_body(subject_id, metadata))
+            for subject_id, metadata in zip(results['ids'], results['metadatas'])
+        ])
+        migrated += len(results['ids'])
+        offset += batch_size
+    store.set_meta(LEGACY_MIGRATION_KEY, str(time.time()))
+    logger.info(f"Migrated {migrated} subjects from Chroma to {store.path}.")
+    return migrated
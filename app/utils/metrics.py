@@ -0,0 +1,175 @@
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- In-Process Metrics ---
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Metric:
+    """
+    Base class for labelled metrics. Values are keyed by a tuple of label values
+    and every update is guarded by a lock, since metrics are recorded from both
+    the event loop and pool threads.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        """
+        Returns (name suffix, labels, value) for every recorded series.
+        """
+        with self._lock:
+            values = dict(self._values)
+        if not values and not self.labels:
+            values = {(): 0.0}
+        return [("", dict(zip(self.labels, key)), value) for key, value in values.items()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def summary(self, **labels) -> dict:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if state is None:
+                return {"count": 0, "sum": 0.0, "mean": 0.0}
+            return {"count": state["count"], "sum": state["sum"], "mean": state["sum"] / state["count"]}
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        with self._lock:
+            states = {key: (list(state["counts"]), state["sum"], state["count"]) for key, state in self._values.items()}
+        samples = []
+        for key, (counts, total, count) in states.items():
+            labels = dict(zip(self.labels, key))
+            # Bucket counts are already cumulative, see observe()
+            for bound, bucket_count in zip(self.buckets, counts):
+                samples.append(("_bucket", {**labels, "le": _format_value(bound)}, bucket_count))
+            samples.append(("_bucket", {**labels, "le": "+Inf"}, count))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, count))
+        return samples
+
+
+class Registry:
+    """
+    Holds every metric created through counter(), gauge() and histogram().
+    Creating a metric that already exists returns the existing one.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: dict[str, Metric] = {}
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def metrics(self) -> list[Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+
+REGISTRY = Registry()
+
+def counter(name: str, description: str, labels: tuple[str, ...] = ()) -> Counter:
+    return REGISTRY._get_or_create(Counter, name, description, labels)
+
+def gauge(name: str, description: str, labels: tuple[str, ...] = ()) -> Gauge:
+    return REGISTRY._get_or_create(Gauge, name, description, labels)
+
+def histogram(name: str, description: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY._get_or_create(Histogram, name, description, labels, buckets=buckets)
+
+# --- Prometheus Exposition ---
+
+def _format_value(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def render_prometheus(registry: Registry = REGISTRY) -> str:
+    """
+    Renders every metric in the Prometheus text exposition format (version 0.0.4).
+    """
+    lines = []
+    for metric in sorted(registry.metrics(), key=lambda metric: metric.name):
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for suffix, labels, value in metric.samples():
+            label_text = ",".join(f'{name}="{_escape_label(str(label_value))}"' for name, label_value in labels.items())
+            series = f"{metric.name}{suffix}{{{label_text}}}" if label_text else f"{metric.name}{suffix}"
+            lines.append(f"{series} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+# --- Shared Metrics ---
+
+LLM_TIME_TO_FIRST_TOKEN = histogram(
+    "flashlearn_llm_time_to_first_token_seconds",
+    "Time from sending a streaming LLM request to receiving its first token.",
+    labels=("route",),
+)
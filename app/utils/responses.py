@@ -0,0 +1,194 @@
+import os
+import gzip
+import json
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from fastapi import Request, Response
+from app.services import executor
+from app.services.executor import run_in_pool
+from app.utils.metrics import counter
+
+# orjson and brotli are optional: without them, bodies are encoded with the
+# standard json module and only gzip is offered
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# --- Response Configuration ---
+
+# Bodies smaller than this are sent uncompressed
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+# Memory budget for compressed copies of recently sent bodies
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+
+# Content-Encoding values in order of preference, and the suffix each adds to the ETag
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+ETAG_SUFFIXES = {"br": "-br", "gzip": "-gz", "identity": ""}
+
+COMPRESSED_RESPONSES = counter(
+    "flashlearn_compressed_responses_total",
+    "Compressed response bodies by encoding and whether the compressed copy was cached (hit) or built (miss).",
+    labels=("encoding", "result"),
+)
+
+# --- JSON Encoding ---
+
+def json_bytes(obj) -> bytes:
+    """
+    Encodes obj as compact UTF-8 JSON, with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# --- Content Negotiation ---
+
+def choose_encoding(accept_encoding: str | None) -> str:
+    """
+    Picks the best encoding we offer from an Accept-Encoding header, honouring
+    q-values and "*". Returns "identity" if the client accepts none of them.
+    """
+    if not accept_encoding:
+        return "identity"
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            weights[coding] = q
+    best, best_q = "identity", 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def compress(body: bytes, encoding: str, level: int | None = None) -> bytes:
+    """
+    Compresses body with the given Content-Encoding.
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY if level is None else level)
+    if encoding == "gzip":
+        # mtime=0 keeps the output deterministic, so equal bodies compress to equal bytes
+        return gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL if level is None else level, mtime=0)
+    return body
+
+# --- Conditional Requests ---
+
+def strong_etag(body: bytes) -> str:
+    """
+    Returns the digest that identifies body; quoted and suffixed per encoding by etag_for.
+    """
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+def etag_for(digest: str, encoding: str) -> str:
+    return f'"{digest}{ETAG_SUFFIXES[encoding]}"'
+
+def etag_matches(request: Request, digest: str) -> bool:
+    """
+    Whether the request's If-None-Match names any encoding of the body with this
+    digest. The encodings decode to the same bytes, so a client holding one of
+    them already has the current content.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/").strip('"')
+        if tag.split("-", 1)[0] == digest:
+            return True
+    return False
+
+# --- Compressed Variant Cache ---
+
+class CompressedBodyCache:
+    """
+    An LRU of compressed bodies keyed by (digest, encoding), bounded by the total
+    size of the compressed bytes. Repeated fetches of an unchanged body reuse
+    the compressed copy instead of compressing it again.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: str, encoding: str) -> bytes | None:
+        with self._lock:
+            body = self._entries.get((digest, encoding))
+            if body is not None:
+                self._entries.move_to_end((digest, encoding))
+            return body
+
+    def put(self, digest: str, encoding: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop((digest, encoding), None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[(digest, encoding)] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+compressed_body_cache = CompressedBodyCache(RESPONSE_CACHE_MAX_BYTES)
+
+# --- Responses ---
+
+async def encoded_response(
+    request: Request,
+    body: bytes,
+    media_type: str = "application/json",
+    cache_control: str = "no-cache",
+    status_code: int = 200,
+) -> Response:
+    """
+    Sends a ready-made body with a strong ETag, compressed in the best encoding
+    the client accepts.
+
+    Returns 304 without a body when If-None-Match names the current body.
+    Compressed copies are kept in compressed_body_cache, so serving the same
+    body again only costs a hash of the uncompressed bytes.
+    """
+    digest = strong_etag(body)
+    encoding = choose_encoding(request.headers.get("accept-encoding")) if len(body) >= RESPONSE_COMPRESSION_MIN_BYTES else "identity"
+    headers = {"ETag": etag_for(digest, encoding), "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+    if status_code == 200 and etag_matches(request, digest):
+        return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        compressed = compressed_body_cache.get(digest, encoding)
+        if compressed is None:
+            COMPRESSED_RESPONSES.inc(encoding=encoding, result="miss")
+            compressed = await run_in_pool(executor.IO, compress, body, encoding)
+            compressed_body_cache.put(digest, encoding, compressed)
+        else:
+            COMPRESSED_RESPONSES.inc(encoding=encoding, result="hit")
+        body = compressed
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
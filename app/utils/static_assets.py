@@ -0,0 +1,160 @@
+import os
+import re
+import mimetypes
+import asyncio
+import threading
+import logging
+from fastapi import Request, Response, HTTPException
+from app.utils.responses import (
+    ENCODINGS, RESPONSE_COMPRESSION_MIN_BYTES, choose_encoding, compress, etag_for, etag_matches, strong_etag,
+)
+
+logger = logging.getLogger(__name__)
+
+# --- Static Asset Configuration ---
+
+# Versioned URLs (?v=<digest>) never change content, so browsers may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Unversioned URLs, including the page itself, are revalidated with their ETag on every use
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# Static files are compressed once when loaded, so they get the strongest settings
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+VERSION_LENGTH = 12
+
+# Root-relative references to other static files in HTML, e.g. src="/static/script.js"
+_STATIC_REFERENCE = re.compile(r'(?P<quote>["\'])/static/(?P<name>[^"\'?#]+)(?P=quote)')
+
+class StaticAsset:
+    """
+    One file from the static directory, held in memory with its digest and
+    precompressed variants.
+    """
+    def __init__(self, name: str, stamp: tuple[int, int], media_type: str, body: bytes, dependencies: dict[str, str]):
+        self.name = name
+        self.stamp = stamp
+        self.media_type = media_type
+        self.body = body
+        self.digest = strong_etag(body)
+        self.version = self.digest[:VERSION_LENGTH]
+        # Digests of the assets this one links to; HTML is rebuilt when one of them changes
+        self.dependencies = dependencies
+        self.variants = {"identity": body}
+        if len(body) >= RESPONSE_COMPRESSION_MIN_BYTES and media_type.startswith(COMPRESSIBLE_TYPES):
+            for encoding in ENCODINGS:
+                compressed = compress(body, encoding, STATIC_GZIP_LEVEL if encoding == "gzip" else STATIC_BROTLI_QUALITY)
+                if len(compressed) < len(body):
+                    self.variants[encoding] = compressed
+
+class StaticAssets:
+    """
+    Serves the frontend from memory.
+
+    Files are loaded and compressed at startup (see load_all) and reloaded when
+    their size or modification time changes, so edits show up without a restart.
+    Loading and checking files happens in a thread, never on the event loop.
+    References to /static/... in HTML are rewritten to versioned URLs, which
+    are served with long-lived cache headers; everything else is revalidated
+    with a strong ETag.
+    """
+    def __init__(self, directory: str):
+        self.directory = os.path.realpath(directory)
+        self._assets: dict[str, StaticAsset] = {}
+        # Reentrant because loading a page loads the assets it links to
+        self._lock = threading.RLock()
+
+    def _resolve(self, name: str) -> str | None:
+        path = os.path.realpath(os.path.join(self.directory, name))
+        if not path.startswith(self.directory + os.sep) or os.path.basename(path).startswith("."):
+            return None
+        return path
+
+    def _is_current(self, asset: StaticAsset, stamp: tuple[int, int]) -> bool:
+        if asset.stamp != stamp:
+            return False
+        for name, digest in asset.dependencies.items():
+            dependency = self.get(name)
+            if dependency is None or dependency.digest != digest:
+                return False
+        return True
+
+    def _load(self, name: str, path: str, stamp: tuple[int, int]) -> StaticAsset:
+        with open(path, "rb") as f:
+            body = f.read()
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        dependencies = {}
+        if media_type == "text/html":
+            def versioned(match: re.Match) -> str:
+                dependency = self.get(match["name"])
+                if dependency is None:
+                    return match[0]
+                dependencies[match["name"]] = dependency.digest
+                return f'{match["quote"]}/static/{match["name"]}?v={dependency.version}{match["quote"]}'
+            body = _STATIC_REFERENCE.sub(versioned, body.decode("utf-8")).encode("utf-8")
+        if media_type.startswith("text/"):
+            media_type += "; charset=utf-8"
+        logger.info(f"Loaded static asset {name} ({len(body)} bytes).")
+        return StaticAsset(name, stamp, media_type, body, dependencies)
+
+    def get(self, name: str) -> StaticAsset | None:
+        """
+        Returns the current version of a static file, or None if it does not exist.
+        """
+        path = self._resolve(name)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        asset = self._assets.get(name)
+        if asset is not None and self._is_current(asset, stamp):
+            return asset
+        with self._lock:
+            asset = self._assets.get(name)
+            if asset is None or not self._is_current(asset, stamp):
+                asset = self._assets[name] = self._load(name, path, stamp)
+        return asset
+
+    def load_all(self):
+        """
+        Loads and compresses every file of the static directory.
+        """
+        for directory, subdirectories, filenames in os.walk(self.directory):
+            subdirectories[:] = [name for name in subdirectories if not name.startswith(".")]
+            for filename in filenames:
+                self.get(os.path.relpath(os.path.join(directory, filename), self.directory).replace(os.sep, "/"))
+
+    async def response(self, request: Request, name: str) -> Response:
+        """
+        Builds the response for a static file, honouring Accept-Encoding and If-None-Match.
+
+        Raises:
+            HTTPException: If the file does not exist.
+        """
+        # A changed file is read and compressed again, which would block the event loop
+        asset = await asyncio.to_thread(self.get, name)
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+
+        # A stale version parameter still gets the current file, but must not be cached for long
+        immutable = request.query_params.get("v") == asset.version
+        encoding = choose_encoding(request.headers.get("accept-encoding"))
+        if encoding not in asset.variants:
+            encoding = "identity"
+        headers = {
+            "ETag": etag_for(asset.digest, encoding),
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(request, asset.digest):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        body = asset.variants[encoding]
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            return Response(media_type=asset.media_type, headers=headers)
+        return Response(content=body, media_type=asset.media_type, headers=headers)
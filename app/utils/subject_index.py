@@ -0,0 +1,185 @@
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+from app.utils.metrics import counter, gauge
+
+logger = logging.getLogger(__name__)
+
+# Oversized subjects remembered at most, oldest forgotten first
+MAX_OVERSIZED_SUBJECTS = 1024
+
+SUBJECT_INDEX_REQUESTS = counter(
+    "flashlearn_subject_index_requests_total",
+    "Hot subject index searches by result (hit, load, or fallback to Chroma).",
+    labels=("result",),
+)
+SUBJECT_INDEX_BYTES = gauge(
+    "flashlearn_subject_index_bytes",
+    "Memory held by the hot subject index.",
+)
+
+class _SubjectVectors:
+    """
+    The chunks of one subject as a contiguous matrix, with the documents and
+    metadata to return for each row.
+    """
+    def __init__(self, version: int, embeddings: np.ndarray, documents: list[str], metadatas: list[dict | None]):
+        self.version = version
+        self.embeddings = embeddings
+        # Half the squared norm of each row: ranking by x.q - |x|^2/2 is ranking by L2 distance, as Chroma does
+        self.half_norms = 0.5 * np.einsum("ij,ij->i", embeddings, embeddings)
+        self.documents = documents
+        self.metadatas = metadatas
+        self.nbytes = embeddings.nbytes + self.half_norms.nbytes + sum(len(document) for document in documents) * 2
+
+class SubjectVectorIndex:
+    """
+    Keeps the chunk embeddings of recently queried subjects in memory and
+    answers top-k searches with one matrix-vector product, instead of a
+    filtered query over the whole Chroma collection.
+
+    Chroma stays the source of truth. A subject is loaded from it on its first
+    search and reloaded when the subject's document version changes; subjects
+    are evicted least-recently-used to stay under max_bytes. Subjects too
+    large for the budget are always searched in Chroma.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._subjects: OrderedDict[str, _SubjectVectors] = OrderedDict()
+        self._nbytes = 0
+        # One load per subject at a time; concurrent searches wait for it instead of loading again.
+        # Each entry holds the lock and the number of searches using it, and goes away with the last one.
+        self._loading: dict[str, list] = {}
+        # Versions of subjects found too large, so they are not loaded again until they change
+        self._oversized: OrderedDict[str, int] = OrderedDict()
+
+    def _get(self, subject: str, version: int) -> _SubjectVectors | None:
+        with self._lock:
+            vectors = self._subjects.get(subject)
+            if vectors is None:
+                return None
+            if vectors.version != version:
+                self._remove(subject)
+                return None
+            self._subjects.move_to_end(subject)
+            return vectors
+
+    def _remove(self, subject: str):
+        self._oversized.pop(subject, None)
+        vectors = self._subjects.pop(subject, None)
+        if vectors is not None:
+            self._nbytes -= vectors.nbytes
+            SUBJECT_INDEX_BYTES.set(self._nbytes)
+
+    def _put(self, subject: str, vectors: _SubjectVectors):
+        with self._lock:
+            self._remove(subject)
+            self._subjects[subject] = vectors
+            self._nbytes += vectors.nbytes
+            while self._nbytes > self.max_bytes:
+                self._remove(next(iter(self._subjects)))
+            SUBJECT_INDEX_BYTES.set(self._nbytes)
+
+    def _load(self, subject: str, version: int, load) -> _SubjectVectors | None:
+        """
+        Loads a subject from Chroma. Returns None if it does not fit the budget.
+        """
+        with self._lock:
+            loading = self._loading.setdefault(subject, [threading.Lock(), 0])
+            loading[1] += 1
+        try:
+            with loading[0]:
+                return self._load_locked(subject, version, load)
+        finally:
+            with self._lock:
+                loading[1] -= 1
+                if loading[1] == 0:
+                    del self._loading[subject]
+
+    def _load_locked(self, subject: str, version: int, load) -> _SubjectVectors | None:
+        vectors = self._get(subject, version)
+        with self._lock:
+            oversized = self._oversized.get(subject) == version
+        if vectors is not None or oversized:
+            return vectors
+        results = load(subject)
+        if results["ids"]:
+            embeddings = np.ascontiguousarray(results["embeddings"], dtype=np.float32)
+        else:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        vectors = _SubjectVectors(version, embeddings, list(results["documents"]), list(results["metadatas"]))
+        if vectors.nbytes > self.max_bytes:
+            with self._lock:
+                self._remove(subject)
+                self._oversized[subject] = version
+                while len(self._oversized) > MAX_OVERSIZED_SUBJECTS:
+                    self._oversized.popitem(last=False)
+            logger.info(f"Subject {subject} ({vectors.nbytes} bytes) does not fit the subject index; searching it in Chroma.")
+            return None
+        self._put(subject, vectors)
+        logger.info(f"Loaded {len(vectors.documents)} chunks of subject {subject} into the subject index.")
+        return vectors
+
+    def search(self, subject: str, query_embedding, n_results: int, version: int, load) -> dict | None:
+        """
+        Returns the subject's n_results nearest chunks to a query embedding, in
+        the shape of a Chroma query result: {"documents": [[...]], "metadatas": [[...]]}.
+
+        Args:
+            subject (str): The subject to search.
+            query_embedding: The question embedding.
+            n_results (int): The number of chunks to return.
+            version (int): The subject's current document version.
+            load (callable): Called as load(subject) on a miss; returns a Chroma get
+                result with "ids", "embeddings", "documents" and "metadatas".
+
+        Returns:
+            dict | None: None if the index is disabled or the subject does not fit
+                in it, in which case the caller queries Chroma.
+        """
+        if self.max_bytes <= 0:
+            return None
+        vectors = self._get(subject, version)
+        if vectors is not None:
+            SUBJECT_INDEX_REQUESTS.inc(result="hit")
+        else:
+            vectors = self._load(subject, version, load)
+            if vectors is None:
+                SUBJECT_INDEX_REQUESTS.inc(result="fallback")
+                return None
+            SUBJECT_INDEX_REQUESTS.inc(result="load")
+
+        k = min(n_results, len(vectors.documents))
+        if k <= 0:
+            return {"documents": [[]], "metadatas": [[]]}
+        scores = vectors.embeddings @ np.asarray(query_embedding, dtype=np.float32) - vectors.half_norms
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return {
+            "documents": [[vectors.documents[i] for i in top]],
+            "metadatas": [[vectors.metadatas[i] for i in top]],
+        }
+
+    def invalidate(self, subject: str):
+        """
+        Drops a subject's vectors, so its next search reloads them from Chroma.
+        """
+        with self._lock:
+            self._remove(subject)
+
+    def stats(self) -> dict:
+        with self._lock:
+            subjects = len(self._subjects)
+            chunks = sum(len(vectors.documents) for vectors in self._subjects.values())
+            nbytes = self._nbytes
+        return {
+            "subjects": subjects,
+            "chunks": chunks,
+            "bytes": nbytes,
+            "max_bytes": self.max_bytes,
+            "hits": int(SUBJECT_INDEX_REQUESTS.value(result="hit")),
+            "loads": int(SUBJECT_INDEX_REQUESTS.value(result="load")),
+            "fallbacks": int(SUBJECT_INDEX_REQUESTS.value(result="fallback")),
+        }
@@ -0,0 +1,195 @@
+import re
+import time
+import uuid
+import logging
+import contextvars
+from contextlib import contextmanager
+from starlette.routing import compile_path
+from app.utils.metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+# --- Trace Ids ---
+
+# The id of the request (or background job) being handled, included in every log line
+trace_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("trace_id", default="-")
+
+# Clients may pass their own id in this header; it is echoed on every response
+TRACE_HEADER = "x-trace-id"
+_VALID_TRACE_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+class TraceIdFilter(logging.Filter):
+    """
+    Adds the current trace id to log records as %(trace_id)s.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id_var.get()
+        return True
+
+def install_log_filter():
+    """
+    Attaches TraceIdFilter to the root logger's handlers.
+    """
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(TraceIdFilter())
+
+# --- Pipeline Stages ---
+
+STAGE_SECONDS = histogram(
+    "flashlearn_stage_seconds",
+    "Time spent in each pipeline stage.",
+    labels=("stage",),
+)
+STAGE_INPUT_CHARS = counter(
+    "flashlearn_stage_input_chars_total",
+    "Characters passed into each pipeline stage.",
+    labels=("stage",),
+)
+STAGE_OUTPUT_CHARS = counter(
+    "flashlearn_stage_output_chars_total",
+    "Characters produced by each pipeline stage.",
+    labels=("stage",),
+)
+STAGE_ERRORS = counter(
+    "flashlearn_stage_errors_total",
+    "Pipeline stages that raised an exception.",
+    labels=("stage",),
+)
+
+class StageTimer:
+    def __init__(self, name: str, input_chars: int | None):
+        self.name = name
+        self.input_chars = input_chars
+        self.output_chars: int | None = None
+
+def record_stage(name: str, seconds: float, input_chars: int | None = None, output_chars: int | None = None):
+    """
+    Records a stage timing measured by the caller, e.g. when the stage's time
+    is spread over several awaits.
+    """
+    STAGE_SECONDS.observe(seconds, stage=name)
+    if input_chars is not None:
+        STAGE_INPUT_CHARS.inc(input_chars, stage=name)
+    if output_chars is not None:
+        STAGE_OUTPUT_CHARS.inc(output_chars, stage=name)
+
+    sizes = "".join(
+        f", {label} {value} chars" for label, value in (("in", input_chars), ("out", output_chars)) if value is not None
+    )
+    logger.info(f"Stage {name} took {seconds:.3f}s{sizes}.")
+
+@contextmanager
+def stage(name: str, input_chars: int | None = None):
+    """
+    Times a block as a pipeline stage. Set output_chars on the yielded timer to
+    count the stage's output.
+
+        with stage("llm_answer", input_chars=len(prompt)) as timer:
+            response = await model.generate_content_async(prompt)
+            timer.output_chars = len(response.text)
+    """
+    timer = StageTimer(name, input_chars)
+    start = time.perf_counter()
+    try:
+        yield timer
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        record_stage(name, time.perf_counter() - start, timer.input_chars, timer.output_chars)
+
+# --- Request Metrics ---
+
+HTTP_REQUESTS = counter(
+    "flashlearn_http_requests_total",
+    "HTTP requests by endpoint, method and status code.",
+    labels=("endpoint", "method", "status"),
+)
+HTTP_ERRORS = counter(
+    "flashlearn_http_request_errors_total",
+    "HTTP requests that failed with a 5xx status or an unhandled exception.",
+    labels=("endpoint",),
+)
+HTTP_IN_FLIGHT = gauge(
+    "flashlearn_http_requests_in_flight",
+    "HTTP requests currently being handled.",
+    labels=("endpoint",),
+)
+HTTP_REQUEST_SECONDS = histogram(
+    "flashlearn_http_request_seconds",
+    "Time from receiving a request to sending the last byte of its response.",
+    labels=("endpoint",),
+)
+
+def _route_templates(app) -> list[tuple[object, str]]:
+    # Full route templates (including router prefixes) from the OpenAPI schema,
+    # plus top-level routes and mounts that are not part of the schema
+    templates = list(app.openapi().get("paths", {}))
+    templates += [route.path for route in app.routes if getattr(route, "path", None) and route.path not in templates]
+    patterns = []
+    for template in templates:
+        regex, _, _ = compile_path(template)
+        patterns.append((regex, template))
+    return patterns
+
+class RequestMetricsMiddleware:
+    """
+    Assigns each request a trace id and records per-endpoint request counts,
+    errors, in-flight requests and durations.
+
+    This is a plain ASGI middleware so that streamed responses are timed until
+    their last chunk is sent.
+    """
+    def __init__(self, app):
+        self.app = app
+        self._templates: list[tuple[object, str]] | None = None
+
+    def _endpoint(self, scope) -> str:
+        # Label by route template rather than raw path, so /api/jobs/{job_id} is one series
+        if self._templates is None:
+            self._templates = _route_templates(scope["app"])
+        path = scope["path"]
+        for regex, template in self._templates:
+            if regex.match(path):
+                return template
+        for regex, template in self._templates:
+            # Mounts such as /static match by prefix
+            if template != "/" and path.startswith(template.rstrip("/") + "/"):
+                return template
+        return "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested_id = dict(scope["headers"]).get(TRACE_HEADER.encode(), b"").decode("latin-1")
+        trace_id = requested_id if _VALID_TRACE_ID.match(requested_id) else new_trace_id()
+        token = trace_id_var.set(trace_id)
+        endpoint = self._endpoint(scope)
+        status = 500
+
+        async def send_with_trace_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (TRACE_HEADER.encode(), trace_id.encode())]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(endpoint=endpoint)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        except BaseException:
+            status = 500
+            raise
+        finally:
+            HTTP_IN_FLIGHT.dec(endpoint=endpoint)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+            HTTP_REQUESTS.inc(endpoint=endpoint, method=scope["method"], status=status)
+            if status >= 500:
+                HTTP_ERRORS.inc(endpoint=endpoint)
+            trace_id_var.reset(token)
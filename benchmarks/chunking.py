@@ -0,0 +1,167 @@
+"""
+Micro-benchmark of the document chunker against the previous word-window chunker.
+
+For synthetic documents of each size, reports chunking time (best of --repeat),
+peak traced memory, the number and size of chunks, and how many chunks end at
+the end of a sentence, and how many chunks change after small edits (and so
+would be embedded again). With --chroma, also writes both chunkings to temporary
+Chroma databases, the old one with the chunk text repeated in metadata as it
+used to be stored, and reports their size on disk.
+
+    python -m benchmarks.chunking --words 10000,100000,1000000
+    python -m benchmarks.chunking --words 200000 --chroma --output chunking.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+from benchmarks.synthetic import make_text
+from app.utils.helpers import iter_chunk_spans, split_text_into_chunks
+
+# Chunks are given random vectors of this size, as the embedding model would produce
+EMBEDDING_DIMENSION = 384
+CHROMA_ADD_BATCH = 5000
+
+def legacy_split_text_into_chunks(text: str, chunk_size: int = 500, overlap: int = 50) -> list[str]:
+    """
+    The previous chunker: overlapping windows of whole words, re-joined with single spaces.
+    """
+    if not text:
+        return []
+
+    words = text.split()
+    chunks = []
+    for i in range(0, len(words), chunk_size - overlap):
+        chunks.append(" ".join(words[i:i + chunk_size]))
+    return chunks
+
+def _best_time(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _peak_bytes(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def _chunk_stats(chunks: list[str]) -> dict:
+    lengths = [len(chunk) for chunk in chunks]
+    return {
+        "chunks": len(chunks),
+        "mean_chars": round(sum(lengths) / len(lengths), 1) if lengths else 0,
+        "max_chars": max(lengths, default=0),
+        "sentence_end_ratio": round(sum(chunk.rstrip("\"'”’)]").endswith((".", "!", "?")) for chunk in chunks) / len(chunks), 4) if chunks else 0,
+    }
+
+def _edits(text: str) -> dict[str, str]:
+    """
+    Small edits of a document: a sentence inserted in the middle or at the
+    start, and a sentence deleted near the start.
+    """
+    sentence = "An inserted sentence changes the document here. "
+    middle = text.index(". ", len(text) // 2) + 2
+    first = text.index(". ") + 2
+    second = text.index(". ", first) + 2
+    return {
+        "insert_middle": text[:middle] + sentence + text[middle:],
+        "delete_near_start": text[:first] + text[second:],
+        "insert_start": sentence + text,
+    }
+
+def _edit_stability(text: str, chunker) -> dict:
+    """
+    For each edit, the number of chunks of the edited text that are not chunks
+    of the original, i.e. that would miss the embedding cache.
+    """
+    original = set(chunker(text))
+    result = {}
+    for name, edited in _edits(text).items():
+        chunks = chunker(edited)
+        result[name] = {"changed": sum(chunk not in original for chunk in chunks), "chunks": len(chunks)}
+    return result
+
+def _directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def _chroma_bytes(chunks: list[str], metadatas: list[dict]) -> int:
+    # Imported here so the benchmark runs without chromadb unless --chroma is given
+    import chromadb
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory(prefix="flashlearn-chunking-") as directory:
+        client = chromadb.PersistentClient(path=directory)
+        collection = client.get_or_create_collection(name="flashlearn_documents")
+        for start in range(0, len(chunks), CHROMA_ADD_BATCH):
+            stop = start + CHROMA_ADD_BATCH
+            embeddings = rng.standard_normal((len(chunks[start:stop]), EMBEDDING_DIMENSION)).astype(np.float32)
+            collection.add(
+                ids=[str(i) for i in range(start, start + len(embeddings))],
+                embeddings=embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True),
+                documents=chunks[start:stop],
+                metadatas=metadatas[start:stop],
+            )
+        size = _directory_bytes(directory)
+        client.clear_system_cache()
+    return size
+
+def benchmark(words: int, repeat: int, chroma: bool) -> dict:
+    text = make_text(words, seed=words)
+    legacy_chunks = legacy_split_text_into_chunks(text)
+    spans = list(iter_chunk_spans(text))
+    chunks = [text[start:end] for start, end in spans]
+
+    result = {
+        "characters": len(text),
+        "legacy": {
+            **_chunk_stats(legacy_chunks),
+            "seconds": round(_best_time(lambda: legacy_split_text_into_chunks(text), repeat), 5),
+            "peak_bytes": _peak_bytes(lambda: legacy_split_text_into_chunks(text)),
+            "edits": _edit_stability(text, legacy_split_text_into_chunks),
+        },
+        "sentence_aware": {
+            **_chunk_stats(chunks),
+            "seconds": round(_best_time(lambda: split_text_into_chunks(text), repeat), 5),
+            "peak_bytes": _peak_bytes(lambda: split_text_into_chunks(text)),
+            # Indexing keeps only the offsets and slices each chunk when it is hashed or embedded
+            "spans_seconds": round(_best_time(lambda: list(iter_chunk_spans(text)), repeat), 5),
+            "spans_peak_bytes": _peak_bytes(lambda: sum(1 for _ in iter_chunk_spans(text))),
+            "edits": _edit_stability(text, split_text_into_chunks),
+        },
+    }
+    if chroma:
+        result["legacy"]["chroma_bytes"] = _chroma_bytes(
+            legacy_chunks, [{"subject": "s", "document_id": "d", "text": chunk} for chunk in legacy_chunks],
+        )
+        result["sentence_aware"]["chroma_bytes"] = _chroma_bytes(
+            chunks, [{"subject": "s", "document_id": "d", "start": start, "end": end} for start, end in spans],
+        )
+    return result
+
+def _parse_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the sentence-aware chunker with the previous word-window chunker.")
+    parser.add_argument("--words", type=_parse_list, default=[10_000, 100_000, 1_000_000], help="Comma-separated document sizes in words.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per chunker; the fastest is reported.")
+    parser.add_argument("--chroma", action="store_true", help="Also compare the on-disk size of both layouts in Chroma.")
+    parser.add_argument("--output", help="Also write the JSON results to this file.")
+    args = parser.parse_args()
+
+    results = {str(words): benchmark(words, args.repeat, args.chroma) for words in args.words}
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
@@ -0,0 +1,54 @@
+"""
+Compares two benchmark result files written by benchmarks.run.
+
+    python -m benchmarks.compare baseline.json candidate.json
+"""
+import sys
+import json
+
+METRICS = (
+    ("throughput_rps", "req/s", True),
+    ("p50", "p50 ms", False),
+    ("p95", "p95 ms", False),
+    ("p99", "p99 ms", False),
+)
+
+def _value(result: dict, metric: str):
+    return result.get(metric, result.get("latency_ms", {}).get(metric))
+
+def _delta(before, after, higher_is_better: bool) -> str:
+    if before is None or after is None or before == 0:
+        return "n/a"
+    change = (after - before) / before * 100
+    better = change > 0 if higher_is_better else change < 0
+    return f"{change:+.1f}%{' (better)' if better and abs(change) >= 5 else ''}"
+
+def compare(baseline: dict, candidate: dict) -> list[str]:
+    lines = [f"baseline {baseline['meta'].get('commit')}  vs  candidate {candidate['meta'].get('commit')}"]
+    for name in sorted(set(baseline["scenarios"]) | set(candidate["scenarios"])):
+        before = baseline["scenarios"].get(name)
+        after = candidate["scenarios"].get(name)
+        if before is None or after is None:
+            lines.append(f"{name}: only in {'candidate' if before is None else 'baseline'}")
+            continue
+        lines.append(f"{name}:")
+        for metric, label, higher_is_better in METRICS:
+            old, new = _value(before, metric), _value(after, metric)
+            lines.append(f"  {label:<8} {old!s:>10} -> {new!s:<10} {_delta(old, new, higher_is_better)}")
+        if before["errors"] or after["errors"]:
+            lines.append(f"  errors   {before['errors']:>10} -> {after['errors']}")
+
+    before_rss = baseline.get("server", {}).get("peak_rss_bytes")
+    after_rss = candidate.get("server", {}).get("peak_rss_bytes")
+    if before_rss and after_rss:
+        lines.append(f"peak RSS: {before_rss / 2**20:.0f} MiB -> {after_rss / 2**20:.0f} MiB {_delta(before_rss, after_rss, False)}")
+    return lines
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m benchmarks.compare BASELINE.json CANDIDATE.json")
+    with open(sys.argv[1]) as f:
+        baseline_results = json.load(f)
+    with open(sys.argv[2]) as f:
+        candidate_results = json.load(f)
+    print("\n".join(compare(baseline_results, candidate_results)))
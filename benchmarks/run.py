@@ -0,0 +1,315 @@
+"""
+End-to-end benchmark for the FlashLearn API.
+
+Starts the app with the fake LLM backend in a temporary database directory (or
+targets a running server with --url), drives /api/process/file, /api/ask and
+/api/subjects at the given concurrency, and writes latency percentiles,
+throughput and peak server RSS as JSON.
+
+    python -m benchmarks.run --concurrency 8 --requests 40
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from collections import Counter
+import httpx
+from benchmarks.synthetic import make_text, make_pdf
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Pages per synthetic document; text documents get the same number of words
+DOCUMENT_SIZES = {"small": 2, "medium": 20, "large": 200}
+WORDS_PER_PAGE = 400
+SCENARIOS = ("process_file", "ask", "subjects")
+
+# --- Server Process ---
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _read_peak_rss(pid: int) -> int | None:
+    # VmHWM is the process's peak resident set size (Linux only)
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+def _child_pids(pid: int) -> list[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            return [int(child) for child in children.read().split()]
+    except OSError:
+        return []
+
+class ServerProcess:
+    """
+    Runs the app under uvicorn with the fake LLM and an isolated database directory.
+    """
+    def __init__(self, llm_latency_ms: float, env: dict[str, str]):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._db_dir = tempfile.TemporaryDirectory(prefix="flashlearn-bench-")
+        self._env = {
+            **os.environ,
+            "LLM_BACKEND": "fake",
+            "FAKE_LLM_LATENCY_MS": str(llm_latency_ms),
+            # Gemini quotas do not apply to the fake model; pass --env to benchmark the limiter
+            "LLM_RATE_LIMIT_PER_MINUTE": "0",
+            "FLASHLEARN_DB_DIR": self._db_dir.name,
+            **env,
+        }
+        self.process: subprocess.Popen | None = None
+        self.child_peak_rss: dict[int, int] = {}
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(self.port), "--log-level", "warning"],
+            cwd=ROOT_DIR, env=self._env,
+        )
+
+    async def wait_ready(self, client: httpx.AsyncClient, timeout: float = 300) -> float:
+        start = time.perf_counter()
+        while time.perf_counter() - start < timeout:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.process.returncode} during startup.")
+            try:
+                if (await client.get("/ready")).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+        raise RuntimeError(f"Server was not ready after {timeout}s.")
+
+    def sample_rss(self) -> dict:
+        # Worker processes (the extraction pool) come and go, so remember each one's peak
+        for child in _child_pids(self.process.pid):
+            rss = _read_peak_rss(child)
+            if rss:
+                self.child_peak_rss[child] = max(rss, self.child_peak_rss.get(child, 0))
+        return {
+            "peak_rss_bytes": _read_peak_rss(self.process.pid),
+            "children_peak_rss_bytes": sum(self.child_peak_rss.values()),
+        }
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self._db_dir.cleanup()
+
+# --- Measurement ---
+
+def percentile(sorted_values: list[float], fraction: float) -> float | None:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+async def run_scenario(name: str, send, total: int, concurrency: int, on_sample=None) -> dict:
+    """
+    Calls send(i) for i in range(total) with at most concurrency calls in flight.
+    send returns the HTTP response; non-2xx responses count as errors.
+    """
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    indices = iter(range(total))
+
+    async def worker():
+        for i in indices:
+            start = time.perf_counter()
+            try:
+                response = await send(i)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            statuses[status] += 1
+            if status.startswith("2"):
+                latencies.append(elapsed)
+            if on_sample:
+                on_sample()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    result = {
+        "requests": total,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": total - len(latencies),
+        "status_counts": dict(statuses),
+        "duration_seconds": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 3) if duration else None,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "max": latencies[-1] if latencies else None,
+        },
+    }
+    result["latency_ms"] = {key: round(value * 1000, 1) if value is not None else None for key, value in result["latency_ms"].items()}
+    print(
+        f"{name:<28} ok {result['ok']:>5}/{total:<5} {result['throughput_rps'] or 0:>8.2f} req/s  "
+        f"p50 {result['latency_ms']['p50']} ms  p95 {result['latency_ms']['p95']} ms  p99 {result['latency_ms']['p99']} ms",
+        file=sys.stderr,
+    )
+    return result
+
+# --- Scenarios ---
+
+def _document(kind: str, size: str, seed: int) -> tuple[str, bytes]:
+    pages = DOCUMENT_SIZES[size]
+    if kind == "pdf":
+        return f"bench-{size}-{seed}.pdf", make_pdf(pages, WORDS_PER_PAGE, seed)
+    return f"bench-{size}-{seed}.txt", make_text(pages * WORDS_PER_PAGE, seed).encode("utf-8")
+
+def _upload(client: httpx.AsyncClient, subject: str, filename: str, content: bytes):
+    return client.post(
+        "/api/process/file",
+        data={"subject": subject, "use_cache": "false"},
+        files={"file": (filename, content)},
+    )
+
+async def bench_process_file(client, args, on_sample) -> dict:
+    results = {}
+    for kind in args.formats:
+        for size in args.sizes:
+            # Build every payload before timing so generation cost is not measured
+            documents = [_document(kind, size, seed) for seed in range(args.requests)]
+
+            def send(i, kind=kind, size=size, documents=documents):
+                filename, content = documents[i]
+                return _upload(client, f"bench-{kind}-{size}-{i}", filename, content)
+
+            name = f"process_file/{kind}/{size}"
+            results[name] = await run_scenario(name, send, args.requests, args.concurrency, on_sample)
+    return results
+
+async def bench_ask(client, args, on_sample) -> dict:
+    subject = "bench-ask"
+    filename, content = _document("txt", "medium", 424242)
+    response = await _upload(client, subject, filename, content)
+    response.raise_for_status()
+    words = content.decode("utf-8").split()[:500]
+
+    def send(i):
+        # Distinct questions, so the semantic answer cache mostly misses
+        question = f"What is the meaning of {words[i % len(words)]} and {words[(i * 7 + 3) % len(words)]}?"
+        return client.post("/api/ask", data={"subject": subject, "question": question})
+
+    return {"ask": await run_scenario("ask", send, args.requests, args.concurrency, on_sample)}
+
+async def bench_subjects(client, args, on_sample) -> dict:
+    seeded = json.loads((await client.get("/api/subjects", params={"limit": 200})).content)["subjects"]
+    for seed in range(len(seeded), args.min_subjects):
+        filename, content = _document("txt", "small", 900000 + seed)
+        (await _upload(client, f"bench-subject-{seed}", filename, content)).raise_for_status()
+
+    def send(i):
+        return client.get("/api/subjects", params={"limit": 50})
+
+    return {"subjects": await run_scenario("subjects", send, args.requests * 5, args.concurrency, on_sample)}
+
+BENCHMARKS = {"process_file": bench_process_file, "ask": bench_ask, "subjects": bench_subjects}
+
+# --- Entry Point ---
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _parse_list(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the FlashLearn API end to end.")
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one (no RSS is reported).")
+    parser.add_argument("--scenarios", type=_parse_list, default=list(SCENARIOS), help=f"Comma-separated subset of {','.join(SCENARIOS)}.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once.")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per scenario (subjects sends five times as many).")
+    parser.add_argument("--sizes", type=_parse_list, default=["small", "medium"], help=f"Document sizes from {','.join(DOCUMENT_SIZES)}.")
+    parser.add_argument("--formats", type=_parse_list, default=["txt", "pdf"], help="Document formats: txt, pdf.")
+    parser.add_argument("--min-subjects", type=int, default=50, help="Subjects to create before the subjects scenario.")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Fake LLM time to first token.")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra environment for the started server.")
+    parser.add_argument("--output", help="Where to write the JSON results (default: benchmarks/results/<time>.json).")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.scenarios if name not in BENCHMARKS] + [size for size in args.sizes if size not in DOCUMENT_SIZES]
+    if unknown:
+        parser.error(f"Unknown scenarios or sizes: {', '.join(unknown)}")
+    return args
+
+async def main(args) -> dict:
+    server = None
+    if not args.url:
+        server = ServerProcess(args.llm_latency_ms, dict(item.split("=", 1) for item in args.env))
+        server.start()
+    base_url = args.url or server.url
+    on_sample = server.sample_rss if server else None
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "url": args.url,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "sizes": args.sizes,
+            "formats": args.formats,
+            "llm_latency_ms": None if args.url else args.llm_latency_ms,
+            "env": args.env,
+        },
+        "scenarios": {},
+    }
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency + 4)
+        async with httpx.AsyncClient(base_url=base_url, timeout=600, limits=limits) as client:
+            if server:
+                results["meta"]["startup_seconds"] = round(await server.wait_ready(client), 3)
+            for name in args.scenarios:
+                results["scenarios"].update(await BENCHMARKS[name](client, args, on_sample))
+        if server:
+            results["server"] = server.sample_rss()
+    finally:
+        if server:
+            server.stop()
+    return results
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    output = arguments.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    benchmark_results = asyncio.run(main(arguments))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(benchmark_results, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
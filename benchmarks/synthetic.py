@@ -0,0 +1,66 @@
+import random
+
+# --- Synthetic Documents ---
+
+_SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "pe", "da", "gu", "fi", "zo", "be", "cy", "tha", "lin", "mor", "qua", "ster")
+
+def _vocabulary(rng: random.Random, size: int = 2000) -> list[str]:
+    return ["".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(size)]
+
+def make_text(words: int, seed: int = 0) -> str:
+    """
+    Returns deterministic prose-like text with roughly the given number of words,
+    split into sentences and paragraphs. Different seeds give different text, so
+    documents do not hit the embedding or materials caches.
+    """
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng)
+    sentences = []
+    written = 0
+    while written < words:
+        length = rng.randint(6, 24)
+        sentence = " ".join(rng.choice(vocabulary) for _ in range(length))
+        sentences.append(sentence[0].upper() + sentence[1:] + ".")
+        written += length
+    paragraphs = [" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)]
+    return "\n\n".join(paragraphs)
+
+def _escape_pdf_text(line: str) -> bytes:
+    escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return escaped.encode("latin-1", "replace")
+
+def make_pdf(pages: int, words_per_page: int = 400, seed: int = 0) -> bytes:
+    """
+    Returns a minimal valid PDF with the given number of text pages, readable by pypdf.
+    """
+    objects: list[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(b"")
+    page_ids = []
+    for page in range(pages):
+        text = make_text(words_per_page, seed * 100003 + page).replace("\n", " ")
+        lines = [text[i:i + 90] for i in range(0, len(text), 90)] or [""]
+        content = b"BT /F1 9 Tf 20 820 Td 11 TL " + b" ".join(b"(" + _escape_pdf_text(line) + b") '" for line in lines) + b" ET"
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content_id, font_id)
+        ))
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % i for i in page_ids) + b"] /Count %d >>" % len(page_ids)
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_offset)
+    return bytes(out)
@@ -3,6 +3,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const uploadForm = document.getElementById('upload-form');
     const submitButton = document.getElementById('submit-button');
     const loadingSpinner = document.getElementById('loading-spinner');
+    const loadingStatus = document.getElementById('loading-status');
     const errorMessage = document.getElementById('error-message');
     
     const subjectTilesContainer = document.getElementById('subject-tiles');
@@ -34,15 +35,30 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- Data Fetching ---
     async function fetchSubjects() {
         try {
-            const response = await fetch('/api/subjects');
-            if (!response.ok) throw new Error('Failed to fetch subjects.');
-            const data = await response.json();
-            subjects = data.subjects || [];
+            // Only names and summaries are listed; full materials are loaded on click
+            const loaded = [];
+            let cursor = null;
+            do {
+                const params = new URLSearchParams({ limit: '200' });
+                if (cursor) params.set('cursor', cursor);
+                const response = await fetch(`/api/subjects?${params}`);
+                if (!response.ok) throw new Error('Failed to fetch subjects.');
+                const data = await response.json();
+                loaded.push(...(data.subjects || []));
+                cursor = data.next_cursor;
+            } while (cursor);
+            subjects = loaded;
         } catch (error) {
             showError(error.message);
         }
     }
 
+    async function fetchSubjectMaterials(subjectName) {
+        const response = await fetch(`/api/subjects/${encodeURIComponent(subjectName)}`);
+        if (!response.ok) throw new Error('Failed to fetch subject materials.');
+        return response.json();
+    }
+
     // --- Rendering ---
     function renderSubjectTiles() {
         subjectTilesContainer.innerHTML = '';
@@ -59,9 +75,12 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
-    function renderSubjectContent(subjectName) {
-        const subject = subjects.find(s => s.name === subjectName);
-        if (!subject) {
+    async function renderSubjectContent(subjectName) {
+        let subject;
+        try {
+            subject = await fetchSubjectMaterials(subjectName);
+        } catch (error) {
+            showError(error.message);
             contentContainer.classList.add('hidden');
             return;
         }
@@ -121,7 +140,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // --- Event Handlers ---
-    function handleSubjectClick(subjectName) {
+    async function handleSubjectClick(subjectName) {
         document.querySelectorAll('#subject-tiles .tile').forEach(tile => {
             if (tile.textContent === subjectName) {
                 tile.classList.add('active');
@@ -129,7 +148,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 tile.classList.remove('active');
             }
         });
-        renderSubjectContent(subjectName);
+        await renderSubjectContent(subjectName);
     }
 
     function handleQuizOptionClick(e) {
@@ -166,7 +185,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         const formData = new FormData();
         formData.append('subject', subject);
-        let endpoint = '/api/process/';
+        let endpoint = '/api/jobs/';
 
         if (activeTab === 'file') {
             if (fileInput.files.length === 0) {
@@ -197,10 +216,13 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(errorData.message || 'An unknown error occurred.');
             }
 
+            const job = await response.json();
+            await waitForJob(job.id);
+
             // Refresh subjects and display the new one
             await fetchSubjects();
             renderSubjectTiles();
-            handleSubjectClick(subject);
+            await handleSubjectClick(subject);
             uploadForm.reset();
 
         } catch (error) {
@@ -225,7 +247,7 @@ document.addEventListener('DOMContentLoaded', () => {
         formData.append('question', question);
 
         try {
-            const response = await fetch('/api/ask', {
+            const response = await fetch('/api/ask/stream', {
                 method: 'POST',
                 body: formData
             });
@@ -235,8 +257,15 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(errorData.message || 'Failed to get an answer.');
             }
 
-            const data = await response.json();
-            qaResponse.innerHTML = `<p>${data.answer.replace(/\n/g, '<br>')}</p>`;
+            let answer = '';
+            await readEventStream(response, (event, data) => {
+                if (event === 'token') {
+                    answer += data.text;
+                    qaResponse.innerHTML = `<p>${answer.replace(/\n/g, '<br>')}</p>`;
+                } else if (event === 'error') {
+                    throw new Error(data.message || 'Failed to get an answer.');
+                }
+            });
 
         } catch (error) {
             qaResponse.innerHTML = `<p style="color: var(--error-color);">${error.message}</p>`;
@@ -247,6 +276,75 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     // --- Utility Functions ---
+    async function readEventStream(response, onEvent) {
+        // EventSource only supports GET, so POST streams are parsed by hand
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const message = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                let data = '';
+                message.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                onEvent(event, data ? JSON.parse(data) : {});
+            }
+        }
+    }
+
+    function describeJob(job) {
+        const progress = job.progress || {};
+        switch (job.stage) {
+            case 'queued': return 'Waiting in queue...';
+            case 'extracting': return progress.pages_total
+                ? `Extracting text (${progress.pages_extracted || 0}/${progress.pages_total} pages)...`
+                : 'Extracting text...';
+            case 'extracted': return progress.pages_extracted
+                ? `Extracted ${progress.pages_extracted} pages.`
+                : 'Text extracted.';
+            case 'embedding': return progress.chunks_total
+                ? `Indexing document (${progress.chunks_embedded}/${progress.chunks_total} chunks)...`
+                : 'Indexing document...';
+            case 'generating': return 'Generating summary, flashcards and quiz...';
+            case 'saving': return 'Saving materials...';
+            default: return 'Processing your content... this may take a moment.';
+        }
+    }
+
+    function waitForJob(jobId) {
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(`/api/jobs/${jobId}/events`);
+            let summaryPreview = '';
+            source.addEventListener('progress', (e) => {
+                if (!summaryPreview) loadingStatus.textContent = describeJob(JSON.parse(e.data));
+            });
+            source.addEventListener('summary', (e) => {
+                summaryPreview += JSON.parse(e.data).text;
+                loadingStatus.textContent = summaryPreview;
+            });
+            source.addEventListener('done', () => {
+                source.close();
+                resolve();
+            });
+            source.addEventListener('failed', (e) => {
+                source.close();
+                reject(new Error(JSON.parse(e.data).error || 'Processing failed.'));
+            });
+            source.onerror = () => {
+                source.close();
+                reject(new Error('Lost connection while processing.'));
+            };
+        });
+    }
+
     function showError(message) {
         errorMessage.textContent = message;
         errorMessage.classList.remove('hidden');
@@ -255,6 +353,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     function showLoading(isLoading, element = loadingSpinner) {
         if (isLoading) {
+            loadingStatus.textContent = describeJob({});
             element.classList.remove('hidden');
             submitButton.disabled = true;
         } else {
@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# Configure the app before any of its modules are imported: a throwaway data
+# directory, the local stand-in LLM and no model downloads at startup
+os.environ["FLASHLEARN_DB_DIR"] = tempfile.mkdtemp(prefix="flashlearn-tests-")
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY_MS", "0")
+os.environ.setdefault("LLM_RATE_LIMIT_PER_MINUTE", "0")
+os.environ.setdefault("WARMUP_ON_STARTUP", "false")
+os.environ.setdefault("EXTRACTION_POOL_KIND", "thread")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
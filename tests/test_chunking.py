@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from app.utils.helpers import CHARS_PER_TOKEN, StreamingChunker, chunk_hash, iter_chunk_spans, split_text_into_chunks
+
+
+def _vocabulary(size: int) -> list[str]:
+    rng = random.Random(0)
+    return ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 10))) for _ in range(size)]
+
+
+# A vocabulary the size of a real document's, since pieces of unpunctuated text end at content-defined words
+WORDS = _vocabulary(2000)
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(4, 25))]
+    return " ".join(words).capitalize() + rng.choice([".", ".", "?", "!", '."'])
+
+
+def _document(seed: int, paragraphs: int = 40) -> str:
+    rng = random.Random(seed)
+    return "\n\n".join(" ".join(_sentence(rng) for _ in range(rng.randint(1, 12))) for _ in range(paragraphs))
+
+
+def _unpunctuated(seed: int, words: int = 5000) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _stream(pieces: list[str], chunk_tokens: int, overlap_tokens: int) -> list[str]:
+    chunker = StreamingChunker(chunk_tokens, overlap_tokens)
+    chunks = []
+    for piece in pieces:
+        chunks.extend(chunker.feed(piece))
+    return chunks + chunker.finish()
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("chunk_tokens,overlap_tokens", [(100, 16), (200, 0), (50, 49)])
+def test_streaming_matches_splitting_the_whole_text(seed, chunk_tokens, overlap_tokens):
+    rng = random.Random(seed)
+    text = _document(seed) + "\n" + _unpunctuated(seed, 800)
+    # Cut the text at arbitrary points, including inside words and sentence boundaries
+    cuts = sorted(rng.sample(range(1, len(text)), 30))
+    pieces = [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+    # StreamingChunker joins its pieces with newlines, as pages are joined
+    expected = split_text_into_chunks("\n".join(pieces), chunk_tokens, overlap_tokens)
+    assert _stream(pieces, chunk_tokens, overlap_tokens) == expected
+
+
+@pytest.mark.parametrize("text", [_document(1), _unpunctuated(2)], ids=["sentences", "unpunctuated"])
+def test_chunks_fit_the_budget_and_cover_the_text(text):
+    chunk_tokens, overlap_tokens = 100, 16
+    spans = list(iter_chunk_spans(text, chunk_tokens, overlap_tokens))
+    assert all(end - start <= chunk_tokens * CHARS_PER_TOKEN for start, end in spans)
+    covered = set()
+    for start, end in spans:
+        covered.update(range(start, end))
+    assert all(position in covered for position, char in enumerate(text) if not char.isspace())
+    # Consecutive chunks move forward and share at most the overlap
+    for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+        assert start < next_start and end < next_end
+        assert end - next_start <= overlap_tokens * CHARS_PER_TOKEN
+
+
+def test_empty_and_short_texts():
+    assert split_text_into_chunks("") == []
+    assert split_text_into_chunks("   \n\n ") == []
+    assert split_text_into_chunks("One sentence.") == ["One sentence."]
+    assert _stream([], 100, 16) == []
+
+
+@pytest.mark.parametrize("text", [_document(3, paragraphs=80), _unpunctuated(4, 20000)], ids=["sentences", "unpunctuated"])
+def test_an_edit_only_changes_the_chunks_around_it(text):
+    chunks = split_text_into_chunks(text, 100, 16)
+    middle = len(text) // 2
+    edited = text[:middle] + " inserted words here " + text[middle:]
+    edited_chunks = split_text_into_chunks(edited, 100, 16)
+
+    assert len(chunks) > 100
+    # Chunks before the edit are untouched, and the ones after it fall back on the same boundaries
+    spans = list(iter_chunk_spans(text, 100, 16))
+    untouched = sum(end < middle for _, end in spans)
+    assert edited_chunks[:untouched] == chunks[:untouched]
+    quarter = len(chunks) // 4
+    assert edited_chunks[-quarter:] == chunks[-quarter:]
+    # So all but a few chunks keep their hashes and cached embeddings
+    before = {chunk_hash(chunk) for chunk in chunks}
+    changed = [chunk for chunk in edited_chunks if chunk_hash(chunk) not in before]
+    assert 0 < len(changed) <= len(chunks) // 20
@@ -0,0 +1,72 @@
+import json
+import uuid
+
+from app.utils import helpers
+from app.utils.document_store import merge_materials
+
+
+def _materials(summary: str, questions: list[str], terms: list[str]) -> dict:
+    return {
+        "summary": summary,
+        "quiz": [{"question": question, "options": ["a", "b"], "answer": "a"} for question in questions],
+        "flashcards": [{"term": term, "definition": f"About {term}."} for term in terms],
+    }
+
+
+def test_merge_keeps_a_single_summary_as_is():
+    merged = merge_materials([{"name": "cells.pdf", **_materials("Cells divide.", ["Q1"], ["Mitosis"])}])
+    assert merged["summary"] == "Cells divide."
+    assert [question["question"] for question in merged["quiz"]] == ["Q1"]
+
+
+def test_merge_concatenates_in_order_and_drops_repeats():
+    merged = merge_materials([
+        {"name": "cells.pdf", **_materials("Cells divide.", ["What is mitosis?"], ["Mitosis"])},
+        {"name": "empty.pdf", **_materials("  ", [], [])},
+        {"name": "dna.pdf", **_materials("DNA replicates.", ["what is  MITOSIS?", "What is DNA?"], ["mitosis", "DNA"])},
+    ])
+    assert merged["summary"] == "cells.pdf\nCells divide.\n\ndna.pdf\nDNA replicates."
+    assert [question["question"] for question in merged["quiz"]] == ["What is mitosis?", "What is DNA?"]
+    assert [card["term"] for card in merged["flashcards"]] == ["Mitosis", "DNA"]
+
+
+def _add_chunks(subject: str, document_id: str, count: int):
+    helpers.get_document_collection().add(
+        ids=[f"{document_id}-{index}" for index in range(count)],
+        embeddings=[[float(index + 1), 0.0, 0.0] for index in range(count)],
+        documents=[f"Chunk {index} of {document_id}." for index in range(count)],
+        metadatas=[{"subject": subject, "document_id": document_id} for _ in range(count)],
+    )
+
+
+def _chunk_documents(subject: str) -> list[str]:
+    chunks = helpers.get_document_collection().get(where={"subject": subject}, include=["metadatas"])
+    return sorted({metadata["document_id"] for metadata in chunks["metadatas"]})
+
+
+def test_delete_document_removes_its_chunks_and_materials():
+    subject = f"Biology {uuid.uuid4().hex}"
+    helpers.save_document_materials(subject, "cells", "cells.pdf", _materials("Cells divide.", ["Q1"], ["Mitosis"]))
+    helpers.save_document_materials(subject, "dna", "dna.pdf", _materials("DNA replicates.", ["Q2"], ["DNA"]))
+    _add_chunks(subject, "cells", 2)
+    _add_chunks(subject, "dna", 3)
+
+    assert helpers.delete_document(subject, "cells")
+    assert _chunk_documents(subject) == ["dna"]
+    assert [document["id"] for document in helpers.list_documents(subject)] == ["dna"]
+    materials = json.loads(helpers.get_subject_materials_json(subject))
+    assert materials["summary"] == "DNA replicates."
+    assert [card["term"] for card in materials["flashcards"]] == ["DNA"]
+
+    assert not helpers.delete_document(subject, "cells")
+
+
+def test_deleting_the_last_document_removes_the_subject():
+    subject = f"Chemistry {uuid.uuid4().hex}"
+    helpers.save_document_materials(subject, "atoms", "atoms.pdf", _materials("Atoms bond.", ["Q1"], ["Bond"]))
+    _add_chunks(subject, "atoms", 1)
+
+    assert helpers.delete_document(subject, "atoms")
+    assert _chunk_documents(subject) == []
+    assert helpers.list_documents(subject) == []
+    assert helpers.get_subject_materials_json(subject) is None
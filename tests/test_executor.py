@@ -0,0 +1,68 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.executor import BoundedPool, PoolSaturatedError
+
+
+def _blocking_pool(workers: int = 1, queue_depth: int = 1):
+    pool = BoundedPool("test", "thread", workers, queue_depth)
+    release = threading.Event()
+    return pool, release
+
+
+def test_rejects_work_beyond_workers_and_queue():
+    async def scenario():
+        pool, release = _blocking_pool()
+        try:
+            tasks = [asyncio.create_task(pool.run(release.wait)) for _ in range(pool.limit)]
+            await asyncio.sleep(0.05)
+            assert pool.pending == pool.limit
+            with pytest.raises(PoolSaturatedError) as error:
+                await pool.run(lambda: None)
+            assert error.value.status_code == 503
+            assert error.value.headers["Retry-After"]
+            release.set()
+            assert await asyncio.gather(*tasks) == [True] * pool.limit
+            assert pool.pending == 0
+            assert await pool.run(lambda: 42) == 42
+        finally:
+            release.set()
+            pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_slot_is_held_until_the_worker_finishes():
+    async def scenario():
+        pool, release = _blocking_pool()
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(pool.run(release.wait), 0.05)
+            # The caller gave up, but the worker is still busy with the task
+            assert pool.pending == 1
+            release.set()
+            for _ in range(100):
+                if pool.pending == 0:
+                    break
+                await asyncio.sleep(0.01)
+            assert pool.pending == 0
+        finally:
+            release.set()
+            pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_errors_propagate_and_free_the_slot():
+    async def scenario():
+        pool = BoundedPool("test", "thread", 1, 0)
+        try:
+            with pytest.raises(ZeroDivisionError):
+                await pool.run(lambda: 1 / 0)
+            assert pool.pending == 0
+        finally:
+            pool.shutdown()
+
+    asyncio.run(scenario())
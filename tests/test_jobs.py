@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services import ingest_service, job_service
+from app.services.job_service import JobManager, JobStore
+
+
+def _job(job_id: str, status: str = "queued", updated_at: float | None = None) -> dict:
+    now = updated_at if updated_at is not None else time.time()
+    return {
+        "id": job_id, "kind": "youtube", "subject": "Biology", "status": status, "stage": status,
+        "progress": {}, "error": None, "created_at": now, "updated_at": now,
+        "payload": {"url": "https://youtu.be/abcdefghijk", "use_cache": True},
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_a_leased_job_can_only_be_claimed_by_its_owner(store):
+    store.create(_job("a"), "worker-1", 60)
+    assert store.unowned() == []
+    assert store.claim("a", "worker-2", 60) is None
+    assert store.claim("a", "worker-1", 60)["id"] == "a"
+
+
+def test_an_expired_lease_is_taken_over(store):
+    store.create(_job("a"), "worker-1", -1)
+    assert [job["id"] for job in store.unowned()] == ["a"]
+    assert store.claim("a", "worker-2", 60)["id"] == "a"
+    assert store.renew("worker-1", ["a"], 60) == 0
+    assert store.renew("worker-2", ["a"], 60) == 1
+
+
+def test_released_and_finished_jobs(store):
+    store.create(_job("a"), "worker-1", 60)
+    store.create(_job("b"), "worker-1", 60)
+    store.save(_job("b", status="done"))
+    store.release("worker-1")
+    # Finished jobs are never handed out again
+    assert [job["id"] for job in store.unowned()] == ["a"]
+    assert store.claim("b", "worker-2", 60) is None
+
+
+def test_older_snapshots_do_not_overwrite_newer_ones(store):
+    store.save(_job("a", status="running", updated_at=200))
+    store.save(_job("a", status="queued", updated_at=100))
+    assert store.get("a")["status"] == "running"
+
+
+def test_unfinished_jobs_are_resumed_on_start(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_service, "JOB_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(job_service, "JOB_UPLOAD_DIR", str(tmp_path / "uploads"))
+    runs = []
+
+    async def ingest_youtube(subject, url, progress, use_cache, on_summary):
+        runs.append((subject, url))
+        progress("generating", step=1)
+
+    monkeypatch.setattr(ingest_service, "ingest_youtube", ingest_youtube)
+
+    # A job left running by a worker that stopped without releasing it
+    store = JobStore(job_service.JOB_DB_PATH)
+    store.save(_job("interrupted", status="running"))
+    store.close()
+
+    async def scenario():
+        manager = JobManager(1, 10)
+        await manager.start()
+        try:
+            for _ in range(200):
+                job = await manager.get("interrupted")
+                if job["status"] in job_service.TERMINAL_STATUSES:
+                    break
+                await asyncio.sleep(0.01)
+            return job
+        finally:
+            await manager.stop()
+
+    job = asyncio.run(scenario())
+    assert job["status"] == "done"
+    assert runs == [("Biology", "https://youtu.be/abcdefghijk")]
+    store = JobStore(job_service.JOB_DB_PATH)
+    assert store.get("interrupted")["status"] == "done"
+    assert store.unowned() == []
+    store.close()
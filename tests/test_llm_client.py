@@ -0,0 +1,195 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.llm_client import LLMClient, TokenBucket, is_transient
+
+
+class ServiceUnavailable(Exception):
+    """Named like the google.api_core error the client treats as transient."""
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """
+    Answers every prompt with its reversed text, after failing the first
+    `failures` calls with `error`.
+    """
+    def __init__(self, latency: float = 0.02, failures: int = 0, error: Exception | None = None, fail_mid_stream: bool = False):
+        self.latency = latency
+        self.failures = failures
+        self.error = error or ServiceUnavailable("overloaded")
+        self.fail_mid_stream = fail_mid_stream
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        self.calls += 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.failures and not self.fail_mid_stream:
+                self.failures -= 1
+                raise self.error
+        finally:
+            self.running -= 1
+        text = prompt[::-1]
+        if not stream:
+            return _Response(text)
+
+        async def pieces():
+            for start in range(0, len(text), 3):
+                if self.failures and start:
+                    self.failures -= 1
+                    raise self.error
+                yield _Response(text[start:start + 3])
+        return pieces()
+
+
+def _client(model: FakeModel, **options) -> LLMClient:
+    async def get_model():
+        return model
+    options = {"rate_per_minute": 0, "retry_base_seconds": 0.001, "retry_max_seconds": 0.01, **options}
+    return LLMClient(get_model, route_limits=options.pop("route_limits", {}), **options)
+
+
+def test_identical_prompts_in_flight_share_one_call():
+    model = FakeModel()
+    client = _client(model)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(client.generate("same prompt", "generate") for _ in range(5)),
+            client.generate("other prompt", "generate"),
+        )
+
+    results = asyncio.run(scenario())
+    assert results[:5] == ["tpmorp emas"] * 5
+    assert results[5] == "tpmorp rehto"
+    assert model.calls == 2
+
+
+def test_streams_coalesce_only_with_streams():
+    model = FakeModel()
+    client = _client(model)
+
+    async def collect():
+        return "".join([text async for text in client.stream("same prompt", "ask")])
+
+    async def scenario():
+        return await asyncio.gather(collect(), collect(), client.generate("same prompt", "ask"))
+
+    assert asyncio.run(scenario()) == ["tpmorp emas"] * 3
+    assert model.calls == 2
+
+
+def test_finished_calls_are_not_reused():
+    model = FakeModel(latency=0)
+    client = _client(model)
+
+    async def scenario():
+        await client.generate("prompt", "generate")
+        await client.generate("prompt", "generate")
+
+    asyncio.run(scenario())
+    assert model.calls == 2
+
+
+def test_transient_errors_are_retried():
+    model = FakeModel(failures=2)
+    client = _client(model, max_retries=3)
+    assert asyncio.run(client.generate("prompt", "generate")) == "tpmorp"
+    assert model.calls == 3
+
+
+def test_retries_stop_after_max_retries():
+    model = FakeModel(failures=5)
+    client = _client(model, max_retries=2)
+    with pytest.raises(ServiceUnavailable):
+        asyncio.run(client.generate("prompt", "generate"))
+    assert model.calls == 3
+
+
+def test_other_errors_are_not_retried():
+    model = FakeModel(failures=1, error=ValueError("bad prompt"))
+    client = _client(model, max_retries=3)
+    with pytest.raises(ValueError):
+        asyncio.run(client.generate("prompt", "generate"))
+    assert model.calls == 1
+
+
+def test_a_stream_that_already_sent_text_is_not_retried():
+    model = FakeModel(failures=1, fail_mid_stream=True)
+    client = _client(model, max_retries=3)
+    received = []
+
+    async def scenario():
+        async for text in client.stream("a longer prompt", "ask"):
+            received.append(text)
+
+    with pytest.raises(ServiceUnavailable):
+        asyncio.run(scenario())
+    assert received == ["tpm"]
+    assert model.calls == 1
+
+
+def test_backoff_grows_and_is_capped():
+    client = _client(FakeModel(), retry_base_seconds=1, retry_max_seconds=5)
+    for attempt in range(6):
+        delays = [client._backoff(attempt) for _ in range(50)]
+        assert all(0 <= delay <= min(5, 2 ** attempt) for delay in delays)
+
+
+def test_concurrency_is_capped_globally_and_per_route():
+    model = FakeModel(latency=0.02)
+
+    async def scenario(client, route):
+        await asyncio.gather(*(client.generate(f"prompt {index}", route) for index in range(8)))
+
+    asyncio.run(scenario(_client(model, max_concurrency=3), "generate"))
+    assert model.max_running == 3
+
+    model.max_running = 0
+    asyncio.run(scenario(_client(model, max_concurrency=3, route_limits={"generate": 2}), "generate"))
+    assert model.max_running == 2
+
+
+def test_is_transient():
+    assert is_transient(ServiceUnavailable())
+    assert is_transient(asyncio.TimeoutError())
+    assert not is_transient(ValueError())
+
+
+def test_token_bucket_allows_a_burst_then_the_rate():
+    async def scenario():
+        bucket = TokenBucket(rate_per_second=20, capacity=2)
+        start = time.monotonic()
+        for _ in range(2):
+            await bucket.acquire()
+        burst = time.monotonic() - start
+        for _ in range(2):
+            await bucket.acquire()
+        return burst, time.monotonic() - start
+
+    burst, total = asyncio.run(scenario())
+    assert burst < 0.05
+    # Two tokens beyond the burst at 20 per second
+    assert total >= 0.09
+
+
+def test_token_bucket_with_zero_rate_does_not_limit():
+    async def scenario():
+        bucket = TokenBucket(rate_per_second=0, capacity=1)
+        start = time.monotonic()
+        for _ in range(100):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(scenario()) < 0.05
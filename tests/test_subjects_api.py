@@ -0,0 +1,77 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils import helpers
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def _save_subject(name: str):
+    helpers.save_document_materials(name, "notes", "notes.txt", {
+        "summary": f"Summary of {name}.",
+        "quiz": [{"question": f"About {name}?", "options": ["a", "b"], "answer": "a"}],
+        "flashcards": [{"term": name, "definition": "A subject."}],
+    })
+
+
+def _all_pages(client, **params) -> list[dict]:
+    subjects, cursor = [], None
+    while True:
+        response = client.get("/api/subjects", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        page = response.json()
+        subjects.extend(page["subjects"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return subjects
+
+
+def test_cursor_pages_through_every_subject_once(client):
+    prefix = uuid.uuid4().hex
+    names = [f"{prefix} subject {index}" for index in range(5)]
+    for name in names:
+        _save_subject(name)
+
+    subjects = _all_pages(client, limit=2)
+    listed = [subject["name"] for subject in subjects if subject["name"].startswith(prefix)]
+    assert sorted(listed) == names
+    assert len(subjects) == len({subject["name"] for subject in subjects})
+    # Only names and summaries by default
+    assert set(subjects[0]) == {"name", "summary"}
+
+
+def test_fields_select_the_materials_returned(client):
+    _save_subject(f"{uuid.uuid4().hex} full")
+    subjects = client.get("/api/subjects", params={"fields": "name,summary,quiz,flashcards"}).json()["subjects"]
+    assert {"name", "summary", "quiz", "flashcards"} <= set(subjects[0])
+    assert client.get("/api/subjects", params={"fields": "name,secret"}).status_code == 400
+
+
+def test_invalid_cursor_is_rejected(client):
+    # Not valid base64, and base64 of bytes that are not UTF-8
+    assert client.get("/api/subjects", params={"cursor": "a"}).status_code == 400
+    assert client.get("/api/subjects", params={"cursor": "_w"}).status_code == 400
+
+
+def test_unchanged_page_returns_304(client):
+    _save_subject(f"{uuid.uuid4().hex} cached")
+    # One page holding every subject, so a new subject changes it
+    params = {"limit": 200}
+    etag = client.get("/api/subjects", params=params).headers["ETag"]
+
+    revalidated = client.get("/api/subjects", params=params, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+    assert revalidated.content == b""
+
+    _save_subject(f"{uuid.uuid4().hex} new")
+    changed = client.get("/api/subjects", params=params, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
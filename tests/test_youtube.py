@@ -0,0 +1,87 @@
+import pytest
+
+from app.services.youtube_service import Transcript, extract_video_id, parse_srt
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("url", [
+    f"https://www.youtube.com/watch?v={VIDEO_ID}",
+    f"https://www.youtube.com/watch?feature=share&v={VIDEO_ID}&t=42s",
+    f"http://m.youtube.com/watch?v={VIDEO_ID}",
+    f"https://music.youtube.com/watch?v={VIDEO_ID}",
+    f"https://youtu.be/{VIDEO_ID}",
+    f"https://youtu.be/{VIDEO_ID}?t=10",
+    f"https://www.youtube.com/shorts/{VIDEO_ID}",
+    f"https://www.youtube.com/embed/{VIDEO_ID}",
+    f"https://www.youtube-nocookie.com/embed/{VIDEO_ID}",
+    f"https://www.youtube.com/live/{VIDEO_ID}?feature=share",
+    f"youtube.com/watch?v={VIDEO_ID}",
+    f"  youtu.be/{VIDEO_ID}  ",
+])
+def test_extracts_the_video_id(url):
+    assert extract_video_id(url) == VIDEO_ID
+
+
+@pytest.mark.parametrize("url", [
+    "",
+    "https://www.youtube.com/",
+    "https://www.youtube.com/watch",
+    "https://www.youtube.com/watch?v=short",
+    f"https://www.youtube.com/channel/{VIDEO_ID}",
+    f"https://example.com/watch?v={VIDEO_ID}",
+    f"https://youtube.com.example.com/watch?v={VIDEO_ID}",
+    f"https://youtu.be/{VIDEO_ID}extra",
+])
+def test_rejects_urls_without_a_video(url):
+    assert extract_video_id(url) is None
+
+
+SRT = """1
+00:00:01,000 --> 00:00:02,500
+<font color="#fff">Hello and welcome</font>
+
+2
+00:00:02,500 --> 00:00:04,000
+Hello and welcome
+to the &amp; lecture
+
+3
+00:00:08,000 --> 00:00:09,000
+{\\an8}After a pause.
+
+4
+00:00:09,000 --> 00:00:10,000
+2
+"""
+
+
+def test_srt_becomes_plain_text():
+    text, _ = parse_srt(SRT)
+    # Markup and entities are removed, the repeated line is kept once and the pause starts a paragraph
+    assert text == "Hello and welcome to the & lecture\nAfter a pause. 2"
+
+
+def test_srt_timestamps_map_offsets_to_the_video():
+    text, timestamps = parse_srt(SRT)
+    # At most one timestamp every TIMESTAMP_INTERVAL_SECONDS
+    assert timestamps == [(0, 1.0), (text.index("After"), 8.0)]
+    transcript = Transcript(VIDEO_ID, text, timestamps)
+    assert transcript.seconds_at(text.index("lecture")) == 1.0
+    assert transcript.seconds_at(text.index("pause")) == 8.0
+
+
+def test_srt_line_endings_and_short_milliseconds():
+    text, timestamps = parse_srt("1\r\n00:01:02.5 --> 00:01:03.0\r\nOne cue\r\n")
+    assert text == "One cue"
+    assert timestamps == [(0, 62.5)]
+
+
+def test_empty_srt():
+    assert parse_srt("") == ("", [])
+
+
+def test_transcript_round_trips_through_a_dict():
+    transcript = Transcript(VIDEO_ID, "Hello.", [(0, 1.5)])
+    restored = Transcript.from_dict(transcript.to_dict())
+    assert (restored.video_id, restored.text, restored.timestamps) == (VIDEO_ID, "Hello.", [(0, 1.5)])